@@ -0,0 +1,150 @@
+# common.py
+
+import copy
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+import config
+
+
+# used when the dataset is not available (e.g. in a fresh checkout without data)
+FALLBACK_PROFILE = {
+    "jobRole": "Data Entry Clerk",
+    "jobProfile": {
+        "generalDescription": {"text": "Enters and updates data in company databases and spreadsheets."},
+        "dayInTheLife": {"text": "Typing records, checking data for errors and preparing simple reports."},
+        "prepareForRole": [{"key": "Education Needed", "value": "12th pass with basic computer skills."}],
+    },
+    "aptitudeRatings": [{"attribute": "Organizational Skills"}, {"attribute": "Technical Proficiency"}],
+    "employers": {"wellKnownEmployers": [{"name": "Infosys"}, {"name": "Wipro"}]},
+    "geographicJobDetails": [{"geographicOption": "Large Cities", "estimatedSalaryRange": "₹15,000 - ₹25,000"}],
+}
+
+
+def synthetic_jobs(size: int, template_path: str = config.DATA_FILE_PATH) -> List[Dict[str, Any]]:
+    """
+    Builds a synthetic raw dataset of `size` job profiles by cycling through the
+    profiles of the real dataset and giving every copy a unique id and role.
+
+    Args:
+        size (int): Number of profiles to generate.
+        template_path (str): Dataset whose profiles are used as templates.
+
+    Returns:
+        List[Dict[str, Any]]: Raw profiles in the dataset format.
+    """
+    if os.path.exists(template_path):
+        with open(template_path, "r", encoding="utf-8") as file:
+            templates = json.load(file)
+    else:
+        templates = [FALLBACK_PROFILE]
+
+    jobs = []
+    for i in range(size):
+        job = copy.deepcopy(templates[i % len(templates)])
+        job["_id"] = {"$oid": f"{i:024x}"}
+        job["jobRoleKey"] = f"synthetic_{i}"
+        if i >= len(templates):
+            job["jobRole"] = f"{job.get('jobRole', 'Unknown')} {i // len(templates)}"
+        jobs.append(job)
+    return jobs
+
+
+def write_synthetic_dataset(size: int, path: str) -> str:
+    """Writes a synthetic dataset of `size` profiles to `path` and returns the path."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(synthetic_jobs(size), file)
+    return path
+
+
+def clustered_vectors(size: int, dimension: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """
+    Generates normalized float32 vectors grouped around random centroids,
+    which is closer to real sentence embeddings than uniform noise.
+
+    Args:
+        size (int): Number of vectors.
+        dimension (int): Vector dimension.
+        clusters (int): Number of centroids.
+        seed (int): Random seed.
+
+    Returns:
+        np.ndarray: Matrix of shape (size, dimension).
+    """
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, dimension), dtype=np.float32)
+    vectors = centroids[rng.integers(clusters, size=size)]
+    vectors += 0.5 * rng.standard_normal((size, dimension), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, Optional[float]]:
+    """Returns count, mean and p50/p95/p99/max of latency samples (seconds)."""
+    if not len(samples):
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    values = np.asarray(samples, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": int(len(values)),
+        "mean": float(values.mean()),
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "max": float(values.max()),
+    }
+
+
+def environment() -> Dict[str, Any]:
+    """Describes the code version and machine a benchmark ran on."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+
+
+def write_report(benchmark: str, results: List[Dict[str, Any]], output: Optional[str], settings: Dict[str, Any]) -> str:
+    """
+    Writes benchmark results as JSON, together with the environment and settings they were produced with.
+
+    Args:
+        benchmark (str): Benchmark name, e.g. "micro" or "load".
+        results (List[Dict[str, Any]]): One record per measurement.
+        output (str, optional): Output path. Defaults to `benchmarks/results/<benchmark>-<timestamp>.json`.
+        settings (Dict[str, Any]): Command-line settings of the run.
+
+    Returns:
+        str: Path of the written report.
+    """
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    if output is None:
+        output = os.path.join(os.path.dirname(__file__), "results", f"{benchmark}-{timestamp}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+
+    report = {
+        "benchmark": benchmark,
+        "created_at": timestamp,
+        "environment": environment(),
+        "settings": settings,
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    return output
@@ -0,0 +1,86 @@
+# compare.py
+"""
+Compares two benchmark reports and flags regressions.
+
+Usage (from backend/):
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.1
+
+Exits with status 1 if any tracked metric got worse by more than the threshold.
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, Tuple
+
+
+# metric paths and whether a higher value is better
+TRACKED_METRICS = {
+    ("seconds",): False,
+    ("build_seconds",): False,
+    ("profiles_per_second",): True,
+    ("texts_per_second",): True,
+    ("batched_queries_per_second",): True,
+    ("requests_per_second",): True,
+    ("query_latency", "p50"): False,
+    ("query_latency", "p99"): False,
+    ("search_latency", "p50"): False,
+    ("search_latency", "p99"): False,
+    ("latency", "p50"): False,
+    ("latency", "p99"): False,
+    ("time_to_first_token", "p50"): False,
+    ("time_to_first_token", "p99"): False,
+}
+
+# fields identifying the same measurement in both reports
+KEY_FIELDS = ("name", "size", "requested_index_type", "endpoint", "concurrency")
+
+
+def _records(path: str) -> Dict[Tuple, Dict[str, Any]]:
+    """Loads a report and indexes its results by measurement key."""
+    with open(path, "r", encoding="utf-8") as file:
+        report = json.load(file)
+    return {tuple(record.get(field) for field in KEY_FIELDS): record for record in report["results"]}
+
+
+def _metrics(record: Dict[str, Any]) -> Iterator[Tuple[str, float, bool]]:
+    """Yields (metric name, value, higher is better) for the tracked metrics present in a record."""
+    for path, higher_is_better in TRACKED_METRICS.items():
+        value = record
+        for field in path:
+            value = value.get(field) if isinstance(value, dict) else None
+        if isinstance(value, (int, float)):
+            yield ".".join(path), float(value), higher_is_better
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compares two benchmark reports.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression.")
+    args = parser.parse_args()
+
+    baseline = _records(args.baseline)
+    candidate = _records(args.candidate)
+
+    regressions = 0
+    for key, record in candidate.items():
+        if key not in baseline:
+            continue
+        previous = dict((name, value) for name, value, _ in _metrics(baseline[key]))
+        label = " ".join(f"{field}={value}" for field, value in zip(KEY_FIELDS, key) if value is not None)
+        for name, value, higher_is_better in _metrics(record):
+            if not previous.get(name):
+                continue
+            change = (value - previous[name]) / previous[name]
+            worse = -change if higher_is_better else change
+            status = "REGRESSION" if worse > args.threshold else "ok"
+            regressions += status == "REGRESSION"
+            print(f"{status:10} {label} {name}: {previous[name]:.4g} -> {value:.4g} ({change:+.1%})")
+
+    print(f"{regressions} regression(s) above {args.threshold:.0%}.")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
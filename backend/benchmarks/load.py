@@ -0,0 +1,215 @@
+# load.py
+"""
+End-to-end load test of the FastAPI app.
+
+By default the app is started in-process on a local port with a stub Gemini
+model that mimics Gemini's latency and streaming, the stub embedding model
+(unless MiniLM is available and requested) and a temporary index built from a
+synthetic corpus, so nothing touches the network or the real index files.
+With `--url`, an already running server is targeted instead.
+
+Usage (from backend/):
+    python -m benchmarks.load --concurrency 1,8,32 --requests 200 --endpoint stream
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+import config
+from benchmarks.common import summarize, synthetic_jobs, write_report, write_synthetic_dataset
+from benchmarks.stubs import StubGeminiModel, load_embeddings
+
+
+QUESTION_TEMPLATES = (
+    "What does a {role} do?",
+    "What skills do I need to become a {role}?",
+    "How much does a {role} earn?",
+    "Which companies hire a {role}?",
+    "What education is required for a {role}?",
+)
+
+
+def start_local_server(args: argparse.Namespace, workdir: str) -> Any:
+    """
+    Starts the app on `args.port` with stub models and a temporary index.
+
+    Config values are overridden before the app modules are imported, because
+    they read them at import time.
+
+    Returns:
+        uvicorn.Server: The running server.
+    """
+    config.DATA_FILE_PATH = write_synthetic_dataset(args.corpus_size, os.path.join(workdir, "jobs.json"))
+    config.INDEX_FILE_PATH = os.path.join(workdir, "indexes", "index_job_profiles.index")
+    config.INDEX_MANIFEST_PATH = os.path.join(workdir, "indexes", "index_job_profiles.manifest.json")
+    config.EMBEDDING_CACHE_DIR = os.path.join(workdir, "cache", "embeddings")
+    config.INGEST_CHECKPOINT_DIR = os.path.join(workdir, "indexes", "ingest_checkpoint")
+    config.LATENCY_DIR = os.path.join(workdir, "logs", "latency")
+    config.RESPONSES_DIR = os.path.join(workdir, "logs", "responses")
+    config.ANSWER_CACHE_ENABLED = args.answer_cache
+    os.makedirs(os.path.dirname(config.INDEX_FILE_PATH), exist_ok=True)
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+
+    import uvicorn
+    from modules import retrieval
+    from modules.llm_gateway import GeminiProvider, llm_gateway
+    from modules.prompts import SYSTEM_PROMPT
+
+    embedding_model, embedding_kind = load_embeddings(args.embedding)
+    retrieval.embedding_model = embedding_model
+    gemini = GeminiProvider()
+    gemini.models[SYSTEM_PROMPT] = StubGeminiModel(
+        latency_ms=args.llm_latency_ms, first_token_ms=args.llm_first_token_ms, chunks=args.llm_chunks
+    )
+    # the stub is the only provider, so no fallback is tried
+    llm_gateway.providers = [gemini]
+    print(f"Starting local server with {embedding_kind} embeddings and {args.corpus_size} profiles...")
+
+    import main as app_module
+    server = uvicorn.Server(
+        uvicorn.Config(app_module.app, host="127.0.0.1", port=args.port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, name="benchmark-server", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"Local server failed to start on port {args.port}.")
+        time.sleep(0.05)
+
+    # models and index are loaded in the background after the server starts
+    while httpx.get(f"http://127.0.0.1:{args.port}/readyz").status_code != 200:
+        if app_module.startup_status["error"] is not None:
+            raise RuntimeError(f"Local server failed to warm up: {app_module.startup_status['error']}")
+        time.sleep(0.1)
+    return server
+
+
+async def send_query(client: httpx.AsyncClient, endpoint: str, question: str) -> Dict[str, Any]:
+    """Sends one request and returns its latency, time to first byte/token and outcome."""
+    start = time.perf_counter()
+    first = None
+    try:
+        if endpoint == "stream":
+            async with client.stream("GET", "/query/stream", params={"query": question}) as response:
+                async for line in response.aiter_lines():
+                    if first is None and line.startswith("event: token"):
+                        first = time.perf_counter() - start
+                    if line.startswith("event: error"):
+                        raise RuntimeError("error event")
+                response.raise_for_status()
+        else:
+            response = await client.get("/query/", params={"query": question})
+            response.raise_for_status()
+            if response.json().get("status") != "Success":
+                raise RuntimeError("error response")
+        ok = True
+    except Exception:
+        ok = False
+
+    latency = time.perf_counter() - start
+    return {"ok": ok, "latency": latency, "first_token": first if first is not None else latency}
+
+
+async def run_level(args: argparse.Namespace, base_url: str, concurrency: int, questions: List[str]) -> Dict[str, Any]:
+    """Runs `args.requests` requests with `concurrency` clients and summarizes them."""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    pending = list(questions)
+    samples = []
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        async def worker():
+            while pending:
+                samples.append(await send_query(client, args.endpoint, pending.pop()))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+        stages = await scrape_stage_latencies(client)
+
+    succeeded = [sample for sample in samples if sample["ok"]]
+    return {
+        "name": "load",
+        "endpoint": args.endpoint,
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": len(samples) - len(succeeded),
+        "seconds": elapsed,
+        "requests_per_second": len(samples) / elapsed,
+        "latency": summarize([sample["latency"] for sample in succeeded]),
+        "time_to_first_token": summarize([sample["first_token"] for sample in succeeded]),
+        "server_stage_latency": stages,
+    }
+
+
+async def scrape_stage_latencies(client: httpx.AsyncClient) -> Dict[str, Dict[str, float]]:
+    """Reads the server-side per-stage quantiles from `GET /metrics` (cumulative since startup)."""
+    try:
+        response = await client.get("/metrics")
+        response.raise_for_status()
+    except Exception:
+        return {}
+
+    stages: Dict[str, Dict[str, float]] = {}
+    pattern = re.compile(r'_stage_latency_seconds\{stage="([^"]+)",quantile="([^"]+)"\} (\S+)')
+    for match in pattern.finditer(response.text):
+        stages.setdefault(match.group(1), {})[f"p{round(float(match.group(2)) * 100)}"] = float(match.group(3))
+    return stages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end load test of the FastAPI app.")
+    parser.add_argument("--url", default=None, help="Target a running server instead of starting a local one.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--endpoint", choices=("query", "stream"), default="query")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level.")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--corpus-size", type=int, default=1000)
+    parser.add_argument("--embedding", choices=("auto", "stub", "minilm"), default="stub")
+    parser.add_argument("--llm-latency-ms", type=float, default=1500)
+    parser.add_argument("--llm-first-token-ms", type=float, default=400)
+    parser.add_argument("--llm-chunks", type=int, default=20)
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache enabled.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON report path.")
+    args = parser.parse_args()
+
+    roles = sorted({job.get("jobRole", "Unknown") for job in synthetic_jobs(min(args.corpus_size, 1000))})
+    rng = random.Random(args.seed)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        server = None if args.url else start_local_server(args, workdir)
+        base_url = args.url or f"http://127.0.0.1:{args.port}"
+        try:
+            for concurrency in [int(level) for level in args.concurrency.split(",")]:
+                questions = [
+                    rng.choice(QUESTION_TEMPLATES).format(role=rng.choice(roles)) for _ in range(args.requests)
+                ]
+                record = asyncio.run(run_level(args, base_url, concurrency, questions))
+                results.append(record)
+                print(
+                    f"concurrency={concurrency} rps={record['requests_per_second']:.2f} errors={record['errors']} "
+                    f"p50={record['latency']['p50']} p99={record['latency']['p99']} "
+                    f"ttft_p50={record['time_to_first_token']['p50']}"
+                )
+        finally:
+            if server is not None:
+                server.should_exit = True
+
+    path = write_report("load", results, args.output, vars(args))
+    print(f"Report written to {path}")
+
+
+if __name__ == "__main__":
+    main()
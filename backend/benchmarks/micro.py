@@ -0,0 +1,171 @@
+# micro.py
+"""
+Microbenchmarks of the retrieval pipeline on synthetic corpora.
+
+Measures loader parsing, embedding throughput, index build time and search
+latency/recall for every index type. Runs offline on CPU; the stub embedding
+model is used when the MiniLM weights are not available locally.
+
+Usage (from backend/):
+    python -m benchmarks.micro --sizes 100,1000,10000,100000 --output results.json
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import faiss
+import numpy as np
+
+from benchmarks.common import clustered_vectors, summarize, write_report, write_synthetic_dataset
+from benchmarks.stubs import load_embeddings
+from modules.ann_index import (INDEX_TYPES,
+                               resolve_index_spec,
+                               create_faiss_index,
+                               train_faiss_index,
+                               configure_search)
+from modules.loader import get_jobs_data, profile_to_text
+from config import TOP_K
+
+
+def bench_loader(size: int, workdir: str) -> Dict[str, Any]:
+    """Times parsing a synthetic JSON dataset of `size` profiles into structured profiles."""
+    path = write_synthetic_dataset(size, os.path.join(workdir, f"jobs_{size}.json"))
+    start = time.perf_counter()
+    profiles = get_jobs_data(path)
+    elapsed = time.perf_counter() - start
+    os.remove(path)
+    return {"name": "loader_parse", "size": size, "seconds": elapsed, "profiles_per_second": len(profiles) / elapsed}
+
+
+def bench_embedding(size: int, embedding_model, batch_size: int, query_samples: int) -> Dict[str, Any]:
+    """Times document embedding throughput and single query embedding latency."""
+    texts = [profile_to_text(profile) for profile in _profiles(size)]
+
+    start = time.perf_counter()
+    for offset in range(0, len(texts), batch_size):
+        embedding_model.embed_documents(texts[offset:offset + batch_size])
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    for i in range(query_samples):
+        query_start = time.perf_counter()
+        embedding_model.embed_query(f"What skills does a {texts[i % len(texts)].splitlines()[0]} need?")
+        latencies.append(time.perf_counter() - query_start)
+
+    return {
+        "name": "embedding",
+        "size": size,
+        "seconds": elapsed,
+        "texts_per_second": len(texts) / elapsed,
+        "query_latency": summarize(latencies),
+    }
+
+
+def bench_index(size: int, dimension: int, index_type: str, queries: int, batch_size: int) -> Dict[str, Any]:
+    """Times building an index of `size` vectors and searching it, with recall against exact search."""
+    vectors = clustered_vectors(size, dimension)
+    query_vectors = clustered_vectors(queries, dimension, seed=1)
+    ids = np.arange(size, dtype=np.int64)
+
+    spec = resolve_index_spec(size, dimension, index_type)
+    start = time.perf_counter()
+    index = create_faiss_index(dimension, spec)
+    train_faiss_index(index, vectors)
+    index.add_with_ids(vectors, ids)
+    configure_search(index, spec)
+    build_seconds = time.perf_counter() - start
+
+    latencies = []
+    for query_vector in query_vectors:
+        query_start = time.perf_counter()
+        index.search(query_vector.reshape(1, -1), TOP_K)
+        latencies.append(time.perf_counter() - query_start)
+
+    start = time.perf_counter()
+    for offset in range(0, queries, batch_size):
+        index.search(query_vectors[offset:offset + batch_size], TOP_K)
+    batch_seconds = time.perf_counter() - start
+
+    _, found = index.search(query_vectors, TOP_K)
+    _, exact = faiss.knn(query_vectors, vectors, TOP_K, metric=faiss.METRIC_INNER_PRODUCT)
+    recall = np.mean([len(set(f) & set(e)) / TOP_K for f, e in zip(found, exact)])
+
+    return {
+        "name": "index",
+        "size": size,
+        "index_type": spec["index_type"],
+        "requested_index_type": index_type,
+        "spec": spec,
+        "build_seconds": build_seconds,
+        "search_latency": summarize(latencies),
+        "batched_queries_per_second": queries / batch_seconds,
+        f"recall_at_{TOP_K}": float(recall),
+    }
+
+
+def _profiles(size: int) -> List[Dict[str, Any]]:
+    """Returns `size` structured synthetic profiles."""
+    with tempfile.TemporaryDirectory() as workdir:
+        return get_jobs_data(write_synthetic_dataset(size, os.path.join(workdir, "jobs.json")))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the retrieval pipeline.")
+    parser.add_argument("--sizes", default="100,1000,10000,100000",
+                        help="Comma-separated corpus sizes, up to 1000000.")
+    parser.add_argument("--index-types", default=",".join(INDEX_TYPES), help="Comma-separated index types.")
+    parser.add_argument("--embedding", choices=("auto", "stub", "minilm"), default="auto")
+    parser.add_argument("--embedding-limit", type=int, default=10000,
+                        help="Largest corpus embedded with the model; larger sizes use synthetic vectors only.")
+    parser.add_argument("--embedding-batch-size", type=int, default=64)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--query-batch-size", type=int, default=32)
+    parser.add_argument("--skip", default="", help="Comma-separated parts to skip: loader, embedding, index.")
+    parser.add_argument("--output", default=None, help="JSON report path.")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    skip = set(filter(None, args.skip.split(",")))
+    embedding_model, embedding_kind = load_embeddings(args.embedding)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            if "loader" not in skip:
+                results.append(bench_loader(size, workdir))
+                print(_line(results[-1]))
+
+            if "embedding" not in skip and size <= args.embedding_limit:
+                record = bench_embedding(size, embedding_model, args.embedding_batch_size, min(args.queries, 200))
+                results.append({**record, "embedding_model": embedding_kind})
+                print(_line(results[-1]))
+
+            if "index" not in skip:
+                for index_type in args.index_types.split(","):
+                    results.append(bench_index(size, args.dimension, index_type, args.queries, args.query_batch_size))
+                    print(_line(results[-1]))
+
+    path = write_report("micro", results, args.output, {**vars(args), "embedding_model": embedding_kind})
+    print(f"Report written to {path}")
+
+
+def _line(record: Dict[str, Any]) -> str:
+    """Formats a result record as one human-readable line."""
+    parts = [record["name"], f"size={record['size']}"]
+    for key, value in record.items():
+        if key in ("name", "size", "spec"):
+            continue
+        if isinstance(value, dict):
+            value = f"p50={value['p50'] * 1000:.3f}ms p99={value['p99'] * 1000:.3f}ms"
+        elif isinstance(value, float):
+            value = f"{value:.4g}"
+        parts.append(f"{key}={value}")
+    return " ".join(parts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# stubs.py
+
+import asyncio
+import hashlib
+import os
+import random
+import re
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from config import EMBEDDING_MODEL_NAME
+
+
+class StubEmbeddings:
+    """
+    Offline stand-in for `HuggingFaceEmbeddings` with the same interface.
+
+    A text is embedded as the normalized sum of fixed random vectors of its
+    words, so texts sharing words are similar and threshold filtering behaves
+    roughly like it does with MiniLM. An optional per-text cost simulates
+    model compute.
+    """
+
+    def __init__(self, dimension: int = 384, cost_ms_per_text: float = 0.0):
+        self.dimension = dimension
+        self._cost = cost_ms_per_text / 1000
+        self._words: Dict[str, np.ndarray] = {}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embeds texts, one vector per text."""
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embeds a single query."""
+        return self._embed(text).tolist()
+
+    def _embed(self, text: str) -> np.ndarray:
+        """Returns the normalized bag-of-words vector of a text."""
+        if self._cost:
+            time.sleep(self._cost)
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector += self._word_vector(word)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        """Returns the fixed random vector of a word."""
+        vector = self._words.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "big")
+            vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+            self._words[word] = vector
+        return vector
+
+
+def load_embeddings(kind: str = "auto", model_name: str = EMBEDDING_MODEL_NAME) -> Tuple[Any, str]:
+    """
+    Returns the embedding model to benchmark.
+
+    Args:
+        kind (str): "stub", "minilm", or "auto" to use MiniLM when its weights are available locally.
+        model_name (str): Hugging Face model name.
+
+    Returns:
+        Tuple[Any, str]: The model and the name of the kind actually used.
+    """
+    if kind == "stub":
+        return StubEmbeddings(), "stub"
+
+    try:
+        # never download weights during a benchmark
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name), "minilm"
+    except Exception:
+        if kind == "minilm":
+            raise
+        return StubEmbeddings(), "stub"
+
+
+class _StubResponse:
+    """Mimics a Gemini response (or streamed chunk) exposing `.text`."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _StubStream:
+    """Mimics the async iterator returned by `generate_content_async(stream=True)`."""
+
+    def __init__(self, chunks: List[str], first_token_seconds: float, chunk_seconds: float):
+        self._chunks = chunks
+        self._first_token = first_token_seconds
+        self._chunk = chunk_seconds
+
+    async def __aiter__(self):
+        for position, chunk in enumerate(self._chunks):
+            await asyncio.sleep(self._first_token if position == 0 else self._chunk)
+            yield _StubResponse(chunk)
+
+
+class StubGeminiModel:
+    """
+    Offline stand-in for `genai.GenerativeModel` that mimics Gemini's latency and streaming.
+
+    A response takes about `latency_ms` in total (+/- `jitter`), its first
+    streamed chunk arrives after about `first_token_ms` and the rest of the
+    answer is spread over `chunks` chunks.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 1500,
+        first_token_ms: float = 400,
+        chunks: int = 20,
+        answer_words: int = 150,
+        jitter: float = 0.2,
+        seed: int = 0
+    ):
+        self.latency = latency_ms / 1000
+        self.first_token = min(first_token_ms, latency_ms) / 1000
+        self.chunks = max(1, chunks)
+        self.answer_words = answer_words
+        self.jitter = jitter
+        self._random = random.Random(seed)
+
+    def generate_content(self, user_prompt: str, generation_config=None, request_options=None, stream: bool = False):
+        """Blocking generation; streaming is not supported by the stub on this path."""
+        time.sleep(self._jittered(self.latency))
+        return _StubResponse(self._answer(user_prompt))
+
+    async def generate_content_async(self, user_prompt: str, generation_config=None, request_options=None, stream: bool = False):
+        """Async generation; with `stream=True`, returns an async iterator of chunks."""
+        if not stream:
+            await asyncio.sleep(self._jittered(self.latency))
+            return _StubResponse(self._answer(user_prompt))
+
+        words = self._answer(user_prompt).split(" ")
+        size = -(-len(words) // self.chunks)
+        chunks = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+        chunk_seconds = (self.latency - self.first_token) / max(1, len(chunks) - 1)
+        return _StubStream(chunks, self._jittered(self.first_token), self._jittered(chunk_seconds))
+
+    def _jittered(self, seconds: float) -> float:
+        """Applies the configured relative jitter to a duration."""
+        return max(0.0, seconds * (1 + self._random.uniform(-self.jitter, self.jitter)))
+
+    def _answer(self, user_prompt: str) -> str:
+        """Builds a deterministic answer of `answer_words` words from the prompt."""
+        words = re.findall(r"\w+", user_prompt) or ["answer"]
+        return " ".join(words[i % len(words)] for i in range(self.answer_words))
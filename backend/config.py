@@ -1,31 +1,182 @@
 # config.py
 
 
-# top k search
+# top k search: most profiles returned, and lowest cosine similarity of a hit
 TOP_K = 3
-SIMILARITY_TRESHOLD = 0.40
+SIMILARITY_TRESHOLD = 0.30
+# adaptive k: hits after a drop in similarity larger than this between consecutive hits are cut
+SCORE_GAP = 0.10
+# maximal marginal relevance re-ranking of the kept hits (1.0 = by similarity only, lower = more diverse profiles)
+MMR_ENABLED = True
+MMR_LAMBDA = 0.7
 
-# llm model name/id
+# llm model name/id; LLAMA_MODEL_NAME is a local model served by Ollama, used as fallback when set
 GEMINI_MODEL_NAME="gemini-2.0-flash"
 LLAMA_MODEL_NAME = ""
+LLAMA_BASE_URL = "http://localhost:11434"
+
+# cache the static system prompt with Gemini context caching; falls back to sending it with every
+# request when the model does not support caching or the prompt is below the minimum cacheable size
+GEMINI_CONTEXT_CACHE_ENABLED = True
+GEMINI_CONTEXT_CACHE_TTL_SECONDS = 3600
+
+# async query pipeline
+# threads running query embedding and FAISS search
+RETRIEVAL_WORKERS = 4
+# queries processed at once; further requests wait for a free slot
+MAX_CONCURRENT_QUERIES = 64
+# deadline for a whole /query/ request and for generating its answer, across retries and fallbacks (seconds)
+QUERY_TIMEOUT_SECONDS = 60
+LLM_TIMEOUT_SECONDS = 45
+
+# LLM gateway: providers tried in order, the first being the primary ("gemini", "llama" or "mock")
+LLM_PROVIDERS = ("gemini", "llama")
+# timeout of a single LLM call (for streams: the wait for each chunk)
+LLM_ATTEMPT_TIMEOUT_SECONDS = 15
+# part of LLM_TIMEOUT_SECONDS a provider leaves unused for the fallbacks after it
+LLM_FALLBACK_RESERVE_SECONDS = 15
+# retries of transient errors (timeouts, rate limits, 5xx) per provider, with full-jitter exponential backoff
+LLM_MAX_RETRIES = 2
+LLM_RETRY_BASE_SECONDS = 0.5
+LLM_RETRY_MAX_SECONDS = 4.0
+# consecutive failures that open a provider's circuit breaker, and how long it stays open before a trial call
+LLM_BREAKER_FAILURES = 5
+LLM_BREAKER_RESET_SECONDS = 30
+# hedging: a second identical request is sent when the first is slower than this quantile of recent latencies
+LLM_HEDGING_ENABLED = True
+LLM_HEDGE_QUANTILE = 0.95
+LLM_HEDGE_MIN_SECONDS = 1.0
+# successful calls observed before hedging starts
+LLM_HEDGE_MIN_SAMPLES = 20
+# pooled HTTP connections to the local model server
+LLM_MAX_CONNECTIONS = 32
+# latency of the "mock" provider, for tests and load benchmarks
+LLM_MOCK_LATENCY_SECONDS = 0.5
+
+# micro-batching of concurrent query embeddings and FAISS searches
+QUERY_BATCHING_ENABLED = True
+QUERY_BATCH_MAX_SIZE = 32
+QUERY_BATCH_WINDOW_MS = 5
+
+# bulk /query/batch endpoint
+BATCH_MAX_QUERIES = 5000
+# concurrent Gemini calls per batch request
+BATCH_LLM_CONCURRENCY = 8
+
+# semantic answer cache in front of the LLM
+ANSWER_CACHE_ENABLED = True
+# minimum cosine similarity to a cached query (retrieved profile ids must also match)
+ANSWER_CACHE_SIMILARITY = 0.95
+ANSWER_CACHE_TTL_SECONDS = 3600
+ANSWER_CACHE_MAX_ENTRIES = 1000
+
+# index granularity: "section" embeds every profile section separately (long sections are split
+# into windows) and sends only the matching sections to the LLM; "profile" embeds whole profiles
+CHUNKING = "section"
+CHUNK_MAX_WORDS = 120
+CHUNK_OVERLAP_WORDS = 20
+# hits fetched from FAISS per returned profile, before the threshold, score gap and MMR cut them back
+CHUNK_SEARCH_FACTOR = 4
+
+# hybrid retrieval: BM25 lexical search runs next to vector search and the rankings are merged
+HYBRID_SEARCH_ENABLED = True
+# BM25 term frequency saturation and document length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+# rank constant of reciprocal-rank fusion; larger values flatten the advantage of top ranks
+RRF_K = 60
+
+# token budget of the retrieved context in a prompt; the lowest-ranked sections are trimmed first
+CONTEXT_TOKEN_BUDGET = 1500
+# characters per token, used to estimate prompt size without a tokenizer round trip
+CHARS_PER_TOKEN = 4
 
 # embedding model name
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# embedding backend: "torch" (HuggingFaceEmbeddings) or "onnx" (ONNX Runtime, no torch at serving time)
+EMBEDDING_BACKEND = "torch"
+# intra-op threads per process for embedding queries (0 = library default, one per core)
+EMBEDDING_THREADS = 0
+# tokens per text; all-MiniLM-L6-v2 was trained on at most 256
+EMBEDDING_MAX_SEQ_LENGTH = 256
+# exported ONNX model and tokenizer, written by `python -m modules.onnx_embeddings`
+ONNX_MODEL_DIR = "data/models/all-MiniLM-L6-v2-onnx"
+# use the int8 dynamically quantized model instead of the float32 export
+ONNX_QUANTIZED = True
+# at startup, a non-torch backend must reproduce this many stored index vectors within this cosine similarity
+EMBEDDING_PARITY_SAMPLE = 64
+EMBEDDING_PARITY_MIN_COSINE = 0.98
+
+# persistent embedding cache (memory-mapped vectors keyed by model name and text hash)
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_DIR = "data/cache/embeddings"
+EMBEDDING_CACHE_MAX_ENTRIES = 100000
+# in-process LRU in front of the disk cache for hot query strings
+EMBEDDING_QUERY_LRU_SIZE = 1024
+
+# FAISS index type: "flat" (exact search), "ivf_flat", "ivf_pq" or "hnsw"
+INDEX_TYPE = "flat"
+# IVF: inverted lists, lists probed per query and vectors sampled for training
+IVF_NLIST = 1024
+IVF_NPROBE = 16
+IVF_TRAIN_SAMPLE = 100000
+# PQ: sub-quantizers (must divide the embedding dimension) and bits per code
+PQ_M = 48
+PQ_NBITS = 8
+# HNSW: neighbours per node and beam width at build and search time
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# per-stage latency histograms and counters served at GET /metrics
+METRICS_ENABLED = True
+
+# streaming ingestion: profiles are parsed incrementally and embedded and indexed in batches
+INGEST_BATCH_SIZE = 256
+# processes embedding profiles in parallel during index builds (0 = one per CPU core, 1 = in-process)
+EMBEDDING_BUILD_WORKERS = 1
+# torch threads of each build worker, so that workers do not oversubscribe the cores
+EMBEDDING_BUILD_THREADS_PER_WORKER = 1
+# bytes of the dataset read at a time (a JSON array or JSON Lines)
+INGEST_READ_CHUNK_BYTES = 1 << 20
+# embedded batches are saved here until the rebuild completes, so an interrupted rebuild resumes;
+# the new version's embeddings are memory-mapped from a temporary file here while it is built
+INGEST_CHECKPOINT_DIR = "data/indexes/ingest_checkpoint"
 
 # file path for RAG system
 DATA_FILE_PATH = "data/datasets/CareerAdvisoryService.job_profiles_en_100_6thFeb.json"
 INDEX_FILE_PATH = "data/indexes/index_job_profiles.index"
 
-# csv file for storing latency data
-LATENCY_FILE = "logs/latency_data.csv"
+# manifest pointing at the live index version and its document store
+INDEX_MANIFEST_PATH = "data/indexes/index_job_profiles.manifest.json"
+# open index files memory-mapped so processes on one host share their pages instead of each reading a copy
+INDEX_MMAP = True
+# how often each server process (with `serve.py`, the parent) checks the manifest for a version rebuilt by another process (0 = never)
+INDEX_REFRESH_SECONDS = 5
+
+# directory of append-only segments for storing latency data
+LATENCY_DIR = "logs/latency"
 
-# csv files for storing questions answers and contexts
-RESPONSES_FILE = "logs/rag_responses.csv"
+# directory of append-only segments for storing questions answers and contexts
+RESPONSES_DIR = "logs/responses"
 
 # csv file for logs
 LOG_FILE = "logs/main.log"
 
-# questions answers and contextsresponse storage limit
+# questions answers and contextsresponse storage limit, per server process
 MAX_RESPONSES = 100
+# latency records storage limit, per server process
+MAX_LATENCY_RECORDS = 100000
+
+# telemetry capture, written in batches by a background thread
+STORE_LATENCY = True
+STORE_RESPONSES = True
+# segment format: "csv", "jsonl" or "parquet"
+TELEMETRY_FORMAT = "csv"
+# rows per segment file; retention limits are enforced by deleting whole segments
+TELEMETRY_SEGMENT_ROWS = 1000
+TELEMETRY_FLUSH_SECONDS = 1.0
+# records buffered in memory; further records are dropped rather than blocking requests
+TELEMETRY_QUEUE_SIZE = 10000
 
 
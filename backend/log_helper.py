@@ -1,10 +1,28 @@
 # log_helper.py
 
+import atexit
+import csv
+import functools
+import glob
+import inspect
+import json
+import os
+import queue
+import re
+import threading
 import time
 import logging
-import pandas as pd
 
-from config import (LATENCY_FILE, RESPONSES_FILE, LOG_FILE, MAX_RESPONSES)
+from config import (LATENCY_DIR,
+                    RESPONSES_DIR,
+                    LOG_FILE,
+                    MAX_RESPONSES,
+                    MAX_LATENCY_RECORDS,
+                    STORE_LATENCY,
+                    TELEMETRY_FORMAT,
+                    TELEMETRY_SEGMENT_ROWS,
+                    TELEMETRY_FLUSH_SECONDS,
+                    TELEMETRY_QUEUE_SIZE)
 
 # Configure logging
 logging.basicConfig(
@@ -21,70 +39,239 @@ logger = logging.getLogger(__name__)
 
 
 
-def store_latency(function_name, elapsed_time):
-    """Stores latency data using Pandas and saves it to a CSV file."""
+class TelemetryWriter:
+    """
+    Append-only, non-blocking sink for telemetry records.
 
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    `write` only puts the record on an in-memory queue; a background thread
+    flushes queued records in batches to segment files in `directory`. A new
+    segment is started every `segment_rows` rows and the oldest segments are
+    deleted so that about `max_rows` rows are retained per process. Segment names
+    include the process id, so uvicorn workers never write to the same file, and
+    a writer only counts and deletes its own segments and those left by processes
+    that have exited, so N workers retain up to N times `max_rows` rows.
+    """
 
-    new_entry = pd.DataFrame({
-        "Timestamp": [timestamp],
-        "Function": [function_name],
-        "Execution Time (s)": [elapsed_time]
-    })
+    def __init__(
+        self,
+        name: str,
+        directory: str,
+        max_rows: int,
+        segment_rows: int = TELEMETRY_SEGMENT_ROWS,
+        file_format: str = TELEMETRY_FORMAT,
+        flush_seconds: float = TELEMETRY_FLUSH_SECONDS,
+        queue_size: int = TELEMETRY_QUEUE_SIZE
+    ):
+        if file_format not in ("csv", "jsonl", "parquet"):
+            raise ValueError(f"Unknown telemetry format '{file_format}'.")
+        self.name = name
+        self.directory = directory
+        self.segment_rows = max(1, min(segment_rows, max_rows))
+        # keep enough whole segments to cover max_rows, plus the one being written, per process
+        self.max_segments = -(-max_rows // self.segment_rows) + 1
+        self.file_format = file_format
+        self.flush_seconds = flush_seconds
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._pid = None
+        self._lock = threading.Lock()
 
-    try:
-        df = pd.read_csv(LATENCY_FILE)
-        df = pd.concat([df, new_entry], ignore_index=True)
-    except FileNotFoundError:
-        df = new_entry
+    def write(self, record: dict) -> None:
+        """Queues a record without blocking; the record is dropped if the queue is full."""
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
-    df.to_csv(LATENCY_FILE, index=False)
+    def close(self) -> None:
+        """Flushes queued records and stops the background thread."""
+        if self._pid != os.getpid():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._pid = None
 
+    def _start(self) -> None:
+        """Starts the flush thread; called again in a forked child, where threads do not survive."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._segment_path = None
+            self._segment_count = 0
+            self._sequence = 0
+            self._pending = []
+            self._thread = threading.Thread(target=self._run, name=f"telemetry-{self.name}", daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+            atexit.register(self.close)
 
-def store_response(question, answer, context):
-    """Stores RAG system responses (question, answer, context) in a CSV file."""
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    def _run(self) -> None:
+        """Collects queued records and writes them every `flush_seconds`."""
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.flush_seconds
+            stop = False
+            while True:
+                try:
+                    record = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
 
-    new_entry = pd.DataFrame({
-        "Timestamp": [timestamp],
-        "Question": [question],
-        "Answer": [answer],
-        "Context": [context]
-    })
+            try:
+                self._write_batch(batch, final=stop)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} {self.name} telemetry records: {str(e)}")
+            if stop:
+                return
 
-    try:
-        df = pd.read_csv(RESPONSES_FILE)
-        df = pd.concat([df, new_entry], ignore_index=True)
-    except FileNotFoundError:
-        df = new_entry
+    def _write_batch(self, records: list, final: bool = False) -> None:
+        """Appends records to the current segment, rotating segments as they fill up."""
+        while records:
+            if self._segment_path is None or self._segment_count >= self.segment_rows:
+                self._rotate()
+            rows = records[:self.segment_rows - self._segment_count]
+            records = records[len(rows):]
+            self._append(rows)
+            self._segment_count += len(rows)
 
-    df.to_csv(RESPONSES_FILE, index=False)
+        if final and self.file_format == "parquet":
+            self._write_parquet()
 
+    def _rotate(self) -> None:
+        """Starts a new segment and deletes the oldest ones beyond the retention limit."""
+        if self.file_format == "parquet":
+            self._write_parquet()
+
+        self._sequence += 1
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        self._segment_path = os.path.join(
+            self.directory, f"{self.name}-{timestamp}-{os.getpid()}-{self._sequence:06d}.{self.file_format}"
+        )
+        self._segment_count = 0
+
+        segments = []
+        for path in glob.glob(os.path.join(glob.escape(self.directory), f"{self.name}-*.{self.file_format}")):
+            # segments of other running processes may still be written to and count towards their own budget
+            if not self._is_deletable(path):
+                continue
+            try:
+                segments.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                # deleted by another process meanwhile
+                continue
+
+        excess = len(segments) - self.max_segments + 1
+        for _, path in sorted(segments)[:max(0, excess)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _is_deletable(self, path: str) -> bool:
+        """Returns whether a segment belongs to this process or to a process that has exited."""
+        match = re.search(r"-(\d+)-\d+\.\w+$", os.path.basename(path))
+        if match is None:
+            return False
+        pid = int(match.group(1))
+        if pid == os.getpid():
+            return True
+        if os.name == "nt":
+            # os.kill cannot probe a process there without signalling it
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            # exists, but owned by another user
+            return False
+        return False
+
+    def _append(self, rows: list) -> None:
+        """Appends rows to the current segment file."""
+        if self.file_format == "parquet":
+            # parquet files cannot be appended to: buffer until the segment is complete
+            self._pending.extend(rows)
+            return
+
+        with open(self._segment_path, "a", encoding="utf-8", newline="") as file:
+            if self.file_format == "jsonl":
+                file.writelines(json.dumps(row, default=str) + "\n" for row in rows)
+                return
+            writer = csv.DictWriter(file, fieldnames=list(rows[0].keys()))
+            if self._segment_count == 0:
+                writer.writeheader()
+            writer.writerows(rows)
+
+    def _write_parquet(self) -> None:
+        """Writes the buffered rows of the current parquet segment."""
+        if not self._pending:
+            return
+        import pandas as pd
+        pd.DataFrame(self._pending).to_parquet(self._segment_path, index=False)
+        self._pending = []
+
+
+latency_writer = TelemetryWriter("latency", LATENCY_DIR, max_rows=MAX_LATENCY_RECORDS)
+# small segments so that retention stays close to MAX_RESPONSES
+response_writer = TelemetryWriter(
+    "responses", RESPONSES_DIR, max_rows=MAX_RESPONSES, segment_rows=max(1, MAX_RESPONSES // 4)
+)
+
+
+def store_latency(function_name, elapsed_time):
+    """Queues latency data for the background telemetry writer."""
 
-def store_response_new(question, answer, context):
-    """Stores RAG system responses (question, answer, context) in a CSV file, keeping only the last 100 entries."""
     timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
 
-    new_entry = pd.DataFrame({
-        "Timestamp": [timestamp],
-        "Question": [question],
-        "Answer": [answer],
-        "Context": [context]
+    latency_writer.write({
+        "Timestamp": timestamp,
+        "Function": function_name,
+        "Execution Time (s)": elapsed_time
     })
 
-    try:
-        df = pd.read_csv(RESPONSES_FILE)
 
-        # Append new entry and keep only the last MAX_RESPONSES
-        df = pd.concat([df, new_entry], ignore_index=True).tail(MAX_RESPONSES)
-    except FileNotFoundError:
-        df = new_entry  # If file doesn't exist, create a new one
+def store_response(question, answer, context):
+    """Queues a RAG system response (question, answer, context) for the background telemetry writer."""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    response_writer.write({
+        "Timestamp": timestamp,
+        "Question": question,
+        "Answer": answer,
+        "Context": context
+    })
 
-    df.to_csv(RESPONSES_FILE, index=False)
+
+def store_response_new(question, answer, context):
+    """Stores a RAG system response, keeping about the last MAX_RESPONSES entries (enforced by segment rotation)."""
+    store_response(question, answer, context)
 
 
 def log_execution_time(func):
-    """Decorator to log and store the execution time of a function."""
+    """Decorator to log and store the execution time of a function (sync or async)."""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start_time = time.time()
+            result = await func(*args, **kwargs)
+            elapsed_time = time.time() - start_time
+
+            logger.info(f"Function '{func.__name__}' executed in {elapsed_time:.4f} seconds")
+            if STORE_LATENCY:
+                store_latency(func.__name__, elapsed_time)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
         start_time = time.time()
         result = func(*args, **kwargs)
@@ -94,7 +281,8 @@ def log_execution_time(func):
         logger.info(f"Function '{func.__name__}' executed in {elapsed_time:.4f} seconds")
 
         # store the latency for future reference 
-        # store_latency(func.__name__, elapsed_time)
+        if STORE_LATENCY:
+            store_latency(func.__name__, elapsed_time)
 
         return result
     return wrapper
@@ -1,24 +1,177 @@
 # main.py
 
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional
+
 from fastapi import FastAPI, HTTPException
-from modules.retrieval import (
-    retrieve_context,
-    load_embedding_model,
-    load_index,
-    create_index
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from modules.retrieval import load_embedding_model
+from modules.index_manager import IndexManager
+from modules.batcher import QueryBatcher
+from modules.metrics import metrics
+from modules.metadata_store import MetadataFilter
+from modules.generator import (
+    aget_answer,
+    astream_answer,
+    aget_answers_batch,
+    answer_cache
     )
-from modules.generator import get_answer
+from modules.llm_gateway import llm_gateway
 from log_helper import logger
+from config import (RETRIEVAL_WORKERS,
+                    MAX_CONCURRENT_QUERIES,
+                    QUERY_TIMEOUT_SECONDS,
+                    QUERY_BATCHING_ENABLED,
+                    EMBEDDING_BACKEND,
+                    BATCH_MAX_QUERIES,
+                    INDEX_REFRESH_SECONDS)
 
 
+# Model, FAISS index, document store & LLM client are loaded by `warm_up` after the server starts
+embedding_model = None
+index_manager: Optional[IndexManager] = None
+query_batcher: Optional[QueryBatcher] = None
+startup_status: Dict[str, Any] = {
+    "embedding_model": False,
+    "index": False,
+    "llm": False,
+    "error": None,
+}
 
-# Initialize FastAPI app
-app = FastAPI(title="JobMentor AI", description="AI-powered job mentoring API", version="1.0")
+# Index loaded by `preload` in the parent process of `serve.py`, before it forks the workers
+preloaded_index_manager: Optional[IndexManager] = None
+# Set in the workers of `serve.py`: they accept connections only once warmed up, call `on_ready`
+# then, and leave picking up rebuilt index versions to the parent, which replaces them
+prefork_worker = False
+on_ready: Optional[Callable[[], None]] = None
+
+# Bounded pool for CPU-bound retrieval and a cap on queries in flight
+retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+query_slots = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
+
+
+def preload() -> None:
+    """
+    Loads the PyTorch embedding model weights and the live index version before
+    `serve.py` forks its workers, so that the workers share those memory pages
+    instead of each loading a copy. Nothing is run here: thread pools started by
+    inference (and ONNX Runtime sessions) do not survive a fork, so the forward
+    pass, the ONNX model and the LLM clients are left to each worker's `warm_up`.
+
+    Raises:
+        RuntimeError: If the index on disk is missing or outdated and must be rebuilt first.
+    """
+    global preloaded_index_manager
+    # cached by `load_embedding_model`, which returns it again in the workers
+    model = load_embedding_model("torch") if EMBEDDING_BACKEND == "torch" else None
+    manager = IndexManager(model)
+    manager.load(allow_rebuild=False)
+    preloaded_index_manager = manager
+
+
+def warm_up() -> None:
+    """
+    Loads the embedding model, the FAISS index and the LLM providers, in that order.
+    Runs on a background thread so the server answers `/healthz` right away;
+    `/readyz` reports ready once everything is loaded.
+    """
+    global embedding_model, index_manager, query_batcher
+    start_time = time.perf_counter()
+    try:
+        model = load_embedding_model()
+        # the first forward pass initializes the model's kernels
+        model.embed_query("warm up")
+        startup_status["embedding_model"] = True
+
+        manager = preloaded_index_manager or IndexManager(model)
+        # Cached answers are only valid for the index version they were retrieved from
+        if answer_cache is not None:
+            manager.add_listener(lambda active: answer_cache.invalidate(active.version))
+        if preloaded_index_manager is not None:
+            manager.set_embedding_model(model)
+            # another worker may have rebuilt the index since it was preloaded
+            manager.refresh()
+        else:
+            manager.load()
+        if EMBEDDING_BACKEND != "torch":
+            try:
+                manager.check_embedding_parity()
+            except ValueError as e:
+                logger.error(f"{EMBEDDING_BACKEND} embedding backend rejected: {str(e)} Falling back to torch.")
+                model = load_embedding_model("torch")
+                manager.set_embedding_model(model)
+        startup_status["index"] = True
+
+        llm_gateway.load()
+        startup_status["llm"] = True
+
+        # Concurrent queries are embedded and searched together in micro-batches
+        query_batcher = QueryBatcher(model, retrieval_executor) if QUERY_BATCHING_ENABLED else None
+        embedding_model, index_manager = model, manager
+    except Exception as e:
+        logger.error(f"Startup failed: {str(e)}")
+        startup_status["error"] = str(e)
+        return
+
+    logger.info(f"Service ready in {time.perf_counter() - start_time:.1f}s.")
+    if on_ready is not None:
+        on_ready()
+
+
+def is_ready() -> bool:
+    """Returns whether the model, index and LLM client are loaded."""
+    return index_manager is not None
+
+
+def require_ready() -> None:
+    """
+    Raises:
+        HTTPException: 503 while the service is still starting.
+    """
+    if not is_ready():
+        raise HTTPException(status_code=503, detail="Service is starting", headers={"Retry-After": "5"})
+
+
+async def refresh_index() -> None:
+    """
+    Periodically picks up index versions rebuilt by other worker processes
+    serving the same index files, so that all workers serve the same version.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(INDEX_REFRESH_SECONDS)
+        if index_manager is None:
+            continue
+        try:
+            await loop.run_in_executor(None, index_manager.refresh)
+        except Exception as e:
+            logger.error(f"Could not refresh the FAISS index: {str(e)}")
 
 
-# Load model & FAISS index at startup
-embedding_model = load_embedding_model()
-faiss_index = load_index()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up_task = asyncio.get_running_loop().run_in_executor(None, warm_up)
+    if prefork_worker:
+        # the server starts accepting connections once the lifespan has started
+        await warm_up_task
+    refresh_task = asyncio.create_task(refresh_index()) if INDEX_REFRESH_SECONDS > 0 and not prefork_worker else None
+    yield
+    if refresh_task is not None:
+        refresh_task.cancel()
+    if not warm_up_task.done():
+        logger.warning("Shutting down before startup completed.")
+    if query_batcher is not None:
+        await query_batcher.stop()
+    retrieval_executor.shutdown(wait=False)
+
+
+# Initialize FastAPI app
+app = FastAPI(title="JobMentor AI", description="AI-powered job mentoring API", version="1.0", lifespan=lifespan)
 
 
 @app.get("/", tags=["test"])
@@ -30,28 +183,222 @@ def test_api():
     return {"status": "running"}
 
 
+@app.get("/healthz", tags=["Monitoring"])
+def liveness():
+    """
+    Liveness probe: the process is serving requests and startup has not failed.
+    """
+    if startup_status["error"] is not None:
+        return JSONResponse({"status": "failed", "error": startup_status["error"]}, status_code=503)
+    return {"status": "alive"}
+
+
+@app.get("/readyz", tags=["Monitoring"])
+def readiness():
+    """
+    Readiness probe: the embedding model, FAISS index and LLM client are loaded.
+    """
+    status = {**startup_status, "ready": is_ready()}
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+def query_filters(region: Optional[str], min_salary: Optional[float], education: Optional[str]) -> Optional[MetadataFilter]:
+    """
+    Builds the metadata filter of a query from its parameters.
+
+    Raises:
+        HTTPException: 400 if a region or education level is unknown.
+    """
+    filters = MetadataFilter(region, min_salary, education)
+    if filters.is_empty():
+        return None
+    try:
+        index_manager.current().doc_store.metadata.validate(filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return filters
+
+
 @app.get("/query/", tags=["Get Answers"])
-def get_answers(query: str):
+async def get_answers(
+    query: str,
+    region: Optional[str] = None,
+    min_salary: Optional[float] = None,
+    education: Optional[str] = None
+):
     """
-    API endpoint to get answers from RAG AI
+    API endpoint to get answers from RAG AI.
+    Optional `region`, `min_salary` and `education` restrict the search to matching job profiles.
     """
+    require_ready()
     logger.info(f"Received query: {query}")
+    metrics.increment("queries")
+    filters = query_filters(region, min_salary, education)
+    start_time = time.perf_counter()
 
     try:
-        
-        response = get_answer(query, embedding_model, faiss_index)
+        async with query_slots:
+            # pin one index version for the whole request
+            active = index_manager.current()
+            response = await asyncio.wait_for(
+                aget_answer(
+                    query, embedding_model, active.index, active.doc_store,
+                    retrieval_executor, active.version, query_batcher, filters
+                ),
+                timeout=QUERY_TIMEOUT_SECONDS
+            )
 
+        metrics.observe("request", time.perf_counter() - start_time)
         return response
 
+    except asyncio.TimeoutError:
+        logger.error(f"Query timed out after {QUERY_TIMEOUT_SECONDS}s: '{query}'")
+        metrics.increment("query_timeouts")
+        raise HTTPException(status_code=504, detail="Query timed out")
+
     except Exception as e:
         logger.error(f"Error processing query '{query}': {str(e)}")
+        metrics.increment("query_errors")
         raise HTTPException(status_code=500, detail="Internal Server Error")
     
 
+@app.get("/query/stream", tags=["Get Answers"])
+async def stream_answers(
+    query: str,
+    region: Optional[str] = None,
+    min_salary: Optional[float] = None,
+    education: Optional[str] = None
+):
+    """
+    API endpoint streaming answers from RAG AI as server-sent events.
+    Sends a `context` event with the retrieved context, then `token` events
+    as the answer is generated, and a final `done` or `error` event.
+    Takes the same filters as `/query/`.
+    """
+    require_ready()
+    logger.info(f"Received streamed query: {query}")
+    metrics.increment("queries")
+    filters = query_filters(region, min_salary, education)
+
+    # pin one index version for the whole request
+    active = index_manager.current()
+
+    async def events():
+        async with query_slots:
+            try:
+                async for event, payload in astream_answer(
+                    query, embedding_model, active.index, active.doc_store,
+                    retrieval_executor, active.version, query_batcher, filters
+                ):
+                    yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+            except Exception as e:
+                logger.error(f"Error streaming query '{query}': {str(e)}")
+                metrics.increment("query_errors")
+                payload = {"status": "Error", "message": "Internal Server Error"}
+                yield f"event: error\ndata: {json.dumps(payload)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    
+
+class BatchQueryRequest(BaseModel):
+    """Request body of `/query/batch`."""
+    queries: List[str]
+    # stream results as NDJSON lines in completion order instead of one JSON response
+    stream: bool = False
+
+
+@app.post("/query/batch", tags=["Get Answers"])
+async def get_answers_batch(request: BatchQueryRequest):
+    """
+    API endpoint answering a list of queries in one request.
+    Each result carries its position in `queries` and its own status.
+    """
+    require_ready()
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    if len(request.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_QUERIES} queries per batch")
+
+    logger.info(f"Received batch of {len(request.queries)} queries")
+
+    # pin one index version for the whole batch
+    active = index_manager.current()
+    answers = aget_answers_batch(
+        request.queries, embedding_model, active.index, active.doc_store, retrieval_executor, active.version
+    )
+
+    if request.stream:
+        async def lines():
+            try:
+                async for position, result in answers:
+                    yield json.dumps({"index": position, **result}) + "\n"
+            except Exception as e:
+                logger.error(f"Error processing query batch: {str(e)}")
+                yield json.dumps({"status": "Error", "message": "Internal Server Error"}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    try:
+        results = [None] * len(request.queries)
+        async for position, result in answers:
+            results[position] = {"index": position, **result}
+    except Exception as e:
+        logger.error(f"Error processing query batch: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+    return {"status": "Success", "results": results}
+
+
+@app.get("/cache/stats", tags=["Monitoring"])
+def answer_cache_stats():
+    """
+    API endpoint reporting hit/miss counters of the semantic answer cache.
+    """
+    if answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **answer_cache.stats()}
+
+
+@app.get("/llm/stats", tags=["Monitoring"])
+def llm_stats():
+    """
+    API endpoint reporting the circuit breaker state, recent p95 latency and
+    hedging delay of every LLM provider, primary first.
+    """
+    return llm_gateway.stats()
+
+
+@app.get("/metrics", tags=["Monitoring"], response_class=PlainTextResponse)
+def prometheus_metrics():
+    """
+    API endpoint exposing per-stage latency quantiles and event counters
+    in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/update_index/")
 def update_faiss_index():
     """
     API endpoint to update FAISS index when new job profiles are added.
+    The index is rebuilt in the background and swapped in once it is ready.
+    """
+    require_ready()
+    if not index_manager.rebuild_in_background():
+        return {"status": "Running", "message": "FAISS index update is already in progress."}
+
+    logger.info("FAISS index rebuild started.")
+    return {"status": "Success", "message": "FAISS index update started. New profiles will be served once it completes."}
+
+
+@app.get("/update_index/status")
+def update_faiss_index_status():
+    """
+    API endpoint to check the progress of the last FAISS index update.
     """
-    create_index(embedding_model)
-    return {"status": "Success", "message": "FAISS index updated successfully."}
+    require_ready()
+    return index_manager.status()
@@ -0,0 +1,171 @@
+# ann_index.py
+
+from typing import Any, Dict
+
+import math
+
+import faiss
+import numpy as np
+
+from log_helper import logger
+from config import (INDEX_TYPE,
+                    IVF_NLIST,
+                    IVF_NPROBE,
+                    IVF_TRAIN_SAMPLE,
+                    PQ_M,
+                    PQ_NBITS,
+                    HNSW_M,
+                    HNSW_EF_CONSTRUCTION,
+                    HNSW_EF_SEARCH)
+
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# k-means needs this many training points per centroid to give useful clusters
+MIN_POINTS_PER_CENTROID = 39
+
+# most a filtered search widens nprobe/efSearch to make up for the vectors it skips
+MAX_FILTERED_SEARCH_WIDENING = 16
+
+
+def resolve_index_spec(num_vectors: int, dimension: int, index_type: str = INDEX_TYPE) -> Dict[str, Any]:
+    """
+    Resolves the configured index type and build parameters for a corpus size,
+    falling back to a simpler type when there is too little data to train it.
+
+    Args:
+        num_vectors (int): Number of vectors to index.
+        dimension (int): Embedding dimension.
+        index_type (str): One of `INDEX_TYPES`.
+
+    Returns:
+        Dict[str, Any]: The index spec, stored with the index so it can be reopened correctly.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown INDEX_TYPE '{index_type}'. Expected one of {INDEX_TYPES}.")
+
+    if index_type == "ivf_pq" and (dimension % PQ_M or num_vectors < MIN_POINTS_PER_CENTROID * 2 ** PQ_NBITS):
+        logger.warning(f"IVF-PQ needs PQ_M to divide {dimension} and enough vectors to train. Using ivf_flat.")
+        index_type = "ivf_flat"
+
+    nlist = min(IVF_NLIST, num_vectors // MIN_POINTS_PER_CENTROID)
+    if index_type.startswith("ivf") and nlist < 2:
+        logger.warning(f"Too few vectors ({num_vectors}) to train an IVF index. Using flat.")
+        index_type = "flat"
+
+    if index_type == "ivf_flat":
+        return {"index_type": index_type, "nlist": nlist}
+    if index_type == "ivf_pq":
+        return {"index_type": index_type, "nlist": nlist, "pq_m": PQ_M, "pq_nbits": PQ_NBITS}
+    if index_type == "hnsw":
+        return {"index_type": index_type, "hnsw_m": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION}
+    return {"index_type": "flat"}
+
+
+def create_faiss_index(dimension: int, spec: Dict[str, Any]) -> faiss.Index:
+    """
+    Creates an empty inner-product index for a spec. Every index accepts
+    `add_with_ids` and can reconstruct vectors by id: IVF indexes natively
+    (with a hashtable direct map), the others through an `IndexIDMap2`.
+
+    Args:
+        dimension (int): Embedding dimension.
+        spec (Dict[str, Any]): Spec returned by `resolve_index_spec`.
+
+    Returns:
+        faiss.Index: The new, possibly untrained, index.
+    """
+    index_type = spec["index_type"]
+    if index_type == "ivf_flat":
+        description = f"IVF{spec['nlist']},Flat"
+    elif index_type == "ivf_pq":
+        description = f"IVF{spec['nlist']},PQ{spec['pq_m']}x{spec['pq_nbits']}"
+    elif index_type == "hnsw":
+        description = f"IDMap2,HNSW{spec['hnsw_m']},Flat"
+    else:
+        description = "IDMap2,Flat"
+
+    index = faiss.index_factory(dimension, description, faiss.METRIC_INNER_PRODUCT)
+    if index_type.startswith("ivf"):
+        faiss.extract_index_ivf(index).set_direct_map_type(faiss.DirectMap.Hashtable)
+    elif index_type == "hnsw":
+        _hnsw_index(index).hnsw.efConstruction = spec["ef_construction"]
+    return index
+
+
+def train_faiss_index(index: faiss.Index, vectors: np.ndarray) -> None:
+    """
+    Trains an index that needs it (IVF variants) on a random sample of the vectors.
+
+    Args:
+        index (faiss.Index): Index returned by `create_faiss_index`.
+        vectors (np.ndarray): Normalized vectors to sample training points from.
+    """
+    if index.is_trained:
+        return
+
+    if len(vectors) > IVF_TRAIN_SAMPLE:
+        rows = np.random.default_rng(0).choice(len(vectors), IVF_TRAIN_SAMPLE, replace=False)
+        vectors = vectors[np.sort(rows)]
+
+    logger.info(f"Training FAISS index on {len(vectors)} vectors...")
+    index.train(vectors)
+
+
+def configure_search(index: faiss.Index, spec: Dict[str, Any]) -> None:
+    """
+    Applies the configured search-time parameters (nprobe, efSearch) to an index.
+
+    Args:
+        index (faiss.Index): A loaded or newly built index.
+        spec (Dict[str, Any]): The spec the index was built with.
+    """
+    if spec["index_type"].startswith("ivf"):
+        ivf_index = faiss.extract_index_ivf(index)
+        ivf_index.nprobe = min(IVF_NPROBE, spec["nlist"])
+        if ivf_index.direct_map.type == faiss.DirectMap.NoMap:
+            # indexes saved without a direct map cannot reconstruct the vectors MMR compares
+            ivf_index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    elif spec["index_type"] == "hnsw":
+        _hnsw_index(index).hnsw.efSearch = HNSW_EF_SEARCH
+
+
+def filtered_search_parameters(index: faiss.Index, selector: faiss.IDSelector, selectivity: float) -> faiss.SearchParameters:
+    """
+    Builds search parameters restricting a search to the ids accepted by a selector.
+
+    IVF and HNSW searches only explore part of the index, so with a selective
+    filter they may run out of allowed vectors before finding k. Their nprobe
+    and efSearch are widened in proportion to the fraction of vectors filtered
+    out, up to `MAX_FILTERED_SEARCH_WIDENING` times the configured value.
+
+    Args:
+        index (faiss.Index): A configured index (see `configure_search`).
+        selector (faiss.IDSelector): Accepts the ids the search may return.
+        selectivity (float): Fraction of the indexed vectors accepted by `selector`.
+
+    Returns:
+        faiss.SearchParameters: Parameters of the type the index expects.
+    """
+    widening = min(MAX_FILTERED_SEARCH_WIDENING, 1 / max(selectivity, 1e-9))
+
+    ivf_index = faiss.try_extract_index_ivf(index)
+    if ivf_index is not None:
+        nprobe = min(ivf_index.nlist, math.ceil(ivf_index.nprobe * widening))
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+
+    inner_index = _hnsw_index(index)
+    if isinstance(inner_index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=math.ceil(inner_index.hnsw.efSearch * widening))
+
+    return faiss.SearchParameters(sel=selector)
+
+
+def _hnsw_index(index: faiss.Index) -> faiss.Index:
+    """Returns the HNSW index wrapped by an `IndexIDMap` or `IndexIDMap2`."""
+    return faiss.downcast_index(index.index if isinstance(index, faiss.IndexIDMap) else index)
+
+
+def supports_removal(spec: Dict[str, Any]) -> bool:
+    """Returns whether vectors can be removed in place (HNSW graphs do not support it)."""
+    return spec["index_type"] != "hnsw"
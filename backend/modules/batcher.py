@@ -0,0 +1,118 @@
+# batcher.py
+
+import asyncio
+from concurrent.futures import Executor
+from typing import List, Optional, Set, Tuple
+
+from log_helper import logger
+from modules.doc_store import DocumentStore
+from modules.retrieval import RetrievalResult, retrieve_batch
+from config import QUERY_BATCH_MAX_SIZE, QUERY_BATCH_WINDOW_MS
+
+
+class QueryBatcher:
+    """
+    Micro-batching scheduler between the API and retrieval.
+
+    Queries arriving within `max_wait_ms` of each other (up to `max_batch_size`)
+    are embedded in one forward pass and searched with one FAISS call on the
+    stacked query matrix; each caller then receives its own result.
+    """
+
+    def __init__(
+        self,
+        embedding_model,
+        executor: Optional[Executor] = None,
+        max_batch_size: int = QUERY_BATCH_MAX_SIZE,
+        max_wait_ms: float = QUERY_BATCH_WINDOW_MS
+    ):
+        self._embedding_model = embedding_model
+        self._executor = executor
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._batches: Set[asyncio.Task] = set()
+
+    async def retrieve(self, user_query: str, faiss_index, doc_store: DocumentStore) -> RetrievalResult:
+        """
+        Queues a query for the next batch and waits for its result.
+
+        Args:
+            user_query (str): User's search query.
+            faiss_index (faiss.Index): Index version pinned by the caller.
+            doc_store (DocumentStore): Document store built together with `faiss_index`.
+
+        Returns:
+            RetrievalResult: The retrieval result for `user_query`.
+        """
+        if self._collector is None:
+            self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((user_query, faiss_index, doc_store, future))
+        return await future
+
+    def start(self) -> None:
+        """Starts collecting batches on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._collector = asyncio.create_task(self._collect())
+
+    async def stop(self) -> None:
+        """Stops collecting batches; queued queries are cancelled."""
+        if self._collector is None:
+            return
+        self._collector.cancel()
+        await asyncio.gather(self._collector, *self._batches, return_exceptions=True)
+        while not self._queue.empty():
+            self._queue.get_nowait()[-1].cancel()
+        self._collector = None
+
+    async def _collect(self) -> None:
+        """Groups queued queries into batches and dispatches each batch without waiting for it."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._max_wait
+            while len(batch) < self._max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, object, DocumentStore, asyncio.Future]]) -> None:
+        """Runs retrieval for a batch on the executor and resolves the waiting futures."""
+        # a hot-swap may land inside a batch window, so search each pinned index version separately
+        groups = {}
+        for item in batch:
+            if not item[3].cancelled():
+                groups.setdefault(id(item[1]), []).append(item)
+
+        loop = asyncio.get_running_loop()
+        for items in groups.values():
+            user_queries = [item[0] for item in items]
+            _, faiss_index, doc_store, _ = items[0]
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, retrieve_batch, user_queries, self._embedding_model, faiss_index, doc_store
+                )
+            except Exception as e:
+                logger.error(f"Batched retrieval of {len(items)} queries failed: {str(e)}")
+                for *_, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (*_, future), result in zip(items, results):
+                if not future.done():
+                    future.set_result(result)
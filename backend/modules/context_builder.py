@@ -0,0 +1,189 @@
+# context_builder.py
+
+import math
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from modules.doc_store import DocumentStore, JobChunk, WHOLE_PROFILE
+from modules.loader import PROFILE_SECTIONS
+from config import CONTEXT_TOKEN_BUDGET, CHARS_PER_TOKEN, TOP_K
+
+
+# sections ranked by how much they help answer career questions; on equal scores
+# the later ones are the first to be trimmed when the budget runs out
+SECTION_PRIORITY = ("description", "skills", "education", "day_in_life", "employers")
+
+# smallest remainder of the budget worth filling with a truncated section
+MIN_TRUNCATED_TOKENS = 24
+
+_SECTION_LABELS = {label: key for key, label in PROFILE_SECTIONS}
+_SECTION_ORDER = {key: position for position, (key, _) in enumerate(PROFILE_SECTIONS)}
+
+
+class ContextResult(NamedTuple):
+    """Context assembled for the LLM within a token budget."""
+    text: str
+    # estimated tokens of `text`
+    tokens: int
+    # profiles and chunks that made it into the context, best first
+    doc_ids: Tuple[int, ...]
+    chunk_ids: Tuple[int, ...]
+    # matching sections left out (or cut short) to stay within the budget
+    sections_dropped: int
+
+
+class _Section(NamedTuple):
+    """One candidate section of a matching profile."""
+    rank: int
+    key: str
+    text: str
+    score: float
+    chunk_ids: Tuple[int, ...]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of LLM tokens of a text from its length.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: Estimated token count (`CHARS_PER_TOKEN` characters per token).
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def build_context(
+    doc_store: DocumentStore,
+    hits: Sequence[Tuple[int, float]],
+    limit: int = TOP_K,
+    token_budget: int = CONTEXT_TOKEN_BUDGET
+) -> ContextResult:
+    """
+    Assembles the LLM context of a query from its chunk hits within a token budget.
+
+    Matching sections are ranked by retrieval score (ties broken by
+    `SECTION_PRIORITY`) and added until the budget is spent, so the least
+    relevant sections are trimmed first. Overlapping windows of the same
+    section are merged so shared words are sent once. The kept sections are
+    rendered per profile, in profile order, under the profile's role.
+
+    Args:
+        doc_store (DocumentStore): Job profiles and chunks the hits refer to.
+        hits (Sequence[Tuple[int, float]]): (chunk id, similarity score) pairs, best match first.
+        limit (int): Maximum number of profiles in the context.
+        token_budget (int): Maximum estimated tokens of the context.
+
+    Returns:
+        ContextResult: The context, its estimated size and what it was built from.
+    """
+    scores: Dict[int, float] = {}
+    for chunk_id, score in hits:
+        scores.setdefault(int(chunk_id), float(score))
+
+    matches = doc_store.group_chunks(scores.keys(), limit)
+    candidates: List[_Section] = []
+    for rank, (document, chunks) in enumerate(matches):
+        candidates.extend(_sections(rank, document.text, chunks, scores))
+
+    candidates.sort(key=lambda section: (-section.score, _priority(section.key)))
+
+    headers = [f"Role: {document.job_role}" for document, _ in matches]
+    kept: Dict[int, List[_Section]] = {}
+    remaining = token_budget
+    dropped = 0
+    for section in candidates:
+        # the role line is paid for once, by the first section kept from a profile
+        header_cost = 0 if section.rank in kept else estimate_tokens(headers[section.rank] + "\n")
+        cost = header_cost + estimate_tokens(section.text + "\n")
+        if cost > remaining:
+            dropped += 1
+            # the best section is always kept, however short the budget
+            minimum = MIN_TRUNCATED_TOKENS if kept else 1
+            truncated = _truncate(section.text, (remaining - header_cost) * CHARS_PER_TOKEN, minimum)
+            if truncated is None:
+                continue
+            section = section._replace(text=truncated)
+            cost = header_cost + estimate_tokens(section.text + "\n")
+        kept.setdefault(section.rank, []).append(section)
+        remaining -= cost
+
+    blocks = []
+    doc_ids = []
+    chunk_ids = []
+    for rank in sorted(kept):
+        sections = sorted(kept[rank], key=lambda section: _SECTION_ORDER.get(section.key, len(_SECTION_ORDER)))
+        blocks.append("\n".join([headers[rank]] + [section.text for section in sections]))
+        doc_ids.append(matches[rank][0].doc_id)
+        chunk_ids.extend(dict.fromkeys(chunk_id for section in sections for chunk_id in section.chunk_ids))
+
+    text = "\n\n".join(blocks)
+    return ContextResult(text, estimate_tokens(text), tuple(doc_ids), tuple(chunk_ids), dropped)
+
+
+def _priority(key: str) -> int:
+    """Returns the position of a section in `SECTION_PRIORITY` (unknown sections last)."""
+    return SECTION_PRIORITY.index(key) if key in SECTION_PRIORITY else len(SECTION_PRIORITY)
+
+
+def _sections(rank: int, profile_text: str, chunks: List[JobChunk], scores: Dict[int, float]) -> List[_Section]:
+    """
+    Turns the matching chunks of a profile into candidate sections.
+
+    A whole-profile chunk is split into its sections, which all share the
+    chunk's score. Consecutive windows of the same section are merged into one
+    candidate scored by its best window.
+    """
+    sections: List[_Section] = []
+    for chunk in chunks:
+        score = scores[chunk.chunk_id]
+        if chunk.section == WHOLE_PROFILE:
+            sections.extend(
+                _Section(rank, key, text, score, (chunk.chunk_id,)) for key, text in _split_profile(profile_text)
+            )
+            continue
+
+        previous = sections[-1] if sections else None
+        if previous is not None and previous.key == chunk.section:
+            sections[-1] = previous._replace(
+                text=_merge_windows(previous.text, chunk.text),
+                score=max(previous.score, score),
+                chunk_ids=previous.chunk_ids + (chunk.chunk_id,)
+            )
+        else:
+            sections.append(_Section(rank, chunk.section, chunk.text, score, (chunk.chunk_id,)))
+    return sections
+
+
+def _split_profile(profile_text: str) -> List[Tuple[str, str]]:
+    """Splits a rendered profile (see `loader.profile_to_text`) into (section key, "Label: value") pairs, without the role."""
+    sections: List[List[str]] = []
+    for line in profile_text.split("\n"):
+        label = line.split(": ", 1)[0]
+        if label in _SECTION_LABELS:
+            sections.append([_SECTION_LABELS[label], line])
+        elif sections:
+            # a value spanning several lines
+            sections[-1][1] += "\n" + line
+    return [(key, text) for key, text in sections]
+
+
+def _merge_windows(first: str, second: str) -> str:
+    """Joins two windows of one section ("Label: words"), dropping the words they overlap on."""
+    second_body = second.partition(": ")[2]
+    first_words = first.split(" ")
+    second_words = second_body.split(" ")
+    for overlap in range(min(len(first_words), len(second_words)), 0, -1):
+        if first_words[-overlap:] == second_words[:overlap]:
+            return " ".join(first_words + second_words[overlap:])
+    # the windows are not adjacent
+    return f"{first} … {second_body}"
+
+
+def _truncate(text: str, max_chars: int, min_tokens: int) -> Optional[str]:
+    """Cuts a section at a word boundary to fit `max_chars`, or returns None if less than `min_tokens` would be left."""
+    if max_chars < max(min_tokens * CHARS_PER_TOKEN, 4):
+        return None
+    # room for the newline and the ellipsis
+    cut = text[:max_chars - 3].rsplit(" ", 1)[0]
+    return f"{cut} …"
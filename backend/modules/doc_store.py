@@ -0,0 +1,252 @@
+# doc_store.py
+
+import pickle
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from log_helper import logger
+from modules.loader import chunk_profile, profile_id, profile_to_text, text_hash
+from config import CHUNKING
+
+if TYPE_CHECKING:
+    from modules.lexical_index import LexicalIndex
+    from modules.metadata_store import MetadataStore
+
+
+class JobDocument(NamedTuple):
+    """A job profile kept in compact form: pre-rendered text plus its structured fields."""
+    doc_id: int
+    job_role: str
+    text: str
+    content_hash: str
+    skills: Tuple[str, ...]
+    education: Tuple[str, ...]
+    employers: Tuple[str, ...]
+    salary: Tuple[dict, ...]
+
+
+class JobChunk(NamedTuple):
+    """A separately embedded part of a job profile, pointing back to its parent document."""
+    chunk_id: int
+    doc_id: int
+    # profile section the chunk comes from, or "profile" for a whole-profile chunk
+    section: str
+    text: str
+    content_hash: str
+
+
+# section of the single chunk of a profile indexed as a whole
+WHOLE_PROFILE = "profile"
+
+
+class DocumentStore:
+    """
+    In-memory store of job profiles and of the chunks embedded in the FAISS index.
+    Document and chunk ids are derived from each profile's stable key, not its row position.
+
+    Each chunk points back to its parent profile, so search hits on chunks can be
+    grouped per profile. When profiles are indexed whole, each profile has a single
+    chunk whose id is the profile id.
+
+    The store is built once (at startup or when the index is rebuilt) so that
+    queries only do O(1) id lookups instead of re-parsing the dataset. The BM25
+    index over its chunks and the metadata used to filter searches are attached
+    as `lexical_index` and `metadata` by the index manager.
+    """
+
+    def __init__(self, documents: Iterable[JobDocument], chunks: Optional[Iterable[JobChunk]] = None):
+        self._documents: List[JobDocument] = list(documents)
+        self._positions: Dict[int, int] = {
+            doc.doc_id: position for position, doc in enumerate(self._documents)
+        }
+        if chunks is None:
+            chunks = (
+                JobChunk(doc.doc_id, doc.doc_id, WHOLE_PROFILE, doc.text, doc.content_hash) for doc in self._documents
+            )
+        self._chunks: List[JobChunk] = list(chunks)
+        self._chunk_positions: Dict[int, int] = {
+            chunk.chunk_id: position for position, chunk in enumerate(self._chunks)
+        }
+        # BM25 index over the chunks, persisted separately from the store
+        self.lexical_index: Optional["LexicalIndex"] = None
+        # structured fields of the profiles, derived from the documents
+        self.metadata: Optional["MetadataStore"] = None
+
+    @classmethod
+    def from_profiles(cls, job_profiles: Iterable[dict], chunking: str = CHUNKING) -> "DocumentStore":
+        """
+        Builds a store from structured job profiles, keyed by their stable FAISS ids.
+
+        Args:
+            job_profiles (Iterable[dict]): Job profiles as returned by `loader.iter_jobs_data`, consumed one at a time.
+            chunking (str): "section" to split profiles into section chunks, "profile" to index them whole.
+
+        Returns:
+            DocumentStore: The populated document store.
+        """
+        if chunking not in ("section", WHOLE_PROFILE):
+            raise ValueError(f"Unknown CHUNKING '{chunking}'. Expected 'section' or 'profile'.")
+
+        documents = {}
+        chunks = [] if chunking == "section" else None
+        for profile in job_profiles:
+            doc_id = profile_id(profile["profile_key"])
+            if doc_id in documents:
+                logger.warning(f"Duplicate job profile key '{profile['profile_key']}' skipped.")
+                continue
+
+            text = profile_to_text(profile)
+            documents[doc_id] = JobDocument(
+                doc_id=doc_id,
+                job_role=profile["job_role"],
+                text=text,
+                content_hash=text_hash(text),
+                skills=tuple(profile["skills"]),
+                education=tuple(profile["education"]),
+                employers=tuple(profile["employers"]),
+                salary=tuple(profile["salary"]),
+            )
+
+            if chunks is not None:
+                seen = {}
+                for section, chunk_text in chunk_profile(profile):
+                    number = seen[section] = seen.get(section, -1) + 1
+                    # the role is embedded with every chunk so sections stay attributable
+                    embedded_text = f"Role: {profile['job_role']}\n{chunk_text}"
+                    chunks.append(JobChunk(
+                        chunk_id=profile_id(f"{profile['profile_key']}#{section}#{number}"),
+                        doc_id=doc_id,
+                        section=section,
+                        text=chunk_text,
+                        content_hash=text_hash(embedded_text),
+                    ))
+
+        store = cls(documents.values(), chunks)
+        logger.info(f"Document store built with {len(store)} job profiles and {store.num_chunks} chunks.")
+        return store
+
+    @classmethod
+    def load(cls, path: str) -> "DocumentStore":
+        """
+        Loads a document store previously written with `save`.
+
+        Args:
+            path (str): Path of the pickled document store.
+
+        Returns:
+            DocumentStore: The loaded document store.
+        """
+        with open(path, "rb") as file:
+            data = pickle.load(file)
+        if isinstance(data, list):
+            # written before chunking: one whole-profile chunk per document
+            return cls(JobDocument(*doc) for doc in data)
+        return cls(
+            (JobDocument(*doc) for doc in data["documents"]),
+            (JobChunk(*chunk) for chunk in data["chunks"])
+        )
+
+    def save(self, path: str) -> None:
+        """
+        Writes the documents and chunks to `path` as plain tuples.
+
+        Args:
+            path (str): Destination file path.
+        """
+        data = {
+            "documents": [tuple(doc) for doc in self._documents],
+            "chunks": [tuple(chunk) for chunk in self._chunks],
+        }
+        with open(path, "wb") as file:
+            pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    @property
+    def num_chunks(self) -> int:
+        """Number of chunks, i.e. of vectors in the FAISS index built from this store."""
+        return len(self._chunks)
+
+    @property
+    def chunking(self) -> str:
+        """Returns "profile" if every profile is indexed whole, "section" otherwise."""
+        if all(chunk.section == WHOLE_PROFILE for chunk in self._chunks):
+            return WHOLE_PROFILE
+        return "section"
+
+    def __iter__(self) -> Iterator[JobDocument]:
+        return iter(self._documents)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return int(doc_id) in self._positions
+
+    def get(self, doc_id: int) -> Optional[JobDocument]:
+        """Returns the document for a FAISS id, or None if the id is unknown."""
+        position = self._positions.get(int(doc_id))
+        return None if position is None else self._documents[position]
+
+    def get_many(self, doc_ids: Iterable[int]) -> List[JobDocument]:
+        """Returns the documents for the given FAISS ids, skipping unknown ids (e.g. FAISS `-1` padding)."""
+        documents = (self.get(doc_id) for doc_id in doc_ids)
+        return [doc for doc in documents if doc is not None]
+
+    def ids(self) -> List[int]:
+        """Returns the FAISS id of every document, in store order."""
+        return [doc.doc_id for doc in self._documents]
+
+    def hashes(self) -> List[str]:
+        """Returns the content hash of every document, in store order."""
+        return [doc.content_hash for doc in self._documents]
+
+    def texts(self) -> List[str]:
+        """Returns the rendered text of every document, in store order."""
+        return [doc.text for doc in self._documents]
+
+    def chunk_ids(self) -> List[int]:
+        """Returns the FAISS id of every chunk, in store order."""
+        return [chunk.chunk_id for chunk in self._chunks]
+
+    def chunk_hashes(self) -> List[str]:
+        """Returns the content hash of every chunk's embedded text, in store order."""
+        return [chunk.content_hash for chunk in self._chunks]
+
+    def chunk_texts(self) -> List[str]:
+        """Returns the text embedded for every chunk (section chunks are prefixed with the role), in store order."""
+        return [self._embedded_text(chunk) for chunk in self._chunks]
+
+    def chunk_doc_positions(self) -> List[int]:
+        """Returns the position of the parent profile of every chunk, in store order."""
+        return [self._positions[chunk.doc_id] for chunk in self._chunks]
+
+    def group_chunks(self, chunk_ids: Iterable[int], limit: int) -> List[Tuple[JobDocument, List[JobChunk]]]:
+        """
+        Groups ranked chunk hits by parent profile. Profiles are ranked by their
+        best chunk and their chunks are returned in profile order.
+
+        Args:
+            chunk_ids (Iterable[int]): Chunk ids, best match first. Unknown ids (e.g. FAISS `-1` padding) are skipped.
+            limit (int): Maximum number of profiles to return.
+
+        Returns:
+            List[Tuple[JobDocument, List[JobChunk]]]: Each matching profile with its matching chunks.
+        """
+        groups: Dict[int, List[int]] = {}
+        for chunk_id in chunk_ids:
+            position = self._chunk_positions.get(int(chunk_id))
+            if position is None:
+                continue
+            doc_id = self._chunks[position].doc_id
+            if doc_id not in groups and len(groups) == limit:
+                continue
+            groups.setdefault(doc_id, []).append(position)
+
+        return [
+            (self.get(doc_id), [self._chunks[position] for position in sorted(positions)])
+            for doc_id, positions in groups.items()
+        ]
+
+    def _embedded_text(self, chunk: JobChunk) -> str:
+        """Returns the text embedded for a chunk."""
+        if chunk.section == WHOLE_PROFILE:
+            return chunk.text
+        return f"Role: {self.get(chunk.doc_id).job_role}\n{chunk.text}"
@@ -0,0 +1,271 @@
+# embedding_cache.py
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows, where cache writes are only coordinated within a process
+    fcntl = None
+
+from log_helper import logger
+from modules.metrics import metrics
+from config import (EMBEDDING_CACHE_DIR,
+                    EMBEDDING_CACHE_MAX_ENTRIES,
+                    EMBEDDING_QUERY_LRU_SIZE)
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """
+    Holds an exclusive lock on `path` across processes. The file is opened for
+    every use, because forked processes sharing one open file would share its lock.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+class CachedEmbeddings:
+    """
+    Wraps an embedding model with a persistent cache keyed by (model name, text hash).
+
+    Vectors live in a memory-mapped float32 file with one slot per entry and
+    parallel memory-mapped key and last-use columns, so the cache survives
+    restarts and is shared by processes opening the same files (e.g. the
+    workers forked by `serve.py`). A slot is free while its key is 0; creating
+    the files, allocating slots and evicting them happen under a file lock, so
+    processes never hand out the same slot. Slots are evicted least recently
+    used once `max_entries` is reached. Hot query strings are also kept in an
+    in-process LRU in front of the disk cache.
+
+    Exposes the same `embed_documents` / `embed_query` interface as `HuggingFaceEmbeddings`.
+    """
+
+    def __init__(
+        self,
+        embedding_model,
+        model_name: str,
+        cache_dir: str = EMBEDDING_CACHE_DIR,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+        lru_size: int = EMBEDDING_QUERY_LRU_SIZE
+    ):
+        self._model = embedding_model
+        self._model_name = model_name
+        self._capacity = max_entries
+        self._lru: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._lru_size = lru_size
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._prefix = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+
+        self._lock_path = f"{self._prefix}.lock"
+
+        self._vectors: Optional[np.memmap] = None
+        self._keys: Optional[np.memmap] = None
+        # last use of each slot in nanoseconds since the epoch, comparable across processes
+        self._ticks: Optional[np.memmap] = None
+        # slots of the keys this process has seen; checked against the key column before use
+        self._slots: Dict[int, int] = {}
+        with _file_lock(self._lock_path):
+            self._open()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds texts, only running the model for texts missing from the cache.
+
+        Args:
+            texts (List[str]): Texts to embed.
+
+        Returns:
+            List[List[float]]: One embedding per text.
+        """
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            found = self._read(keys)
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            vectors = np.asarray(self._model.embed_documents(list(missing.values())), dtype=np.float32)
+            found.update(zip(missing.keys(), vectors))
+            with self._lock:
+                self._write(list(missing.keys()), vectors)
+
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses.")
+        metrics.increment("embedding_cache_hits", len(texts) - len(missing))
+        metrics.increment("embedding_cache_misses", len(missing))
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a query, serving repeated queries from the in-process LRU or the disk cache.
+
+        Args:
+            text (str): Query to embed.
+
+        Returns:
+            List[float]: The query embedding.
+        """
+        key = self._key(text)
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                metrics.increment("embedding_cache_hits")
+                return vector.tolist()
+            vector = self._read([key]).get(key)
+
+        metrics.increment("embedding_cache_hits" if vector is not None else "embedding_cache_misses")
+        if vector is None:
+            vector = np.asarray(self._model.embed_query(text), dtype=np.float32)
+            with self._lock:
+                self._write([key], vector.reshape(1, -1))
+
+        with self._lock:
+            self._lru[key] = vector
+            if len(self._lru) > self._lru_size:
+                self._lru.popitem(last=False)
+        return vector.tolist()
+
+    def _key(self, text: str) -> int:
+        """Returns the non-zero 64-bit cache key of a text for this model."""
+        digest = hashlib.blake2b(f"{self._model_name}\0{text}".encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") or 1
+
+    def _open(self) -> None:
+        """Opens existing cache files if they match the configured capacity; the caller must hold the file lock."""
+        meta_path = f"{self._prefix}.meta.json"
+        if not os.path.exists(meta_path):
+            return
+        try:
+            with open(meta_path, "r", encoding="utf-8") as file:
+                meta = json.load(file)
+            if meta["capacity"] != self._capacity:
+                logger.warning("Embedding cache capacity changed. Starting with an empty cache.")
+                return
+            self._map(meta["dimension"], mode="r+")
+        except Exception as e:
+            logger.warning(f"Could not open embedding cache ({str(e)}). Starting with an empty cache.")
+            self._vectors = self._keys = self._ticks = None
+            return
+
+        keys = np.asarray(self._keys)
+        used = np.flatnonzero(keys)
+        self._slots = {int(keys[slot]): int(slot) for slot in used}
+        logger.info(f"Embedding cache opened with {len(self._slots)} entries.")
+
+    def _create(self, dimension: int) -> None:
+        """
+        Creates empty cache files for vectors of `dimension` floats, unless
+        another process created them first. The metadata file is written last,
+        so processes only ever map complete files, and files another process
+        has mapped are never truncated.
+        """
+        with _file_lock(self._lock_path):
+            self._open()
+            if self._vectors is not None:
+                return
+            self._map(dimension, mode="w+")
+            with open(f"{self._prefix}.meta.json", "w", encoding="utf-8") as file:
+                json.dump({"model_name": self._model_name, "dimension": dimension, "capacity": self._capacity}, file)
+        self._slots = {}
+
+    def _map(self, dimension: int, mode: str) -> None:
+        """Memory-maps the vector, key and last-use files."""
+        self._vectors = np.memmap(
+            f"{self._prefix}.vectors.f32", dtype=np.float32, mode=mode, shape=(self._capacity, dimension)
+        )
+        self._keys = np.memmap(f"{self._prefix}.keys.u64", dtype=np.uint64, mode=mode, shape=(self._capacity,))
+        ticks_path = f"{self._prefix}.ticks.u64"
+        # caches written before the last-use column was shared have no ticks file
+        ticks_mode = mode if os.path.exists(ticks_path) else "w+"
+        self._ticks = np.memmap(ticks_path, dtype=np.uint64, mode=ticks_mode, shape=(self._capacity,))
+
+    def _read(self, keys: List[int]) -> Dict[int, np.ndarray]:
+        """Returns cached vectors for `keys`; the caller must hold the lock."""
+        found = {}
+        if self._vectors is None:
+            if not os.path.exists(f"{self._prefix}.meta.json"):
+                return found
+            # another process created the cache files
+            with _file_lock(self._lock_path):
+                self._open()
+            if self._vectors is None:
+                return found
+
+        unknown = [key for key in keys if key not in self._slots]
+        if unknown:
+            # entries written by other processes since this one indexed the cache
+            for slot in np.flatnonzero(np.isin(self._keys, np.array(unknown, dtype=np.uint64))).tolist():
+                self._slots[int(self._keys[slot])] = slot
+
+        now = time.time_ns()
+        for key in keys:
+            slot = self._slots.get(key)
+            if slot is None:
+                continue
+            vector = np.array(self._vectors[slot])
+            # another process may have reused the slot since we indexed it
+            if int(self._keys[slot]) != key:
+                del self._slots[key]
+                continue
+            self._ticks[slot] = now
+            found[key] = vector
+        return found
+
+    def _write(self, keys: List[int], vectors: np.ndarray) -> None:
+        """Stores vectors in free or evicted slots; the caller must hold the lock."""
+        if self._vectors is None:
+            self._create(vectors.shape[1])
+        if vectors.shape[1] != self._vectors.shape[1]:
+            return
+
+        with _file_lock(self._lock_path):
+            # skip keys another process stored in the meantime
+            new = np.flatnonzero(~np.isin(np.array(keys, dtype=np.uint64), self._keys)).tolist()
+            free = np.flatnonzero(self._keys == 0)
+            if len(free) < len(new):
+                self._evict(len(new) - len(free))
+                free = np.flatnonzero(self._keys == 0)
+
+            now = time.time_ns()
+            for position, slot in zip(new, free.tolist()):
+                # the slot's key is 0 until its vector is complete, so readers never pair the key with a partial vector
+                self._vectors[slot] = vectors[position]
+                self._keys[slot] = keys[position]
+                self._ticks[slot] = now
+                self._slots[keys[position]] = slot
+
+            self._vectors.flush()
+            self._keys.flush()
+
+    def _evict(self, needed: int) -> None:
+        """
+        Frees the least recently used sixteenth of the slots, or `needed` slots
+        if that is more; the caller must hold the file lock.
+        """
+        used = np.flatnonzero(self._keys)
+        count = min(len(used), max(needed, self._capacity // 16, 1))
+        victims = used[np.argpartition(self._ticks[used], count - 1)[:count]] if count < len(used) else used
+        for key in self._keys[victims].tolist():
+            self._slots.pop(int(key), None)
+        self._keys[victims] = 0
+        self._ticks[victims] = 0
+        logger.info(f"Embedding cache evicted {count} entries.")
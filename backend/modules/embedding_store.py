@@ -0,0 +1,142 @@
+# embedding_store.py
+
+import os
+import tempfile
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# rows copied at a time between stores, so copies need no temporary as large as the corpus
+COPY_BATCH_ROWS = 4096
+
+
+class EmbeddingStore:
+    """
+    Normalized job profile embeddings keyed by FAISS id, together with the
+    content hash of the text they were computed from.
+
+    It is persisted next to the index so a rebuild only embeds profiles that
+    were added or changed since the previous version.
+    """
+
+    def __init__(self, ids: np.ndarray, hashes: np.ndarray, vectors: np.ndarray):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.hashes = np.asarray(hashes, dtype="S40")
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+
+    @classmethod
+    def empty(cls) -> "EmbeddingStore":
+        """Returns a store without any embeddings."""
+        return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype="S40"), np.empty((0, 0), dtype=np.float32))
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingStore":
+        """
+        Loads a store previously written with `save`.
+
+        Args:
+            path (str): Path of the `.npz` file.
+
+        Returns:
+            EmbeddingStore: The loaded embeddings.
+        """
+        with np.load(path) as data:
+            return cls(data["ids"], data["hashes"], data["vectors"])
+
+    def save(self, path: str) -> None:
+        """
+        Writes the store to `path` as an uncompressed `.npz` archive.
+
+        Args:
+            path (str): Destination file path.
+        """
+        with open(path, "wb") as file:
+            np.savez(file, ids=self.ids, hashes=self.hashes, vectors=self.vectors)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dimension(self) -> int:
+        return self.vectors.shape[1] if self.vectors.ndim == 2 else 0
+
+    def positions(self, ids: Sequence[int]) -> np.ndarray:
+        """
+        Looks up the row of each id in this store.
+
+        Args:
+            ids (Sequence[int]): FAISS ids to look up.
+
+        Returns:
+            np.ndarray: Row of each id, or -1 where the id is not stored.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+
+        order = np.argsort(self.ids)
+        sorted_ids = self.ids[order]
+        slots = np.clip(np.searchsorted(sorted_ids, ids), 0, len(sorted_ids) - 1)
+        return np.where(sorted_ids[slots] == ids, order[slots], -1)
+
+    def diff(self, ids: Sequence[int], hashes: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Compares the store with the current set of profiles.
+
+        Args:
+            ids (Sequence[int]): FAISS ids of the current profiles.
+            hashes (Sequence[str]): Content hashes of the current profiles.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Boolean mask over `ids` of profiles that
+            are new or changed, and the stored ids that no longer exist.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        hashes = np.asarray(hashes, dtype="S40")
+        rows = self.positions(ids)
+
+        stored_hashes = self.hashes[np.maximum(rows, 0)] if len(self.ids) else hashes
+        changed = (rows < 0) | (stored_hashes != hashes)
+        removed = self.ids[~np.isin(self.ids, ids)]
+        return changed, removed
+
+    def updated(
+        self,
+        ids: Sequence[int],
+        hashes: Sequence[str],
+        changed: np.ndarray,
+        dimension: int,
+        directory: Optional[str] = None
+    ) -> "EmbeddingStore":
+        """
+        Returns a new store for the current profiles with the stored vectors of
+        unchanged ones copied over. The rows of changed profiles are left for
+        the caller to fill as they are embedded.
+
+        Args:
+            ids (Sequence[int]): FAISS ids of the current profiles.
+            hashes (Sequence[str]): Content hashes of the current profiles.
+            changed (np.ndarray): Boolean mask over `ids`, as returned by `diff`.
+            dimension (int): Dimension of the vectors.
+            directory (str, optional): When given, the vectors are memory-mapped from an
+                anonymous temporary file in this directory instead of held in memory.
+
+        Returns:
+            EmbeddingStore: Embeddings aligned with `ids`.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        shape = (len(ids), dimension)
+        if directory is None or not len(ids):
+            vectors = np.empty(shape, dtype=np.float32)
+        else:
+            os.makedirs(directory, exist_ok=True)
+            # the mapping outlives the file object; the file is deleted once both are gone
+            with tempfile.TemporaryFile(dir=directory) as file:
+                vectors = np.memmap(file, dtype=np.float32, mode="w+", shape=shape)
+
+        unchanged_rows = np.flatnonzero(~changed)
+        positions = self.positions(ids[unchanged_rows])
+        for offset in range(0, len(unchanged_rows), COPY_BATCH_ROWS):
+            vectors[unchanged_rows[offset:offset + COPY_BATCH_ROWS]] = self.vectors[positions[offset:offset + COPY_BATCH_ROWS]]
+        return EmbeddingStore(ids, hashes, vectors)
@@ -1,41 +1,231 @@
 # generator.py
 
-import os
-from typing import Dict, Any, Optional
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import AsyncIterator, Dict, Any, List, NamedTuple, Optional, Sequence
 
 from typing import Tuple
-import google.generativeai as genai
+import numpy as np
 
 import log_helper 
 from log_helper import logger
-from modules.retrieval import retrieve_context
+from modules.retrieval import RetrievalResult, retrieve, retrieve_batch
+from modules.batcher import QueryBatcher
+from modules.metadata_store import MetadataFilter
+from modules.llm_gateway import llm_gateway
+from modules.metrics import metrics
 from log_helper import store_response
 
-from config import GEMINI_MODEL_NAME
+from config import (STORE_RESPONSES,
+                    BATCH_LLM_CONCURRENCY,
+                    ANSWER_CACHE_ENABLED,
+                    ANSWER_CACHE_SIMILARITY,
+                    ANSWER_CACHE_TTL_SECONDS,
+                    ANSWER_CACHE_MAX_ENTRIES)
 from modules.prompts import SYSTEM_PROMPT
 
 
-from dotenv import load_dotenv
+class _CacheEntry(NamedTuple):
+    query_embedding: np.ndarray
+    doc_ids: Tuple[int, ...]
+    index_version: int
+    answer: str
+    expires_at: float
 
-# Load environment variables
-load_dotenv()
 
-def configure_genai() -> None:
-    """Configures the Google Generative AI SDK with the API key."""
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY is not set in the environment variables.")
-    genai.configure(api_key=api_key)
+class SemanticAnswerCache:
+    """
+    Cache of generated answers looked up by query meaning rather than exact text.
+
+    A cached answer is reused when the new query's embedding has cosine similarity
+    of at least `similarity_threshold` with a cached query *and* retrieval returned
+    the same chunks from the same index version. Entries expire after
+    `ttl_seconds` and the least recently used entry is evicted beyond `max_entries`.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, _CacheEntry]" = OrderedDict()
+        # retrieved chunk ids -> keys of the entries built from them
+        self._groups: Dict[Tuple[int, ...], Dict[int, None]] = {}
+        self._next_key = 0
+        self._live_version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get(self, query_embedding: np.ndarray, doc_ids: Sequence[int], index_version: Optional[int]) -> Optional[str]:
+        """
+        Looks up an answer for a query.
+
+        Args:
+            query_embedding (np.ndarray): Normalized embedding of the query.
+            doc_ids (Sequence[int]): Chunk ids the query's context was built from.
+            index_version (int, optional): Version of the index used for retrieval. None bypasses the cache.
+
+        Returns:
+            Optional[str]: The cached answer, or None on a miss.
+        """
+        if index_version is None:
+            return None
+
+        doc_key = tuple(sorted(doc_ids))
+        now = time.time()
+        with self._lock:
+            keys = [
+                key for key in self._groups.get(doc_key, ())
+                if self._entries[key].index_version == index_version
+            ]
+            for key in [key for key in keys if self._entries[key].expires_at <= now]:
+                self._remove(key)
+                keys.remove(key)
+
+            if keys:
+                # cosine similarity of normalized vectors, for all candidates at once
+                similarities = np.stack([self._entries[key].query_embedding for key in keys]) @ query_embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    self._entries.move_to_end(keys[best])
+                    self.hits += 1
+                    return self._entries[keys[best]].answer
+
+            self.misses += 1
+            return None
+
+    def put(self, query_embedding: np.ndarray, doc_ids: Sequence[int], index_version: Optional[int], answer: str) -> None:
+        """
+        Stores an answer. Answers built on an index version older than the live one are dropped.
+
+        Args:
+            query_embedding (np.ndarray): Normalized embedding of the query.
+            doc_ids (Sequence[int]): Chunk ids the query's context was built from.
+            index_version (int, optional): Version of the index used for retrieval. None bypasses the cache.
+            answer (str): The generated answer.
+        """
+        if index_version is None:
+            return
+
+        doc_key = tuple(sorted(doc_ids))
+        with self._lock:
+            if self._live_version is not None and index_version < self._live_version:
+                return
+
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = _CacheEntry(
+                np.array(query_embedding, dtype=np.float32), doc_key, index_version, answer,
+                time.time() + self.ttl_seconds
+            )
+            self._groups.setdefault(doc_key, {})[key] = None
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, index_version: Optional[int] = None) -> None:
+        """
+        Drops every entry, e.g. after the index is rebuilt.
+
+        Args:
+            index_version (int, optional): The new live index version; answers for older versions are no longer stored.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+            if index_version is not None:
+                self._live_version = index_version
+        logger.info(f"Answer cache invalidated for index version {index_version}.")
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters and the current cache size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def _remove(self, key: int) -> None:
+        """Removes an entry; the caller must hold the lock."""
+        entry = self._entries.pop(key)
+        group = self._groups[entry.doc_ids]
+        del group[key]
+        if not group:
+            del self._groups[entry.doc_ids]
 
 
-# Initialize the API configuration
-configure_genai()
+# Shared answer cache, invalidated by the index manager on every rebuild
+answer_cache = SemanticAnswerCache() if ANSWER_CACHE_ENABLED else None
+
+
+def _cached_answer(retrieval, index_version: Optional[int]) -> Optional[str]:
+    """Returns the cached answer for a retrieval result, if any."""
+    if answer_cache is None:
+        return None
+    answer = answer_cache.get(retrieval.query_embedding, retrieval.chunk_ids, index_version)
+    metrics.increment("answer_cache_hits" if answer is not None else "answer_cache_misses")
+    return answer
+
+
+def _cache_answer(retrieval, index_version: Optional[int], answer: Optional[str]) -> None:
+    """Stores a generated answer for a retrieval result."""
+    if answer_cache is not None and answer:
+        answer_cache.put(retrieval.query_embedding, retrieval.chunk_ids, index_version, answer)
+
+
+def build_prompt(user_query: str, retrieved_context: str) -> str:
+    """Builds the user prompt sent to the LLM from the query and its retrieved context."""
+    with metrics.timer("prompt_build"):
+        return f"\nQuestion: {user_query} \nContext: {retrieved_context} \nAnswer:"
+
+
+def _build_answer(user_query: str, generated_answer: Optional[str], retrieved_context: Optional[str]) -> Dict[str, Any]:
+    """Formats the result of the RAG pipeline returned by the API."""
+    if not retrieved_context:
+        logger.warning(f"No relevant data found for query: {user_query}")
+        return {
+            "status": "Success",
+            "query": user_query,
+            "response": "No relevant data found.",
+            "retrieved_context": None
+        }
+
+    if generated_answer is None:
+        return {
+            "status": "Error",
+            "query": user_query,
+            "response": "An error occurred while generating the response.",
+            "retrieved_context": None
+        }
+
+    if STORE_RESPONSES:
+        store_response(user_query, generated_answer, retrieved_context)
+
+    return {
+        "status": "Success",
+        "query": user_query,
+        "response": generated_answer,
+        "retrieved_context": retrieved_context
+        }
 
 
 def get_answer(
     user_query: str, 
     embedding_model: Any, 
-    faiss_index: Any
+    faiss_index: Any,
+    doc_store: Any,
+    index_version: Optional[int] = None,
+    filters: Optional[MetadataFilter] = None
 ) -> Dict[str, Any]:
     """
     Retrieves context for the user's query, generates a response, 
@@ -45,6 +235,9 @@ def get_answer(
         user_query (str): The query entered by the user.
         embedding_model (Any): The embedding model used for vectorization.
         faiss_index (Any): The FAISS index for similarity search.
+        doc_store (Any): The document store built together with `faiss_index`.
+        index_version (int, optional): Version of `faiss_index`, used to scope the answer cache. None bypasses the cache.
+        filters (MetadataFilter, optional): Structured filters on region, salary and education.
 
     Returns:
         Dict[str, Any]: A dictionary containing the response and retrieved context.
@@ -53,36 +246,241 @@ def get_answer(
     logger.info(f"Processing query: {user_query}")
 
     # Retrieve relevant context
-    retrieved_context = retrieve_context(user_query, embedding_model, faiss_index)
+    retrieval = retrieve(user_query, embedding_model, faiss_index, doc_store, filters)
+    retrieved_context = retrieval.context
 
     if not retrieved_context:
-        logger.warning(f"No relevant data found for query: {user_query}")
-        return {
-            "status": "Success",
-            "query": user_query,
-            "response": "No relevant data found.",
-            "retrieved_context": None
-        }
+        return _build_answer(user_query, None, None)
+
+    cached_answer = _cached_answer(retrieval, index_version)
+    if cached_answer is not None:
+        logger.info(f"Answer cache hit for query: {user_query}")
+        return _build_answer(user_query, cached_answer, retrieved_context)
 
     # Generate response based on retrieved context
     try:
         generated_answer, retrieved_context = generate_response(user_query, retrieved_context)
         logger.info(f"Generated response for query: {user_query}")
+        _cache_answer(retrieval, index_version, generated_answer)
     except Exception as e:
         logger.error(f"Error generating response for query: {user_query} - {str(e)}")
-        return {
-            "status": "Error",
-            "query": user_query,
-            "response": "An error occurred while generating the response.",
-            "retrieved_context": None
-        }
+        metrics.increment("llm_errors")
+        generated_answer = None
 
-    return {
-        "status": "Success",
-        "query": user_query,
-        "response": generated_answer,
-        "retrieved_context": retrieved_context
-        }
+    return _build_answer(user_query, generated_answer, retrieved_context)
+
+
+async def _aretrieve(
+    user_query: str,
+    embedding_model: Any,
+    faiss_index: Any,
+    doc_store: Any,
+    executor: Optional[Executor],
+    batcher: Optional[QueryBatcher],
+    filters: Optional[MetadataFilter] = None
+) -> RetrievalResult:
+    """
+    Runs retrieval through the micro-batcher if given, otherwise on `executor`.
+    Filtered queries skip the batcher, since a FAISS search call takes one filter.
+    """
+    if batcher is not None and (filters is None or filters.is_empty()):
+        return await batcher.retrieve(user_query, faiss_index, doc_store)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, retrieve, user_query, embedding_model, faiss_index, doc_store, filters)
+
+
+async def aget_answer(
+    user_query: str, 
+    embedding_model: Any, 
+    faiss_index: Any,
+    doc_store: Any,
+    executor: Optional[Executor] = None,
+    index_version: Optional[int] = None,
+    batcher: Optional[QueryBatcher] = None,
+    filters: Optional[MetadataFilter] = None
+) -> Dict[str, Any]:
+    """
+    Async version of `get_answer`. Embedding and FAISS search run on `executor`
+    and the LLM call is awaited, so no thread is held while waiting on it.
+
+    Args:
+        user_query (str): The query entered by the user.
+        embedding_model (Any): The embedding model used for vectorization.
+        faiss_index (Any): The FAISS index for similarity search.
+        doc_store (Any): The document store built together with `faiss_index`.
+        executor (Executor, optional): Bounded executor for CPU-bound retrieval. Defaults to the loop's executor.
+        index_version (int, optional): Version of `faiss_index`, used to scope the answer cache. None bypasses the cache.
+        batcher (QueryBatcher, optional): Micro-batcher to run retrieval with, instead of `executor`.
+        filters (MetadataFilter, optional): Structured filters on region, salary and education.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing the response and retrieved context.
+    """
+
+    logger.info(f"Processing query: {user_query}")
+
+    # Retrieve relevant context
+    retrieval = await _aretrieve(user_query, embedding_model, faiss_index, doc_store, executor, batcher, filters)
+
+    return await _aanswer_retrieval(user_query, retrieval, index_version)
+
+
+async def _aanswer_retrieval(user_query: str, retrieval: RetrievalResult, index_version: Optional[int]) -> Dict[str, Any]:
+    """Answers a query from its retrieval result, using the answer cache when possible."""
+    retrieved_context = retrieval.context
+
+    if not retrieved_context:
+        return _build_answer(user_query, None, None)
+
+    cached_answer = _cached_answer(retrieval, index_version)
+    if cached_answer is not None:
+        logger.info(f"Answer cache hit for query: {user_query}")
+        return _build_answer(user_query, cached_answer, retrieved_context)
+
+    # Generate response based on retrieved context
+    try:
+        generated_answer, retrieved_context = await agenerate_response(user_query, retrieved_context)
+        logger.info(f"Generated response for query: {user_query}")
+        _cache_answer(retrieval, index_version, generated_answer)
+    except Exception as e:
+        logger.error(f"Error generating response for query: {user_query} - {str(e)}")
+        metrics.increment("llm_errors")
+        generated_answer = None
+
+    return _build_answer(user_query, generated_answer, retrieved_context)
+
+
+async def aget_answers_batch(
+    user_queries: List[str],
+    embedding_model: Any,
+    faiss_index: Any,
+    doc_store: Any,
+    executor: Optional[Executor] = None,
+    index_version: Optional[int] = None,
+    max_concurrency: int = BATCH_LLM_CONCURRENCY
+) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Answers many queries at once. All queries are embedded in one pass and searched
+    with a single FAISS matrix call; identical questions that retrieved the same
+    chunks are answered once; generation runs with at most `max_concurrency`
+    LLM calls in flight. Results are yielded as they complete.
+
+    Args:
+        user_queries (List[str]): The queries to answer.
+        embedding_model (Any): The embedding model used for vectorization.
+        faiss_index (Any): The FAISS index for similarity search.
+        doc_store (Any): The document store built together with `faiss_index`.
+        executor (Executor, optional): Executor for CPU-bound retrieval. Defaults to the loop's executor.
+        index_version (int, optional): Version of `faiss_index`, used to scope the answer cache. None bypasses the cache.
+        max_concurrency (int): Maximum number of concurrent LLM calls.
+
+    Yields:
+        Tuple[int, Dict[str, Any]]: Position of the query in `user_queries` and its answer.
+    """
+
+    logger.info(f"Processing batch of {len(user_queries)} queries.")
+
+    # Retrieve relevant context for all queries at once
+    loop = asyncio.get_running_loop()
+    retrievals = await loop.run_in_executor(
+        executor, retrieve_batch, list(user_queries), embedding_model, faiss_index, doc_store
+    )
+
+    # identical questions with identical retrieved chunks are answered once
+    groups: Dict[Tuple[str, Tuple[int, ...]], List[int]] = {}
+    for position, (user_query, retrieval) in enumerate(zip(user_queries, retrievals)):
+        key = (" ".join(user_query.split()).lower(), retrieval.chunk_ids)
+        groups.setdefault(key, []).append(position)
+    logger.info(f"Batch of {len(user_queries)} queries needs {len(groups)} unique answers.")
+
+    slots = asyncio.Semaphore(max_concurrency)
+
+    async def answer(positions: List[int]) -> Tuple[List[int], Dict[str, Any]]:
+        first = positions[0]
+        async with slots:
+            return positions, await _aanswer_retrieval(user_queries[first], retrievals[first], index_version)
+
+    tasks = [asyncio.create_task(answer(positions)) for positions in groups.values()]
+    try:
+        for task in asyncio.as_completed(tasks):
+            positions, result = await task
+            for position in positions:
+                yield position, {**result, "query": user_queries[position]}
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def astream_answer(
+    user_query: str, 
+    embedding_model: Any, 
+    faiss_index: Any,
+    doc_store: Any,
+    executor: Optional[Executor] = None,
+    index_version: Optional[int] = None,
+    batcher: Optional[QueryBatcher] = None,
+    filters: Optional[MetadataFilter] = None
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming version of `aget_answer`. Yields the retrieved context first, then
+    the answer as it is generated, as (event, payload) pairs:
+    `context`, any number of `token`, and finally `done` or `error`.
+
+    Args:
+        user_query (str): The query entered by the user.
+        embedding_model (Any): The embedding model used for vectorization.
+        faiss_index (Any): The FAISS index for similarity search.
+        doc_store (Any): The document store built together with `faiss_index`.
+        executor (Executor, optional): Bounded executor for CPU-bound retrieval. Defaults to the loop's executor.
+        index_version (int, optional): Version of `faiss_index`, used to scope the answer cache. None bypasses the cache.
+        batcher (QueryBatcher, optional): Micro-batcher to run retrieval with, instead of `executor`.
+        filters (MetadataFilter, optional): Structured filters on region, salary and education.
+
+    Yields:
+        Tuple[str, Dict[str, Any]]: Event name and its JSON-serializable payload.
+    """
+
+    logger.info(f"Processing streamed query: {user_query}")
+
+    # Retrieve relevant context
+    retrieval = await _aretrieve(user_query, embedding_model, faiss_index, doc_store, executor, batcher, filters)
+    retrieved_context = retrieval.context
+
+    yield "context", {"query": user_query, "retrieved_context": retrieved_context or None}
+
+    if not retrieved_context:
+        logger.warning(f"No relevant data found for query: {user_query}")
+        yield "token", {"text": "No relevant data found."}
+        yield "done", {"status": "Success"}
+        return
+
+    cached_answer = _cached_answer(retrieval, index_version)
+    if cached_answer is not None:
+        logger.info(f"Answer cache hit for query: {user_query}")
+        yield "token", {"text": cached_answer}
+        yield "done", {"status": "Success"}
+        return
+
+    # Relay the response as it is generated
+    user_prompt = build_prompt(user_query, retrieved_context)
+    chunks = []
+    try:
+        async for text in llm_gateway.astream(SYSTEM_PROMPT, user_prompt):
+            chunks.append(text)
+            yield "token", {"text": text}
+    except Exception as e:
+        logger.error(f"Error streaming response for query: {user_query} - {str(e)}")
+        metrics.increment("llm_errors")
+        yield "error", {"status": "Error", "message": "An error occurred while generating the response."}
+        return
+
+    logger.info(f"Streamed response for query: {user_query}")
+    generated_answer = "".join(chunks)
+    _cache_answer(retrieval, index_version, generated_answer)
+    if STORE_RESPONSES:
+        store_response(user_query, generated_answer, retrieved_context)
+    yield "done", {"status": "Success"}
 
 
 
@@ -90,7 +488,7 @@ def get_answer(
 @log_helper.log_execution_time
 def generate_response(user_query: str, retrieved_context: str) -> Tuple[str, str]:
     """
-    Generates a response from the Gemini model based on user query and retrieved context.
+    Generates a response through the LLM gateway based on user query and retrieved context.
     
     Args:
         user_query (str): The user's input query.
@@ -100,37 +498,24 @@ def generate_response(user_query: str, retrieved_context: str) -> Tuple[str, str
         Tuple[str, str]: The generated response and the retrieved context.
     """
 
-    user_prompt = f"\nQuestion: {user_query} \nContext: {retrieved_context} \nAnswer:"
+    user_prompt = build_prompt(user_query, retrieved_context)
     
-    gemini_response =  get_gemini_response(SYSTEM_PROMPT, user_prompt), retrieved_context
-
-    return gemini_response
+    return llm_gateway.generate(SYSTEM_PROMPT, user_prompt), retrieved_context
 
 
-def get_gemini_response(system_prompt: str, user_prompt: str) -> str:
+@log_helper.log_execution_time
+async def agenerate_response(user_query: str, retrieved_context: str) -> Tuple[str, str]:
     """
-    Interacts with the Gemini model to generate content based on prompts.
+    Async version of `generate_response`.
     
     Args:
-        system_prompt (str): The system-level instruction for the model.
-        user_prompt (str): The user query combined with contextual information.
+        user_query (str): The user's input query.
+        retrieved_context (str): Additional context retrieved for better response generation.
     
     Returns:
-        str: The generated response from the model.
+        Tuple[str, str]: The generated response and the retrieved context.
     """
-    model = genai.GenerativeModel(
-        model_name=GEMINI_MODEL_NAME, 
-        system_instruction=system_prompt
-    )
-    
-    response = model.generate_content(
-        user_prompt,
-        generation_config=genai.GenerationConfig(
-            max_output_tokens=8192,
-            temperature=0,
-            top_p=1, 
-            top_k=32
-        )
-    )
-    
-    return response.text if response and hasattr(response, 'text') else ""
+
+    user_prompt = build_prompt(user_query, retrieved_context)
+
+    return await llm_gateway.agenerate(SYSTEM_PROMPT, user_prompt), retrieved_context
@@ -0,0 +1,530 @@
+# index_manager.py
+
+import glob
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import faiss
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows, where workers are not forked and no cross-process lock is needed
+    fcntl = None
+
+from log_helper import logger
+from modules.doc_store import DocumentStore
+from modules.embedding_store import EmbeddingStore
+from modules.ingest import IngestCheckpoint
+from modules.lexical_index import LexicalIndex
+from modules.metadata_store import MetadataStore
+from modules.loader import iter_jobs_data
+from modules.retrieval import build_index, check_embedding_parity, loaded_embedding_backend
+from modules.ann_index import configure_search
+from config import INDEX_FILE_PATH, INDEX_MANIFEST_PATH, INDEX_MMAP, INGEST_BATCH_SIZE, CHUNKING
+
+
+FLAT_INDEX_SPEC = {"index_type": "flat"}
+
+
+class IndexVersion(NamedTuple):
+    """An immutable pairing of a FAISS index with the document store it was built from."""
+    version: int
+    index: Any
+    doc_store: DocumentStore
+    # index type and build parameters, see `ann_index.resolve_index_spec`
+    index_spec: Dict[str, Any] = FLAT_INDEX_SPEC
+
+
+def _version_paths(version: int) -> Tuple[str, str, str, str]:
+    """Returns the index, document store, embedding store and lexical index file paths for a given index version."""
+    root, ext = os.path.splitext(INDEX_FILE_PATH)
+    return (
+        f"{root}.v{version}{ext}",
+        f"{root}.v{version}.docs.pkl",
+        f"{root}.v{version}.emb.npz",
+        f"{root}.v{version}.bm25.npz",
+    )
+
+
+def _shared_paths() -> Tuple[str, str]:
+    """Returns the rebuild status and rebuild lock file paths shared by all processes serving the index."""
+    root, _ = os.path.splitext(INDEX_FILE_PATH)
+    return f"{root}.status.json", f"{root}.lock"
+
+
+def _read_manifest() -> Optional[Dict[str, Any]]:
+    """Returns the manifest of the live index version, or None if there is none."""
+    if not os.path.exists(INDEX_MANIFEST_PATH):
+        return None
+    with open(INDEX_MANIFEST_PATH, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _load_version(manifest: Dict[str, Any]) -> IndexVersion:
+    """Opens the index, document store and search indexes of the version a manifest points at."""
+    version = manifest["version"]
+    index_path, doc_store_path, _, lexical_path = _version_paths(version)
+    index_spec = manifest.get("index_spec", FLAT_INDEX_SPEC)
+    index = _read_index(index_path)
+    doc_store = DocumentStore.load(doc_store_path)
+    # versions written before hybrid search have no lexical index file
+    _attach_search_indexes(doc_store, lexical_path)
+    configure_search(index, index_spec)
+    return IndexVersion(version, index, doc_store, index_spec)
+
+
+def _attach_search_indexes(doc_store: DocumentStore, lexical_path: Optional[str] = None) -> None:
+    """
+    Attaches the metadata store and the lexical index to a document store. The
+    lexical index is loaded from `lexical_path`, or built if the file is missing.
+    """
+    doc_store.metadata = MetadataStore.from_store(doc_store)
+    if lexical_path is not None and os.path.exists(lexical_path):
+        doc_store.lexical_index = LexicalIndex.load(lexical_path)
+        return
+    doc_store.lexical_index = LexicalIndex.build(doc_store.chunk_ids(), doc_store.chunk_texts())
+    logger.info(f"Lexical index built over {doc_store.num_chunks} chunks.")
+
+
+def _read_index(path: str) -> faiss.Index:
+    """
+    Opens a FAISS index file, memory-mapped when INDEX_MMAP is set.
+
+    `IO_FLAG_MMAP_IFC` maps the stored vectors and codes of every index type
+    used here (flat, HNSW and IVF), so processes opening the same file share its
+    pages through the page cache. The mapping is read-only: rebuilds update a
+    deserialized copy (see `retrieval._start_index`).
+    """
+    if INDEX_MMAP:
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC)
+        except RuntimeError as e:
+            logger.warning(f"Could not memory-map {path} ({str(e)}). Reading it into memory.")
+    return faiss.read_index(path)
+
+
+def _atomic_write(path: str, write: Callable[[str], None]) -> None:
+    """
+    Writes a file through a temporary path and renames it into place,
+    so readers only ever see the old file or the complete new one.
+
+    Args:
+        path (str): Final file path.
+        write (Callable[[str], None]): Function writing the content to the path it is given.
+    """
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        write(tmp_path)
+        with open(tmp_path, "rb+") as file:
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class _ProcessLock:
+    """
+    Advisory file lock held by at most one process at a time, so that worker
+    processes serving the same index files never rebuild concurrently.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Takes the lock; without `blocking`, returns False instead of waiting for another process."""
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        file = open(self.path, "a")
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            return False
+        self._file = file
+        return True
+
+    def release(self) -> None:
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class IndexManager:
+    """
+    Owns the live FAISS index and document store and swaps them as one unit.
+
+    Queries call `current()` once and keep using the returned `IndexVersion`, so
+    in-flight requests finish on the version they started with while a rebuild
+    publishes a new one with a single reference assignment.
+
+    Several processes may serve the same index files (see `serve.py`): a
+    rebuild takes a file lock so only one process builds at a time, its
+    status is shared through a status file, and the other processes pick up
+    the new version with `refresh`.
+    """
+
+    def __init__(self, embedding_model):
+        self._embedding_model = embedding_model
+        self._active: Optional[IndexVersion] = None
+        self._build_lock = threading.Lock()
+        status_path, lock_path = _shared_paths()
+        self._status_path = status_path
+        self._process_lock = _ProcessLock(lock_path)
+        self._listeners: List[Callable[[IndexVersion], None]] = []
+        self._status: Dict[str, Any] = {
+            "state": "idle",
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            # stage ("parsing" or "embedding") and item counts of the running rebuild
+            "progress": None,
+        }
+
+    def current(self) -> IndexVersion:
+        """
+        Returns the index version currently serving queries.
+
+        Raises:
+            RuntimeError: If no index has been loaded yet.
+        """
+        active = self._active
+        if active is None:
+            raise RuntimeError("FAISS index is not loaded.")
+        return active
+
+    def add_listener(self, callback: Callable[[IndexVersion], None]) -> None:
+        """
+        Registers a callback invoked with each newly published index version,
+        e.g. to invalidate caches built on the previous one.
+
+        Args:
+            callback (Callable[[IndexVersion], None]): Function called after a swap.
+        """
+        self._listeners.append(callback)
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Returns the state of the last rebuild, in any process serving the index,
+        together with the live index version of this process.
+        """
+        active = self._active
+        status = self._status
+        if os.path.exists(self._status_path):
+            try:
+                with open(self._status_path, "r", encoding="utf-8") as file:
+                    status = json.load(file)
+            except (OSError, ValueError):
+                pass
+        if status["state"] == "running" and not self._build_lock.locked() and self._process_lock.acquire(blocking=False):
+            # the process running the rebuild exited before finishing it
+            self._process_lock.release()
+            status = {**status, "state": "failed", "error": "The rebuild was interrupted."}
+        return {
+            **status,
+            "version": active.version if active else None,
+            "num_documents": len(active.doc_store) if active else 0,
+            "num_chunks": active.doc_store.num_chunks if active else 0,
+            "index_type": active.index_spec["index_type"] if active else None,
+        }
+
+    def load(self, allow_rebuild: bool = True) -> IndexVersion:
+        """
+        Loads the live index version from disk, building a new one if it is
+        missing, its document store does not match the index, or it was chunked
+        differently than `CHUNKING` asks for.
+
+        Args:
+            allow_rebuild (bool): Whether a needed rebuild may run in this process. `serve.py`
+                loads with False before forking workers, since the parent must not run the model.
+
+        Returns:
+            IndexVersion: The version now serving queries.
+
+        Raises:
+            RuntimeError: If the index must be rebuilt and `allow_rebuild` is False.
+        """
+        try:
+            manifest = _read_manifest()
+            active = _load_version(manifest) if manifest is not None else None
+        except Exception as e:
+            logger.warning(f"Could not load FAISS index from manifest ({str(e)}). Rebuilding...")
+            return self._rebuild_on_load(allow_rebuild)
+
+        if active is None:
+            if os.path.exists(INDEX_FILE_PATH) and CHUNKING == "profile":
+                # index written before versioning (one vector per profile): pair it with the current dataset
+                self._check_rebuild_allowed(allow_rebuild)
+                return self._migrate_legacy_index()
+            logger.warning(f"No usable FAISS index at {INDEX_FILE_PATH}. Generating new index...")
+            return self._rebuild_on_load(allow_rebuild)
+
+        if active.index.ntotal != active.doc_store.num_chunks:
+            logger.warning(
+                f"FAISS index has {active.index.ntotal} vectors but document store has "
+                f"{active.doc_store.num_chunks} chunks. Rebuilding..."
+            )
+            return self._rebuild_on_load(allow_rebuild)
+
+        if active.doc_store.chunking != CHUNKING:
+            logger.warning(f"FAISS index was built with '{active.doc_store.chunking}' chunking, not '{CHUNKING}'. Rebuilding...")
+            self._check_rebuild_allowed(allow_rebuild)
+            # the rebuild continues the version sequence of the existing index
+            self._active = active
+            return self.rebuild()
+
+        self._active = active
+        logger.info(f"FAISS {active.index_spec['index_type']} index version {active.version} loaded into memory.")
+        return self._active
+
+    def refresh(self) -> bool:
+        """
+        Switches to the version named by the manifest if it is newer than the
+        live one, i.e. when another process serving the same files rebuilt the index.
+
+        Returns:
+            bool: Whether a newer version was loaded.
+        """
+        manifest = _read_manifest()
+        active = self._active
+        if manifest is None or (active is not None and manifest["version"] <= active.version):
+            return False
+        # a rebuild in this process publishes its version itself
+        if not self._build_lock.acquire(blocking=False):
+            return False
+        try:
+            self._active = _load_version(manifest)
+        finally:
+            self._build_lock.release()
+
+        self._notify_listeners()
+        logger.info(f"FAISS index version {self._active.version}, built by another process, is now live.")
+        return True
+
+    @staticmethod
+    def _check_rebuild_allowed(allow_rebuild: bool) -> None:
+        if not allow_rebuild:
+            raise RuntimeError("The FAISS index on disk is missing or outdated and must be rebuilt first.")
+
+    def _rebuild_on_load(self, allow_rebuild: bool) -> IndexVersion:
+        self._check_rebuild_allowed(allow_rebuild)
+        return self.rebuild()
+
+    def rebuild(self) -> IndexVersion:
+        """
+        Builds, persists and publishes a new index version, blocking until done.
+
+        Returns:
+            IndexVersion: The newly published version.
+        """
+        with self._build_lock:
+            self._process_lock.acquire()
+            try:
+                return self._rebuild()
+            finally:
+                self._process_lock.release()
+
+    def rebuild_in_background(self) -> bool:
+        """
+        Starts a rebuild on a background thread.
+
+        Returns:
+            bool: False if a rebuild is already running, True otherwise.
+        """
+        if not self._build_lock.acquire(blocking=False):
+            return False
+        if not self._process_lock.acquire(blocking=False):
+            # another worker process is rebuilding
+            self._build_lock.release()
+            return False
+
+        def run():
+            try:
+                self._rebuild()
+            except Exception:
+                # already recorded in the rebuild status
+                pass
+            finally:
+                self._process_lock.release()
+                self._build_lock.release()
+
+        threading.Thread(target=run, name="index-rebuild", daemon=True).start()
+        return True
+
+    def _rebuild(self) -> IndexVersion:
+        """Runs a rebuild; the caller must hold the build lock and the process lock."""
+        self._update_status(state="running", started_at=time.time(), finished_at=None, error=None, progress=None)
+        try:
+            # another process may have published a version since this one was loaded
+            manifest = _read_manifest()
+            if manifest is not None and (self._active is None or manifest["version"] > self._active.version):
+                self._active = _load_version(manifest)
+
+            doc_store = DocumentStore.from_profiles(self._track_parsing(iter_jobs_data()))
+            if not len(doc_store):
+                raise ValueError("No job profiles found.")
+            _attach_search_indexes(doc_store)
+
+            previous = self._active
+            embeddings = self._load_embeddings(previous.version) if previous else None
+            base_index = previous.index if embeddings is not None else None
+            base_spec = previous.index_spec if embeddings is not None else None
+            # vectors of an interrupted build are only reused by a rebuild with the same backend
+            checkpoint = IngestCheckpoint(backend=loaded_embedding_backend())
+            index, embeddings, index_spec = build_index(
+                self._embedding_model, doc_store, base_index, embeddings, base_spec,
+                checkpoint, self._track_embedding
+            )
+
+            version = (previous.version if previous else 0) + 1
+            self._persist(version, index, doc_store, embeddings, index_spec)
+            checkpoint.clear()
+
+            # publish index and documents together in one assignment
+            self._active = IndexVersion(version, index, doc_store, index_spec)
+            self._remove_stale_versions(keep={version, version - 1})
+            self._notify_listeners()
+        except Exception as e:
+            logger.error(f"FAISS index rebuild failed: {str(e)}")
+            self._update_status(state="failed", finished_at=time.time(), error=str(e))
+            raise
+
+        self._update_status(state="idle", finished_at=time.time())
+        logger.info(f"FAISS index version {version} is now live with {index.ntotal} vectors.")
+        return self._active
+
+    def _track_parsing(self, job_profiles: Iterable[dict]) -> Iterator[dict]:
+        """Passes job profiles through while counting them in the rebuild progress."""
+        for count, profile in enumerate(job_profiles, start=1):
+            if count % INGEST_BATCH_SIZE == 0:
+                self._update_status(progress={"stage": "parsing", "done": count, "total": None})
+            yield profile
+
+    def _track_embedding(self, done: int, total: int) -> None:
+        """Records how many new or changed profiles have been embedded."""
+        self._update_status(progress={"stage": "embedding", "done": done, "total": total})
+
+    def _update_status(self, **changes) -> None:
+        """Updates the rebuild status and shares it with the other processes serving the index."""
+        self._status.update(changes)
+        status = dict(self._status)
+
+        def write_status(path):
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(status, file)
+
+        try:
+            _atomic_write(self._status_path, write_status)
+        except OSError as e:
+            logger.warning(f"Could not write the index rebuild status ({str(e)}).")
+
+    def _notify_listeners(self) -> None:
+        """Calls the registered listeners with the live version; their failures do not fail the rebuild."""
+        for callback in self._listeners:
+            try:
+                callback(self._active)
+            except Exception as e:
+                logger.error(f"Index listener {callback!r} failed: {str(e)}")
+
+    def _migrate_legacy_index(self) -> IndexVersion:
+        """
+        Converts an index written before versioning (row-position ids) into version 0,
+        reusing its vectors so nothing has to be re-embedded.
+        """
+        legacy_index = faiss.read_index(INDEX_FILE_PATH)
+        doc_store = DocumentStore.from_profiles(iter_jobs_data(), chunking="profile")
+        if legacy_index.ntotal != len(doc_store):
+            logger.warning(
+                f"FAISS index has {legacy_index.ntotal} vectors but dataset has {len(doc_store)} profiles. Rebuilding..."
+            )
+            return self.rebuild()
+        _attach_search_indexes(doc_store)
+
+        embeddings = EmbeddingStore(
+            doc_store.ids(), doc_store.hashes(), legacy_index.reconstruct_n(0, legacy_index.ntotal)
+        )
+        index = faiss.IndexIDMap2(faiss.IndexFlatIP(embeddings.dimension))
+        index.add_with_ids(embeddings.vectors, embeddings.ids)
+        self._persist(0, index, doc_store, embeddings, FLAT_INDEX_SPEC)
+
+        self._active = IndexVersion(0, index, doc_store)
+        logger.info("Legacy FAISS index migrated to version 0.")
+        return self._active
+
+    def check_embedding_parity(self) -> Optional[float]:
+        """
+        Checks that the embedding model reproduces the vectors stored for the live index version.
+
+        Returns:
+            Optional[float]: The lowest cosine similarity in the sample, or None if the version has no stored vectors.
+
+        Raises:
+            ValueError: If the model's vectors differ from the stored ones beyond the tolerance.
+        """
+        active = self.current()
+        embeddings = self._load_embeddings(active.version)
+        if embeddings is None:
+            return None
+        return check_embedding_parity(self._embedding_model, active.doc_store, embeddings)
+
+    def set_embedding_model(self, embedding_model) -> None:
+        """Replaces the model used to embed new or changed profiles in later rebuilds."""
+        self._embedding_model = embedding_model
+
+    @staticmethod
+    def _load_embeddings(version: int) -> Optional[EmbeddingStore]:
+        """Loads the embedding store of an index version, or None if it is unavailable."""
+        _, _, embeddings_path, _ = _version_paths(version)
+        if not os.path.exists(embeddings_path):
+            return None
+        return EmbeddingStore.load(embeddings_path)
+
+    def _persist(
+        self,
+        version: int,
+        index,
+        doc_store: DocumentStore,
+        embeddings: EmbeddingStore,
+        index_spec: Dict[str, Any]
+    ) -> None:
+        """Writes the index, document store, embeddings and lexical index, then commits them by replacing the manifest."""
+        index_path, doc_store_path, embeddings_path, lexical_path = _version_paths(version)
+        _atomic_write(index_path, lambda path: faiss.write_index(index, path))
+        _atomic_write(doc_store_path, doc_store.save)
+        _atomic_write(embeddings_path, embeddings.save)
+        _atomic_write(lexical_path, doc_store.lexical_index.save)
+
+        manifest = {
+            "version": version,
+            "num_documents": len(doc_store),
+            "num_chunks": doc_store.num_chunks,
+            "chunking": doc_store.chunking,
+            "index_spec": index_spec,
+            "created_at": time.time(),
+        }
+
+        def write_manifest(path):
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(manifest, file)
+
+        _atomic_write(INDEX_MANIFEST_PATH, write_manifest)
+        logger.info(f"FAISS index version {version} saved at {index_path}")
+
+    @staticmethod
+    def _remove_stale_versions(keep: set) -> None:
+        """Deletes index and document store files of versions not listed in `keep`."""
+        root, _ = os.path.splitext(INDEX_FILE_PATH)
+        pattern = re.compile(re.escape(root) + r"\.v(\d+)\.")
+        for path in glob.glob(f"{glob.escape(root)}.v*"):
+            match = pattern.match(path)
+            if match and int(match.group(1)) not in keep and ".tmp." not in path:
+                os.remove(path)
@@ -0,0 +1,104 @@
+# ingest.py
+
+import glob
+import json
+import os
+import shutil
+from typing import List
+
+import numpy as np
+
+from log_helper import logger
+from modules.embedding_store import EmbeddingStore
+from config import INGEST_CHECKPOINT_DIR, EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND
+
+
+class IngestCheckpoint:
+    """
+    Embeddings computed by a rebuild that has not completed yet.
+
+    Every embedded batch is written as its own segment file, so saving a batch
+    costs the same however far the rebuild got. If the process crashes, the
+    next rebuild reuses the saved vectors of profiles whose text is unchanged
+    and only embeds the rest. The checkpoint is cleared once the new index
+    version is persisted. Vectors are only reused by a rebuild with the same
+    model and backend, since ONNX (quantized) vectors differ slightly from PyTorch ones.
+    """
+
+    def __init__(
+        self,
+        directory: str = INGEST_CHECKPOINT_DIR,
+        model_name: str = EMBEDDING_MODEL_NAME,
+        backend: str = EMBEDDING_BACKEND
+    ):
+        self._directory = directory
+        self._model_name = model_name
+        self._backend = backend
+        self._segments = len(self._segment_paths())
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    def load(self) -> EmbeddingStore:
+        """
+        Loads the embeddings saved by an interrupted rebuild.
+
+        Returns:
+            EmbeddingStore: The saved embeddings; empty if there are none or they came from another model or backend.
+        """
+        paths = self._segment_paths()
+        if not paths:
+            return EmbeddingStore.empty()
+
+        try:
+            with open(os.path.join(self._directory, "meta.json"), "r", encoding="utf-8") as file:
+                meta = json.load(file)
+            # checkpoints written before the backend was recorded come from torch
+            if meta["model_name"] != self._model_name or meta.get("backend", "torch") != self._backend:
+                logger.warning("Ingest checkpoint was written by another embedding model or backend. Discarding it.")
+                self.clear()
+                return EmbeddingStore.empty()
+            segments = [EmbeddingStore.load(path) for path in paths]
+        except Exception as e:
+            logger.warning(f"Could not read ingest checkpoint ({str(e)}). Discarding it.")
+            self.clear()
+            return EmbeddingStore.empty()
+
+        resumed = EmbeddingStore(
+            np.concatenate([segment.ids for segment in segments]),
+            np.concatenate([segment.hashes for segment in segments]),
+            np.concatenate([segment.vectors for segment in segments]),
+        )
+        logger.info(f"Resuming from ingest checkpoint with {len(resumed)} embedded job profiles.")
+        return resumed
+
+    def append(self, ids: np.ndarray, hashes: np.ndarray, vectors: np.ndarray) -> None:
+        """
+        Saves one embedded batch.
+
+        Args:
+            ids (np.ndarray): FAISS ids of the batch.
+            hashes (np.ndarray): Content hashes of the embedded texts.
+            vectors (np.ndarray): Normalized embeddings, one row per id.
+        """
+        if not self._segments:
+            os.makedirs(self._directory, exist_ok=True)
+            with open(os.path.join(self._directory, "meta.json"), "w", encoding="utf-8") as file:
+                json.dump({"model_name": self._model_name, "backend": self._backend}, file)
+
+        path = os.path.join(self._directory, f"batch-{self._segments:08d}.npz")
+        tmp_path = f"{path}.tmp"
+        EmbeddingStore(ids, hashes, vectors).save(tmp_path)
+        # a segment is either complete or absent
+        os.replace(tmp_path, path)
+        self._segments += 1
+
+    def clear(self) -> None:
+        """Deletes the checkpoint."""
+        shutil.rmtree(self._directory, ignore_errors=True)
+        self._segments = 0
+
+    def _segment_paths(self) -> List[str]:
+        """Returns the saved segment files in write order."""
+        return sorted(glob.glob(os.path.join(glob.escape(self._directory), "batch-*.npz")))
@@ -0,0 +1,195 @@
+# lexical_index.py
+
+import re
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import BM25_K1, BM25_B
+
+
+# words too common in questions and profiles to tell profiles apart
+STOPWORDS = frozenset((
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "in",
+    "is", "it", "me", "my", "of", "on", "or", "that", "the", "their", "they", "this", "to", "what", "which",
+    "who", "with", "you", "your",
+))
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits a text into lowercase alphanumeric terms, without stopwords."""
+    return [term for term in _TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the chunks of a document store.
+
+    Posting lists are stored in CSR form: the postings of term `t` are
+    `rows[offsets[t]:offsets[t + 1]]`, sorted by row, with the BM25 weight of
+    each posting precomputed in `weights`. A query therefore only gathers and
+    sums the postings of its terms, and the whole index is a handful of flat
+    numpy arrays (6 bytes per posting) plus the vocabulary.
+    """
+
+    def __init__(
+        self,
+        chunk_ids: np.ndarray,
+        terms: Sequence[str],
+        offsets: np.ndarray,
+        rows: np.ndarray,
+        weights: np.ndarray
+    ):
+        self.chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        self.terms = np.asarray(terms, dtype=str)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float16)
+        self._vocabulary: Dict[str, int] = {term: term_id for term_id, term in enumerate(self.terms.tolist())}
+
+    @classmethod
+    def build(
+        cls,
+        chunk_ids: Sequence[int],
+        texts: Iterable[str],
+        k1: float = BM25_K1,
+        b: float = BM25_B
+    ) -> "LexicalIndex":
+        """
+        Builds the index from the chunks embedded in the FAISS index.
+
+        Args:
+            chunk_ids (Sequence[int]): FAISS id of every chunk.
+            texts (Iterable[str]): Text of every chunk, in the same order.
+            k1 (float): BM25 term frequency saturation.
+            b (float): BM25 document length normalization.
+
+        Returns:
+            LexicalIndex: The populated index.
+        """
+        vocabulary: Dict[str, int] = {}
+        # one entry per (term, chunk) pair, in chunk order
+        posting_terms = array("i")
+        posting_rows = array("i")
+        posting_counts = array("f")
+        lengths = array("f")
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                posting_terms.append(vocabulary.setdefault(term, len(vocabulary)))
+                posting_rows.append(row)
+                posting_counts.append(count)
+
+        term_ids = np.frombuffer(posting_terms, dtype=np.int32)
+        rows = np.frombuffer(posting_rows, dtype=np.int32)
+        counts = np.frombuffer(posting_counts, dtype=np.float32)
+        lengths = np.frombuffer(lengths, dtype=np.float32)
+
+        num_chunks = len(lengths)
+        document_frequency = np.bincount(term_ids, minlength=len(vocabulary))
+        idf = np.log1p((num_chunks - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        average_length = max(float(lengths.mean()), 1.0) if num_chunks else 1.0
+        norms = k1 * (1 - b + b * lengths[rows] / average_length)
+        weights = idf[term_ids] * counts * (k1 + 1) / (counts + norms)
+
+        # group postings by term; the stable sort keeps each list in row order
+        order = np.argsort(term_ids, kind="stable")
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=offsets[1:])
+
+        terms = sorted(vocabulary, key=vocabulary.get)
+        return cls(np.asarray(chunk_ids, dtype=np.int64), terms, offsets, rows[order], weights[order])
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        """
+        Loads an index previously written with `save`.
+
+        Args:
+            path (str): Path of the `.npz` file.
+
+        Returns:
+            LexicalIndex: The loaded index.
+        """
+        with np.load(path) as data:
+            return cls(data["chunk_ids"], data["terms"], data["offsets"], data["rows"], data["weights"])
+
+    def save(self, path: str) -> None:
+        """
+        Writes the index to `path` as an uncompressed `.npz` archive.
+
+        Args:
+            path (str): Destination file path.
+        """
+        with open(path, "wb") as file:
+            np.savez(
+                file, chunk_ids=self.chunk_ids, terms=self.terms, offsets=self.offsets, rows=self.rows, weights=self.weights
+            )
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def search(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Ranks the chunks containing the query terms by BM25 score.
+
+        Args:
+            query (str): The user's query.
+            k (int): Maximum number of chunks to return.
+            mask (np.ndarray, optional): Boolean mask of the chunks that may be returned, in index order.
+
+        Returns:
+            List[Tuple[int, float]]: (chunk id, BM25 score) pairs, best match first.
+        """
+        term_ids = {self._vocabulary[term] for term in tokenize(query) if term in self._vocabulary}
+        if not term_ids:
+            return []
+
+        spans = [(self.offsets[term_id], self.offsets[term_id + 1]) for term_id in term_ids]
+        num_postings = sum(int(end - start) for start, end in spans)
+        rows = np.concatenate([self.rows[start:end] for start, end in spans])
+        weights = np.concatenate([self.weights[start:end] for start, end in spans]).astype(np.float32)
+
+        if len(spans) == 1:
+            candidates, scores = rows, weights
+        elif num_postings * 16 >= len(self):
+            # postings cover a good part of the corpus: a dense accumulator is cheaper than sorting
+            scores = np.bincount(rows, weights=weights, minlength=len(self))
+            candidates = np.flatnonzero(scores)
+            scores = scores[candidates]
+        else:
+            candidates, inverse = np.unique(rows, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights)
+
+        if mask is not None:
+            allowed = mask[candidates]
+            candidates, scores = candidates[allowed], scores[allowed]
+
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(self.chunk_ids[row]), float(score)) for row, score in zip(candidates[order], scores[order])]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Tuple[int, float]]], k: int) -> List[Tuple[int, float]]:
+    """
+    Merges rankings by reciprocal-rank fusion: each id scores the sum of `1 / (k + rank)` over the rankings it appears in.
+
+    Args:
+        rankings (Sequence[Sequence[Tuple[int, float]]]): (id, score) pairs per ranking, best first. Only the order is used.
+        k (int): Rank constant; larger values flatten the advantage of top ranks.
+
+    Returns:
+        List[Tuple[int, float]]: (id, fused score) pairs, best first.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (item_id, _) in enumerate(ranking, start=1):
+            fused[item_id] = fused.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,741 @@
+# llm_gateway.py
+
+import asyncio
+import datetime
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from log_helper import logger
+from modules.metrics import metrics
+from modules.prompts import SYSTEM_PROMPT
+from config import (GEMINI_MODEL_NAME,
+                    GEMINI_CONTEXT_CACHE_ENABLED,
+                    GEMINI_CONTEXT_CACHE_TTL_SECONDS,
+                    LLAMA_MODEL_NAME,
+                    LLAMA_BASE_URL,
+                    LLM_PROVIDERS,
+                    LLM_TIMEOUT_SECONDS,
+                    LLM_ATTEMPT_TIMEOUT_SECONDS,
+                    LLM_FALLBACK_RESERVE_SECONDS,
+                    LLM_MAX_RETRIES,
+                    LLM_RETRY_BASE_SECONDS,
+                    LLM_RETRY_MAX_SECONDS,
+                    LLM_BREAKER_FAILURES,
+                    LLM_BREAKER_RESET_SECONDS,
+                    LLM_HEDGING_ENABLED,
+                    LLM_HEDGE_QUANTILE,
+                    LLM_HEDGE_MIN_SECONDS,
+                    LLM_HEDGE_MIN_SAMPLES,
+                    LLM_MAX_CONNECTIONS,
+                    LLM_MOCK_LATENCY_SECONDS)
+
+# Load environment variables
+load_dotenv()
+
+
+GENERATION_CONFIG = {
+    "max_output_tokens": 8192,
+    "temperature": 0,
+    "top_p": 1,
+    "top_k": 32,
+}
+
+# successful call latencies kept per provider to estimate the hedging delay
+LATENCY_WINDOW = 256
+
+
+class LLMUnavailableError(RuntimeError):
+    """Raised when no provider produced an answer within the deadline."""
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised instead of calling a provider whose share of the deadline is used up."""
+
+
+class BreakerPermit(NamedTuple):
+    """Permission from a circuit breaker to make one call, handed back with its outcome."""
+    # whether this is the single trial call of the half-open state
+    trial: bool
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing provider. After `failure_threshold` consecutive
+    failures the circuit opens and calls are rejected for `reset_seconds`;
+    then a single trial call is let through, which closes the circuit on
+    success and reopens it on failure. Only the call holding the trial
+    permit can resolve or release the trial.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Returns "closed", "open" or "half_open"."""
+        if self._opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self._opened_at < self.reset_seconds else "half_open"
+
+    def allow(self) -> Optional[BreakerPermit]:
+        """
+        Returns a permit if a call may be made now, or None. In the half-open
+        state only one trial permit is handed out at a time.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return BreakerPermit(trial=False)
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial_running:
+                return None
+            self._trial_running = True
+            return BreakerPermit(trial=True)
+
+    def record_success(self, permit: BreakerPermit) -> None:
+        """Closes the circuit: any successful call shows the provider works again."""
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"Circuit breaker of LLM provider '{self.name}' closed.")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self, permit: BreakerPermit) -> None:
+        with self._lock:
+            self._failures += 1
+            if permit.trial or (self._opened_at is None and self._failures >= self.failure_threshold):
+                logger.warning(f"Circuit breaker of LLM provider '{self.name}' opened after {self._failures} failures.")
+                metrics.increment("llm_breaker_opened")
+                self._opened_at = time.monotonic()
+            if permit.trial:
+                self._trial_running = False
+
+    def release(self, permit: BreakerPermit) -> None:
+        """Hands back the permit of a call that ended without a result, e.g. because it was cancelled."""
+        if not permit.trial:
+            return
+        with self._lock:
+            self._trial_running = False
+
+
+class LLMProvider:
+    """
+    One LLM backend. Subclasses implement `generate`, `agenerate` and
+    `astream`; each call must give up after `timeout` seconds (for streams:
+    waiting for the first chunk or between chunks).
+    """
+
+    name = "base"
+
+    def load(self) -> None:
+        """Creates clients and checks that the model can be reached."""
+
+    def generate(self, system_prompt: str, user_prompt: str, timeout: float) -> str:
+        raise NotImplementedError
+
+    async def agenerate(self, system_prompt: str, user_prompt: str, timeout: float) -> str:
+        raise NotImplementedError
+
+    def astream(self, system_prompt: str, user_prompt: str, timeout: float) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    def is_transient(self, error: BaseException) -> bool:
+        """Returns whether a failed call is worth retrying (timeouts, dropped connections, overload)."""
+        return isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError))
+
+
+class GeminiProvider(LLMProvider):
+    """
+    Google Gemini through the `google-generativeai` SDK. One model client is
+    created per system prompt and shared by all requests, so its connections
+    are reused; with GEMINI_CONTEXT_CACHE_ENABLED the system prompt is stored
+    once as Gemini cached content and renewed shortly before its TTL runs out.
+    """
+
+    name = "gemini"
+
+    def __init__(self, model_name: str = GEMINI_MODEL_NAME):
+        self.model_name = model_name
+        self._configured = False
+        # model clients per system prompt, shared by all requests
+        self.models: Dict[str, Any] = {}
+        # when the context cache behind a model must be renewed, per system prompt (absent for uncached models)
+        self._cache_renewals: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        self.model(SYSTEM_PROMPT)
+
+    def model(self, system_prompt: str):
+        """
+        Returns the shared model client for a system prompt, creating it on first use.
+
+        Raises:
+            ValueError: If GEMINI_API_KEY is not set.
+        """
+        model = self.models.get(system_prompt)
+        renew_at = self._cache_renewals.get(system_prompt)
+        if model is not None and (renew_at is None or time.time() < renew_at):
+            return model
+
+        with self._lock:
+            model = self.models.get(system_prompt)
+            renew_at = self._cache_renewals.get(system_prompt)
+            if model is not None and (renew_at is None or time.time() < renew_at):
+                return model
+
+            import google.generativeai as genai
+
+            if not self._configured:
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise ValueError("GEMINI_API_KEY is not set in the environment variables.")
+                genai.configure(api_key=api_key)
+                self._configured = True
+
+            model = self._load_cached_model(system_prompt) if GEMINI_CONTEXT_CACHE_ENABLED else None
+            if model is None:
+                model = genai.GenerativeModel(model_name=self.model_name, system_instruction=system_prompt)
+                self._cache_renewals.pop(system_prompt, None)
+            self.models[system_prompt] = model
+            logger.info(f"Gemini model '{self.model_name}' initialized.")
+        return model
+
+    def _load_cached_model(self, system_prompt: str):
+        """
+        Creates a Gemini model backed by cached content holding the system prompt.
+
+        Returns:
+            Optional[genai.GenerativeModel]: The model, or None if the SDK or model does not support
+            context caching or the prompt is below the minimum cacheable size.
+        """
+        try:
+            import google.generativeai as genai
+            from google.generativeai import caching
+
+            cached_content = caching.CachedContent.create(
+                model=f"models/{self.model_name}",
+                system_instruction=system_prompt,
+                ttl=datetime.timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL_SECONDS)
+            )
+            model = genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+        except Exception as e:
+            logger.warning(f"Gemini context caching unavailable ({str(e)}). Sending the system prompt with every request.")
+            return None
+
+        # renew a minute early so that no request references an expired cache
+        self._cache_renewals[system_prompt] = time.time() + max(GEMINI_CONTEXT_CACHE_TTL_SECONDS - 60, 0)
+        logger.info(f"System prompt stored in Gemini context cache '{cached_content.name}'.")
+        return model
+
+    def generate(self, system_prompt: str, user_prompt: str, timeout: float) -> str:
+        response = self.model(system_prompt).generate_content(
+            user_prompt,
+            generation_config=GENERATION_CONFIG,
+            request_options={"timeout": timeout}
+        )
+        return response.text if response and hasattr(response, 'text') else ""
+
+    async def agenerate(self, system_prompt: str, user_prompt: str, timeout: float) -> str:
+        response = await asyncio.wait_for(
+            self.model(system_prompt).generate_content_async(
+                user_prompt,
+                generation_config=GENERATION_CONFIG,
+                request_options={"timeout": timeout}
+            ),
+            timeout=timeout
+        )
+        return response.text if response and hasattr(response, 'text') else ""
+
+    async def astream(self, system_prompt: str, user_prompt: str, timeout: float) -> AsyncIterator[str]:
+        response = await asyncio.wait_for(
+            self.model(system_prompt).generate_content_async(
+                user_prompt,
+                generation_config=GENERATION_CONFIG,
+                request_options={"timeout": timeout},
+                stream=True
+            ),
+            timeout=timeout
+        )
+
+        chunks = response.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+            except StopAsyncIteration:
+                break
+
+            try:
+                text = chunk.text
+            except ValueError:
+                # chunk without text parts (e.g. only finish reason or safety ratings)
+                continue
+            if text:
+                yield text
+
+    def is_transient(self, error: BaseException) -> bool:
+        if super().is_transient(error):
+            return True
+        try:
+            from google.api_core import exceptions
+        except ImportError:
+            return False
+        return isinstance(error, (
+            exceptions.TooManyRequests,
+            exceptions.InternalServerError,
+            exceptions.ServiceUnavailable,
+            exceptions.DeadlineExceeded,
+        ))
+
+
+class LlamaProvider(LLMProvider):
+    """
+    A local Llama model served by Ollama (`ollama serve`, `ollama pull <LLAMA_MODEL_NAME>`).
+    Requests go through pooled `httpx` clients, one for sync and one for async calls.
+    """
+
+    name = "llama"
+
+    def __init__(self, model_name: str = LLAMA_MODEL_NAME, base_url: str = LLAMA_BASE_URL):
+        self.model_name = model_name
+        self.base_url = base_url
+        self._client = None
+        self._async_client = None
+
+    def load(self) -> None:
+        import httpx
+
+        limits = httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+        self._client = httpx.Client(base_url=self.base_url, limits=limits, timeout=LLM_ATTEMPT_TIMEOUT_SECONDS)
+        self._async_client = httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=LLM_ATTEMPT_TIMEOUT_SECONDS)
+        # fails fast if the server is down or the model was not pulled
+        self._client.post("/api/show", json={"model": self.model_name}).raise_for_status()
+        logger.info(f"Local model '{self.model_name}' available at {self.base_url}.")
+
+    def _payload(self, system_prompt: str, user_prompt: str, stream: bool) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            "stream": stream,
+            "options": {"temperature": GENERATION_CONFIG["temperature"]},
+        }
+
+    def generate(self, system_prompt: str, user_prompt: str, timeout: float) -> str:
+        response = self._client.post("/api/chat", json=self._payload(system_prompt, user_prompt, False), timeout=timeout)
+        response.raise_for_status()
+        return response.json()["message"]["content"]
+
+    async def agenerate(self, system_prompt: str, user_prompt: str, timeout: float) -> str:
+        response = await self._async_client.post(
+            "/api/chat", json=self._payload(system_prompt, user_prompt, False), timeout=timeout
+        )
+        response.raise_for_status()
+        return response.json()["message"]["content"]
+
+    async def astream(self, system_prompt: str, user_prompt: str, timeout: float) -> AsyncIterator[str]:
+        async with self._async_client.stream(
+            "POST", "/api/chat", json=self._payload(system_prompt, user_prompt, True), timeout=timeout
+        ) as response:
+            response.raise_for_status()
+            # one JSON object per line, the last one flagged "done"
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                text = data.get("message", {}).get("content")
+                if text:
+                    yield text
+                if data.get("done"):
+                    break
+
+    def is_transient(self, error: BaseException) -> bool:
+        if super().is_transient(error):
+            return True
+        import httpx
+
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code == 429 or error.response.status_code >= 500
+        return isinstance(error, httpx.TransportError)
+
+
+class MockProvider(LLMProvider):
+    """
+    Answers without any model after a configurable latency, optionally failing
+    a fraction of calls, for tests and load benchmarks of the serving path.
+    """
+
+    name = "mock"
+
+    def __init__(self, latency_seconds: float = LLM_MOCK_LATENCY_SECONDS, jitter_seconds: float = 0.0, failure_rate: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.jitter_seconds = jitter_seconds
+        self.failure_rate = failure_rate
+        self.calls = 0
+
+    def _latency(self) -> float:
+        return self.latency_seconds + random.uniform(0, self.jitter_seconds)
+
+    def _answer(self, user_prompt: str) -> str:
+        self.calls += 1
+        if random.random() < self.failure_rate:
+            raise ConnectionError("Mock provider failure.")
+        question = user_prompt.split("Context:")[0].replace("Question:", "").strip()
+        return f"Mock answer to: {question}"
+
+    def generate(self, system_prompt: str, user_prompt: str, timeout: float) -> str:
+        latency = self._latency()
+        time.sleep(min(latency, timeout))
+        if latency > timeout:
+            raise TimeoutError(f"Mock provider took longer than {timeout:.2f}s.")
+        return self._answer(user_prompt)
+
+    async def agenerate(self, system_prompt: str, user_prompt: str, timeout: float) -> str:
+        await asyncio.wait_for(asyncio.sleep(self._latency()), timeout=timeout)
+        return self._answer(user_prompt)
+
+    async def astream(self, system_prompt: str, user_prompt: str, timeout: float) -> AsyncIterator[str]:
+        await asyncio.wait_for(asyncio.sleep(self._latency()), timeout=timeout)
+        for word in self._answer(user_prompt).split(" "):
+            yield word + " "
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider,
+    "llama": LlamaProvider,
+    "mock": MockProvider,
+}
+
+
+class LLMGateway:
+    """
+    Calls a chain of LLM providers behind one interface: the first is the
+    primary, the others are fallbacks tried in order when it fails.
+
+    Each answer has a deadline of `deadline` seconds across all providers, of
+    which a provider with fallbacks after it may use all but
+    `fallback_reserve` seconds. Within its budget a provider is called with a
+    per-attempt timeout and transient errors are retried with full-jitter
+    exponential backoff. A circuit breaker per provider skips providers that
+    keep failing. With hedging, a second identical request is sent when the
+    first has not answered after the provider's observed p95 latency, and the
+    first answer wins. Streams are retried and fall back only until their
+    first chunk, and are not hedged.
+    """
+
+    def __init__(
+        self,
+        providers: Sequence[LLMProvider],
+        deadline: float = LLM_TIMEOUT_SECONDS,
+        attempt_timeout: float = LLM_ATTEMPT_TIMEOUT_SECONDS,
+        fallback_reserve: float = LLM_FALLBACK_RESERVE_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        hedging: bool = LLM_HEDGING_ENABLED
+    ):
+        if not providers:
+            raise ValueError("The LLM gateway needs at least one provider.")
+        self.providers = list(providers)
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.fallback_reserve = fallback_reserve
+        self.max_retries = max_retries
+        self.hedging = hedging
+        self._breakers = {provider.name: CircuitBreaker(provider.name) for provider in self.providers}
+        self._latencies: Dict[str, Deque[float]] = {provider.name: deque(maxlen=LATENCY_WINDOW) for provider in self.providers}
+
+    @classmethod
+    def from_config(cls, names: Sequence[str] = LLM_PROVIDERS) -> "LLMGateway":
+        """
+        Creates the gateway for the configured provider chain. The local Llama
+        provider is skipped while LLAMA_MODEL_NAME is empty.
+
+        Raises:
+            ValueError: If a provider name is unknown.
+        """
+        providers = []
+        for name in names:
+            if name not in PROVIDERS:
+                raise ValueError(f"Unknown LLM provider '{name}'. Expected one of {tuple(PROVIDERS)}.")
+            if name == "llama" and not LLAMA_MODEL_NAME:
+                continue
+            providers.append(PROVIDERS[name]())
+        return cls(providers)
+
+    def load(self) -> None:
+        """
+        Loads every provider. Providers that fail to load are dropped from the
+        chain, so the service can run on a fallback alone.
+
+        Raises:
+            LLMUnavailableError: If no provider could be loaded.
+        """
+        loaded, errors = [], []
+        for provider in self.providers:
+            try:
+                provider.load()
+                loaded.append(provider)
+            except Exception as e:
+                logger.error(f"LLM provider '{provider.name}' unavailable: {str(e)}")
+                errors.append(f"{provider.name}: {str(e)}")
+        if not loaded:
+            raise LLMUnavailableError(f"No LLM provider could be loaded ({'; '.join(errors)}).")
+        self.providers = loaded
+        logger.info(f"LLM gateway ready with providers {[provider.name for provider in loaded]}.")
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the circuit breaker state and recent p95 latency of every provider."""
+        return {
+            provider.name: {
+                "circuit": self._breakers[provider.name].state,
+                "p95_seconds": self._quantile(provider.name, 0.95),
+                "hedge_after_seconds": self.hedge_delay(provider.name),
+            }
+            for provider in self.providers
+        }
+
+    def hedge_delay(self, name: str) -> Optional[float]:
+        """Returns after how many seconds a call to a provider is hedged, or None while hedging is off or latencies are unknown."""
+        if not self.hedging or len(self._latencies[name]) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return max(self._quantile(name, LLM_HEDGE_QUANTILE), LLM_HEDGE_MIN_SECONDS)
+
+    def _quantile(self, name: str, q: float) -> Optional[float]:
+        latencies = self._latencies[name]
+        return float(np.quantile(np.fromiter(latencies, dtype=np.float64), q)) if latencies else None
+
+    def _budget_end(self, position: int, deadline: float) -> float:
+        """Returns when a provider must give up, leaving time for the fallbacks after it."""
+        return deadline - (self.fallback_reserve if position < len(self.providers) - 1 else 0)
+
+    def _admit(self, provider: LLMProvider, budget_end: float) -> Tuple[float, BreakerPermit]:
+        """
+        Returns the timeout of the next call to a provider and the breaker permit the call is made under.
+
+        Raises:
+            DeadlineExceededError: If the provider's budget is used up.
+            CircuitOpenError: If the provider's circuit breaker is open.
+        """
+        remaining = budget_end - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceededError(f"Deadline reached before calling '{provider.name}'.")
+        permit = self._breakers[provider.name].allow()
+        if permit is None:
+            raise CircuitOpenError(f"Circuit breaker of '{provider.name}' is open.")
+        return min(self.attempt_timeout, remaining), permit
+
+    def _retry_delay(
+        self,
+        provider: LLMProvider,
+        permit: Optional[BreakerPermit],
+        error: BaseException,
+        attempt: int,
+        budget_end: float
+    ) -> Optional[float]:
+        """
+        Records a failed call and returns how long to wait before retrying it, or None to give up on the provider.
+        """
+        if permit is None:
+            # the provider was not called
+            return None
+        self._breakers[provider.name].record_failure(permit)
+        if attempt >= self.max_retries or not provider.is_transient(error):
+            return None
+        # full jitter: a random wait up to the exponential backoff, so clients retrying together spread out
+        delay = random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+        if time.monotonic() + delay >= budget_end:
+            return None
+        metrics.increment("llm_retries")
+        logger.warning(f"LLM provider '{provider.name}' failed ({type(error).__name__}: {str(error)}). Retrying in {delay:.2f}s.")
+        return delay
+
+    def _record_success(self, provider: LLMProvider, permit: BreakerPermit, seconds: float) -> None:
+        self._breakers[provider.name].record_success(permit)
+        self._latencies[provider.name].append(seconds)
+
+    def _give_up(self, provider: LLMProvider, position: int, error: BaseException, errors: List[str]) -> None:
+        """Logs that a provider failed for good and counts the fallback to the next one."""
+        errors.append(f"{provider.name}: {type(error).__name__}: {str(error)}")
+        logger.error(f"LLM provider '{provider.name}' failed: {type(error).__name__}: {str(error)}")
+        if position < len(self.providers) - 1:
+            metrics.increment("llm_fallbacks")
+
+    def generate(self, system_prompt: str, user_prompt: str) -> str:
+        """
+        Generates an answer, blocking. Hedging is only applied to `agenerate`.
+
+        Args:
+            system_prompt (str): The system-level instruction for the model.
+            user_prompt (str): The user query combined with contextual information.
+
+        Returns:
+            str: The generated response.
+
+        Raises:
+            LLMUnavailableError: If every provider failed.
+        """
+        deadline = time.monotonic() + self.deadline
+        errors: List[str] = []
+        with metrics.timer("llm_total"):
+            for position, provider in enumerate(self.providers):
+                budget_end = self._budget_end(position, deadline)
+                for attempt in range(self.max_retries + 1):
+                    start_time = time.perf_counter()
+                    permit = None
+                    try:
+                        timeout, permit = self._admit(provider, budget_end)
+                        text = provider.generate(system_prompt, user_prompt, timeout)
+                    except Exception as e:
+                        delay = self._retry_delay(provider, permit, e, attempt, budget_end)
+                        if delay is None:
+                            self._give_up(provider, position, e, errors)
+                            break
+                        time.sleep(delay)
+                        continue
+                    except BaseException:
+                        if permit is not None:
+                            self._breakers[provider.name].release(permit)
+                        raise
+                    self._record_success(provider, permit, time.perf_counter() - start_time)
+                    return text
+        raise LLMUnavailableError(f"All LLM providers failed ({'; '.join(errors)}).")
+
+    async def agenerate(self, system_prompt: str, user_prompt: str) -> str:
+        """
+        Async version of `generate`, with hedged calls.
+
+        Args:
+            system_prompt (str): The system-level instruction for the model.
+            user_prompt (str): The user query combined with contextual information.
+
+        Returns:
+            str: The generated response.
+
+        Raises:
+            LLMUnavailableError: If every provider failed.
+        """
+        deadline = time.monotonic() + self.deadline
+        errors: List[str] = []
+        with metrics.timer("llm_total"):
+            for position, provider in enumerate(self.providers):
+                budget_end = self._budget_end(position, deadline)
+                for attempt in range(self.max_retries + 1):
+                    start_time = time.perf_counter()
+                    permit = None
+                    try:
+                        timeout, permit = self._admit(provider, budget_end)
+                        text = await self._ahedged(provider, system_prompt, user_prompt, timeout)
+                    except Exception as e:
+                        delay = self._retry_delay(provider, permit, e, attempt, budget_end)
+                        if delay is None:
+                            self._give_up(provider, position, e, errors)
+                            break
+                        await asyncio.sleep(delay)
+                        continue
+                    except BaseException:
+                        # cancelled (e.g. by the request timeout): the call neither failed nor succeeded
+                        if permit is not None:
+                            self._breakers[provider.name].release(permit)
+                        raise
+                    self._record_success(provider, permit, time.perf_counter() - start_time)
+                    return text
+        raise LLMUnavailableError(f"All LLM providers failed ({'; '.join(errors)}).")
+
+    async def _ahedged(self, provider: LLMProvider, system_prompt: str, user_prompt: str, timeout: float) -> str:
+        """Calls a provider, sending a second request if the first is slower than its hedging delay; the first success wins."""
+        hedge_after = self.hedge_delay(provider.name)
+        if hedge_after is None or hedge_after >= timeout:
+            return await provider.agenerate(system_prompt, user_prompt, timeout)
+
+        pending = {asyncio.ensure_future(provider.agenerate(system_prompt, user_prompt, timeout))}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if not done:
+                metrics.increment("llm_hedges")
+                pending.add(asyncio.ensure_future(provider.agenerate(system_prompt, user_prompt, timeout - hedge_after)))
+
+            error: Optional[BaseException] = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def astream(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """
+        Streams an answer as text chunks. Failures before the first chunk are
+        retried and fall back like `agenerate`; once text was sent, an error is raised.
+
+        Args:
+            system_prompt (str): The system-level instruction for the model.
+            user_prompt (str): The user query combined with contextual information.
+
+        Yields:
+            str: Chunks of the generated response.
+
+        Raises:
+            LLMUnavailableError: If every provider failed before sending any text.
+        """
+        deadline = time.monotonic() + self.deadline
+        errors: List[str] = []
+        start_time = time.perf_counter()
+        for position, provider in enumerate(self.providers):
+            budget_end = self._budget_end(position, deadline)
+            for attempt in range(self.max_retries + 1):
+                attempt_start = time.perf_counter()
+                first_token = True
+                permit = None
+                try:
+                    timeout, permit = self._admit(provider, budget_end)
+                    async for text in provider.astream(system_prompt, user_prompt, timeout):
+                        if first_token:
+                            metrics.observe("llm_first_token", time.perf_counter() - start_time)
+                            first_token = False
+                        yield text
+                except Exception as e:
+                    if not first_token:
+                        self._breakers[provider.name].record_failure(permit)
+                        raise
+                    delay = self._retry_delay(provider, permit, e, attempt, budget_end)
+                    if delay is None:
+                        self._give_up(provider, position, e, errors)
+                        break
+                    await asyncio.sleep(delay)
+                    continue
+                except BaseException:
+                    # cancelled, or the client disconnected and the stream was closed
+                    if permit is not None:
+                        self._breakers[provider.name].release(permit)
+                    raise
+                self._record_success(provider, permit, time.perf_counter() - attempt_start)
+                metrics.observe("llm_total", time.perf_counter() - start_time)
+                return
+        raise LLMUnavailableError(f"All LLM providers failed ({'; '.join(errors)}).")
+
+
+# Shared gateway over the configured providers, loaded by the server at startup
+llm_gateway = LLMGateway.from_config()
@@ -1,51 +1,233 @@
 # load_data.py
+import hashlib
 import json
 import os
+from typing import Iterator, List, Tuple
+
 from log_helper import logger
-from config import DATA_FILE_PATH
+from config import (DATA_FILE_PATH,
+                    INGEST_READ_CHUNK_BYTES,
+                    CHUNK_MAX_WORDS,
+                    CHUNK_OVERLAP_WORDS)
+
+
+
+def get_profile_key(job: dict) -> str:
+    """
+    Returns the stable key of a raw job profile: its database id, falling back to its role key.
+
+    Args:
+        job (dict): A raw job profile from the dataset.
+
+    Returns:
+        str: The profile key.
+    """
+    job_id = job.get("_id")
+    if isinstance(job_id, dict):
+        job_id = job_id.get("$oid")
+    return str(job_id or job.get("jobRoleKey") or job.get("jobRole", "Unknown"))
+
+
+def profile_id(profile_key: str) -> int:
+    """
+    Derives the stable FAISS id (a non-negative int64) of a profile from its key.
+
+    Args:
+        profile_key (str): The key returned by `get_profile_key`.
+
+    Returns:
+        int: The FAISS id of the profile.
+    """
+    digest = hashlib.blake2b(profile_key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") & 0x7FFF_FFFF_FFFF_FFFF
+
+
+def text_hash(text: str) -> str:
+    """Returns the SHA-1 hex digest of a rendered profile, used to detect changed profiles."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def iter_raw_jobs(data_file_path: str = DATA_FILE_PATH, chunk_size: int = INGEST_READ_CHUNK_BYTES) -> Iterator[dict]:
+    """
+    Parses raw job profiles one at a time from a JSON array or a JSON Lines file,
+    reading `chunk_size` characters at a time so the whole file is never in memory.
+
+    Args:
+        data_file_path (str): Path of the dataset.
+        chunk_size (int): Characters read per chunk.
+
+    Yields:
+        dict: Raw job profiles, in file order.
+
+    Raises:
+        FileNotFoundError: If the dataset does not exist.
+        ValueError: If the dataset is not valid JSON.
+    """
+    if not os.path.exists(data_file_path):
+        logger.error(f"Data file not found: {data_file_path}")
+        raise FileNotFoundError(f"Data file missing: {data_file_path}")
+
+    decoder = json.JSONDecoder()
+    with open(data_file_path, "r", encoding="utf-8-sig") as file:
+        buffer = ""
+        position = 0
+        eof = False
+        in_array = None
+
+        while True:
+            # skip whitespace, and the commas between array items
+            while position < len(buffer) and (buffer[position].isspace() or (in_array and buffer[position] == ",")):
+                position += 1
+
+            if position == len(buffer):
+                if eof:
+                    break
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            if in_array is None:
+                in_array = buffer[position] == "["
+                position += in_array
+                continue
+            if in_array and buffer[position] == "]":
+                break
+
+            try:
+                job, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                if eof:
+                    logger.error(f"Error reading JSON file: {e}")
+                    raise ValueError("Invalid JSON format. Please check the data file.")
+                # the profile continues in the next chunk
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            position = end
+            if isinstance(job, dict):
+                yield job
+            else:
+                logger.warning(f"Skipped a dataset entry that is not a job profile: {str(job)[:80]}")
 
 
+def parse_job_profile(job: dict) -> dict:
+    """
+    Extracts the fields used for retrieval from a raw job profile.
+
+    Args:
+        job (dict): A raw job profile from the dataset.
+
+    Returns:
+        dict: The structured job profile.
+    """
+    return {
+        "profile_key": get_profile_key(job),
+        "job_role": job.get("jobRole", "Unknown"),
+        "description": job.get("jobProfile", {}).get("generalDescription", {}).get("text", "N/A"),
+        "day_in_life": job.get("jobProfile", {}).get("dayInTheLife", {}).get("text", "N/A"),
+        "skills": [apt.get("attribute", "N/A") for apt in job.get("aptitudeRatings", [])],
+        "education": [prep.get("value", "N/A") for prep in job.get("jobProfile", {}).get("prepareForRole", [])],
+        "salary": job.get("geographicJobDetails", []),
+        "employers": [emp.get("name", "N/A") for emp in job.get("employers", {}).get("wellKnownEmployers", [])]
+    }
+
+
+def iter_jobs_data(data_file_path: str = DATA_FILE_PATH) -> Iterator[dict]:
+    """
+    Streams structured job profiles from the dataset without loading it all into memory.
 
-def get_jobs_data():
+    Args:
+        data_file_path (str): Path of the dataset, a JSON array or JSON Lines. Defaults to `DATA_FILE_PATH`.
+
+    Yields:
+        dict: Structured job profiles, see `parse_job_profile`.
+    """
+    count = 0
+    for job in iter_raw_jobs(data_file_path):
+        yield parse_job_profile(job)
+        count += 1
+
+    logger.info(f"Loaded {count} job profiles successfully.")
+
+
+def get_jobs_data(data_file_path: str = DATA_FILE_PATH):
     """
     Loads job profiles from a JSON file and extracts relevant fields.
 
+    Args:
+        data_file_path (str): Path of the JSON dataset. Defaults to `DATA_FILE_PATH`.
+
     Returns:
         list[dict]: A list of structured job profiles.
     """
-    # Ensure file exists
-    if not os.path.exists(DATA_FILE_PATH):
-        logger.error(f"Data file not found: {DATA_FILE_PATH}")
-        raise FileNotFoundError(f"Data file missing: {DATA_FILE_PATH}")
-
-    try:
-        # Load JSON file
-        with open(DATA_FILE_PATH, "r", encoding="utf-8") as file:
-            data = json.load(file)
-
-        # Extract key fields
-        job_profiles = []
-        for job in data:
-            profile = {
-                "job_role": job.get("jobRole", "Unknown"),
-                "description": job.get("jobProfile", {}).get("generalDescription", {}).get("text", "N/A"),
-                "day_in_life": job.get("jobProfile", {}).get("dayInTheLife", {}).get("text", "N/A"),
-                "skills": [apt.get("attribute", "N/A") for apt in job.get("aptitudeRatings", [])],
-                "education": [prep.get("value", "N/A") for prep in job.get("jobProfile", {}).get("prepareForRole", [])],
-                "salary": job.get("geographicJobDetails", []),
-                "employers": [emp.get("name", "N/A") for emp in job.get("employers", {}).get("wellKnownEmployers", [])]
-            }
-            job_profiles.append(profile)
-
-        logger.info(f"Loaded {len(job_profiles)} job profiles successfully.")
-        return job_profiles
-
-    except json.JSONDecodeError as e:
-        logger.error(f"Error reading JSON file: {e}")
-        raise ValueError("Invalid JSON format. Please check the data file.")
-    
+    return list(iter_jobs_data(data_file_path))
 
 
+def profile_to_text(profile: dict) -> str:
+    """
+    Renders a structured job profile as the text used for embedding and as LLM context.
+
+    Args:
+        profile (dict): A job profile as returned by `get_jobs_data`.
+
+    Returns:
+        str: The formatted job profile.
+    """
+    return (
+        f"Role: {profile['job_role']}\n"
+        f"Description: {profile['description']}\n"
+        f"Day in Life: {profile['day_in_life']}\n"
+        f"Skills: {', '.join(profile['skills'])}\n"
+        f"Education: {', '.join(profile['education'])}\n"
+        f"Employers: {', '.join(profile['employers'])}"
+    )
+
+
+# (section key, label) of the profile sections rendered after the role, in profile order
+PROFILE_SECTIONS = (
+    ("description", "Description"),
+    ("day_in_life", "Day in Life"),
+    ("skills", "Skills"),
+    ("education", "Education"),
+    ("employers", "Employers"),
+)
+
+
+def chunk_profile(
+    profile: dict,
+    max_words: int = CHUNK_MAX_WORDS,
+    overlap_words: int = CHUNK_OVERLAP_WORDS
+) -> List[Tuple[str, str]]:
+    """
+    Splits a structured job profile into its sections, and sections longer than
+    `max_words` into overlapping windows, so each chunk fits the embedding model.
+
+    Args:
+        profile (dict): A job profile as returned by `get_jobs_data`.
+        max_words (int): Maximum number of words per chunk.
+        overlap_words (int): Words repeated between consecutive windows of a section.
+
+    Returns:
+        List[Tuple[str, str]]: (section key, chunk text) pairs in profile order,
+        e.g. ("skills", "Skills: Numerical Aptitude, ..."). Empty sections are skipped.
+    """
+    step = max(1, max_words - overlap_words)
+    chunks = []
+    for key, label in PROFILE_SECTIONS:
+        value = profile[key]
+        if isinstance(value, list):
+            value = ", ".join(value)
+        words = value.split()
+        if not words or value == "N/A":
+            continue
+        for start in range(0, max(1, len(words) - overlap_words), step):
+            chunks.append((key, f"{label}: {' '.join(words[start:start + max_words])}"))
+    return chunks
 
 
 def get_text_job_profiles() -> list[str]:
@@ -57,15 +239,4 @@ def get_text_job_profiles() -> list[str]:
     """
     job_profiles = get_jobs_data()
 
-    def job_to_text(profile):
-        return (
-            f"Role: {profile['job_role']}\n"
-            f"Description: {profile['description']}\n"
-            f"Day in Life: {profile['day_in_life']}\n"
-            f"Skills: {', '.join(profile['skills'])}\n"
-            f"Education: {', '.join(profile['education'])}\n"
-            f"Employers: {', '.join(profile['employers'])}"
-        )
-
-    return [job_to_text(profile) for profile in job_profiles]
-
+    return [profile_to_text(profile) for profile in job_profiles]
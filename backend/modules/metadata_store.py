@@ -0,0 +1,225 @@
+# metadata_store.py
+
+import re
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from log_helper import logger
+
+if TYPE_CHECKING:
+    from modules.doc_store import DocumentStore
+
+
+# education levels from lowest to highest; a profile is tagged with the lowest level its entry requirements mention
+EDUCATION_LEVELS = ("10th", "12th", "diploma", "graduate", "postgraduate")
+
+_EDUCATION_PATTERNS = (
+    ("10th", re.compile(r"\b10th\b")),
+    ("12th", re.compile(r"\b12th\b")),
+    ("diploma", re.compile(r"\b(diploma|iti|certificate)\b")),
+    ("graduate", re.compile(r"\b(degree|bachelor|graduat\w*|b\.?\s?(sc|tech|com)|mbbs|engineering)\b")),
+    ("postgraduate", re.compile(r"\b(master|post-?graduat\w*|m\.?\s?(sc|tech|ba)|phd|doctorate)\b")),
+)
+
+# filter selections kept per store; filters have few distinct values in practice
+SELECTION_CACHE_SIZE = 256
+
+
+class MetadataFilter(NamedTuple):
+    """Structured filters of a query; fields left as None are not filtered on."""
+    # geographic option of the profile, e.g. "Large Cities"
+    region: Optional[str] = None
+    # minimum of the upper end of the estimated salary range (in the region, if given)
+    min_salary: Optional[float] = None
+    # highest education of the user; only profiles requiring at most this level match
+    education: Optional[str] = None
+
+    def is_empty(self) -> bool:
+        return self.region is None and self.min_salary is None and self.education is None
+
+
+class FilterSelection(NamedTuple):
+    """The chunks matching a filter, ready to restrict both searches."""
+    # FAISS selector over the allowed chunk ids
+    selector: faiss.IDSelector
+    # allowed chunks, in document store chunk order
+    chunk_mask: np.ndarray
+    # fraction of all chunks that is allowed
+    selectivity: float
+
+
+def _region_key(region: str) -> str:
+    """Normalizes a region name so that e.g. "large cities" and "Large_Cities" match "Large Cities"."""
+    return re.sub(r"[^a-z0-9]+", "", region.lower())
+
+
+def parse_salary_range(salary_range: str) -> Tuple[float, float]:
+    """
+    Parses an estimated salary range such as "₹50,000 - ₹1,00,000".
+
+    Returns:
+        Tuple[float, float]: The lower and upper end, or (-inf, -inf) if no amount is found.
+    """
+    amounts = [float(amount.replace(",", "")) for amount in re.findall(r"\d[\d,]*", salary_range)]
+    if not amounts:
+        return float("-inf"), float("-inf")
+    return min(amounts), max(amounts)
+
+
+def education_level(requirements: Tuple[str, ...]) -> int:
+    """
+    Returns the position in `EDUCATION_LEVELS` of the lowest education a profile's
+    entry requirements mention, or -1 if none is recognized.
+    """
+    found = [
+        level
+        for text in requirements
+        for level, (_, pattern) in enumerate(_EDUCATION_PATTERNS)
+        if pattern.search(text.lower())
+    ]
+    return min(found, default=-1)
+
+
+class MetadataStore:
+    """
+    Columnar store of the structured profile fields used to filter searches.
+
+    Each categorical field has one bitmap per value over the profiles (regions,
+    and "requires at most this level" for education); salaries are a float
+    column per region. A filter combines bitmaps and a vectorized salary
+    comparison into a profile mask, expands it to the chunks of those
+    profiles, and turns it into a FAISS `IDSelector`, so the search itself only
+    visits allowed vectors. Selections are cached per filter.
+    """
+
+    def __init__(
+        self,
+        regions: List[str],
+        region_bitmaps: np.ndarray,
+        max_salaries: np.ndarray,
+        education_bitmaps: np.ndarray,
+        chunk_ids: np.ndarray,
+        chunk_doc_positions: np.ndarray
+    ):
+        self.regions = regions
+        self._region_rows: Dict[str, int] = {_region_key(region): row for row, region in enumerate(regions)}
+        # (regions, profiles) bool, (profiles, regions) float32, (education levels, profiles) bool
+        self.region_bitmaps = region_bitmaps
+        self.max_salaries = max_salaries
+        self.education_bitmaps = education_bitmaps
+        self.chunk_ids = chunk_ids
+        self.chunk_doc_positions = chunk_doc_positions
+        self._selections: "OrderedDict[MetadataFilter, FilterSelection]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_store(cls, doc_store: "DocumentStore") -> "MetadataStore":
+        """
+        Builds the metadata columns and bitmaps of a document store.
+
+        Args:
+            doc_store (DocumentStore): The profiles and chunks to index.
+
+        Returns:
+            MetadataStore: The populated store.
+        """
+        regions: Dict[str, int] = {}
+        for document in doc_store:
+            for detail in document.salary:
+                regions.setdefault(detail.get("geographicOption", "Unknown"), len(regions))
+
+        num_documents = len(doc_store)
+        region_bitmaps = np.zeros((len(regions), num_documents), dtype=bool)
+        max_salaries = np.full((num_documents, len(regions)), -np.inf, dtype=np.float32)
+        levels = np.empty(num_documents, dtype=np.int8)
+        for position, document in enumerate(doc_store):
+            for detail in document.salary:
+                row = regions[detail.get("geographicOption", "Unknown")]
+                region_bitmaps[row, position] = True
+                max_salaries[position, row] = parse_salary_range(detail.get("estimatedSalaryRange", ""))[1]
+            levels[position] = education_level(document.education)
+
+        # bitmap of a level: profiles whose requirement is known and at most that level
+        education_bitmaps = np.stack([
+            (levels >= 0) & (levels <= level) for level in range(len(EDUCATION_LEVELS))
+        ]) if num_documents else np.zeros((len(EDUCATION_LEVELS), 0), dtype=bool)
+
+        store = cls(
+            list(regions),
+            region_bitmaps,
+            max_salaries,
+            education_bitmaps,
+            np.asarray(doc_store.chunk_ids(), dtype=np.int64),
+            np.asarray(doc_store.chunk_doc_positions(), dtype=np.int64),
+        )
+        logger.info(f"Metadata store built with {len(regions)} regions over {num_documents} job profiles.")
+        return store
+
+    def validate(self, filters: MetadataFilter) -> None:
+        """
+        Checks that a filter only uses known values.
+
+        Raises:
+            ValueError: If the region or education level is unknown.
+        """
+        if filters.region is not None and _region_key(filters.region) not in self._region_rows:
+            raise ValueError(f"Unknown region '{filters.region}'. Expected one of {self.regions}.")
+        if filters.education is not None and filters.education.lower() not in EDUCATION_LEVELS:
+            raise ValueError(f"Unknown education level '{filters.education}'. Expected one of {EDUCATION_LEVELS}.")
+
+    def profile_mask(self, filters: MetadataFilter) -> np.ndarray:
+        """
+        Returns the profiles matching a filter.
+
+        Args:
+            filters (MetadataFilter): A validated filter.
+
+        Returns:
+            np.ndarray: Boolean mask over the profiles, in document store order.
+        """
+        mask = np.ones(self.max_salaries.shape[0], dtype=bool)
+        region_row = None
+        if filters.region is not None:
+            region_row = self._region_rows[_region_key(filters.region)]
+            mask &= self.region_bitmaps[region_row]
+        if filters.education is not None:
+            mask &= self.education_bitmaps[EDUCATION_LEVELS.index(filters.education.lower())]
+        if filters.min_salary is not None:
+            salaries = self.max_salaries[:, region_row] if region_row is not None else self.max_salaries.max(axis=1, initial=-np.inf)
+            mask &= salaries >= filters.min_salary
+        return mask
+
+    def selection(self, filters: MetadataFilter) -> FilterSelection:
+        """
+        Returns the chunks matching a filter as a FAISS selector and a chunk mask.
+
+        Args:
+            filters (MetadataFilter): A validated filter.
+
+        Returns:
+            FilterSelection: The allowed chunks.
+        """
+        key = filters._replace(
+            region=_region_key(filters.region) if filters.region is not None else None,
+            education=filters.education.lower() if filters.education is not None else None,
+        )
+        with self._lock:
+            selection = self._selections.get(key)
+            if selection is not None:
+                self._selections.move_to_end(key)
+                return selection
+
+        chunk_mask = self.profile_mask(filters)[self.chunk_doc_positions]
+        allowed = np.ascontiguousarray(self.chunk_ids[chunk_mask])
+        selector = faiss.IDSelectorBatch(len(allowed), faiss.swig_ptr(allowed))
+        selection = FilterSelection(selector, chunk_mask, len(allowed) / max(len(self.chunk_ids), 1))
+
+        with self._lock:
+            self._selections[key] = selection
+            if len(self._selections) > SELECTION_CACHE_SIZE:
+                self._selections.popitem(last=False)
+        return selection
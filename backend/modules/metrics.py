@@ -0,0 +1,150 @@
+# metrics.py
+
+import bisect
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+from config import METRICS_ENABLED
+
+
+# pipeline stages timed per query
+STAGES = (
+    "query_embedding",
+    "faiss_search",
+    "lexical_search",
+    "rerank",
+    "document_lookup",
+    "prompt_build",
+    "llm_first_token",
+    "llm_total",
+    "request",
+)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# log-spaced bucket bounds from 0.1 ms to ~2 min, each 10% wider than the previous one
+BUCKET_BOUNDS = tuple(1e-4 * 1.1 ** i for i in range(148))
+
+
+class Histogram:
+    """
+    Streaming latency histogram with fixed log-spaced buckets.
+
+    Memory does not grow with the number of observations; quantiles are
+    interpolated inside a bucket, so they are accurate to within 10%.
+    """
+
+    def __init__(self, bounds: Tuple[float, ...] = BUCKET_BOUNDS):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Records one observation (in seconds)."""
+        self._counts[bisect.bisect_left(self._bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile of the observations.
+
+        Args:
+            q (float): Quantile between 0 and 1.
+
+        Returns:
+            float: The estimated value, or NaN if nothing was observed.
+        """
+        if not self.count:
+            return math.nan
+
+        rank = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self._counts):
+            if seen + count >= rank and count:
+                lower = self._bounds[bucket - 1] if bucket > 0 else 0.0
+                upper = self._bounds[bucket] if bucket < len(self._bounds) else lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self._bounds[-1]
+
+
+class Metrics:
+    """
+    Process-wide registry of per-stage latency histograms and event counters,
+    rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._histograms: Dict[str, Histogram] = defaultdict(Histogram)
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Records the duration of a pipeline stage."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._histograms[stage].observe(seconds)
+
+    def increment(self, counter: str, value: float = 1) -> None:
+        """Increments an event counter, e.g. `answer_cache_hits`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[counter] += value
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Times the enclosed block with `perf_counter` and records it under `stage`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def render(self, prefix: str = "rag") -> str:
+        """
+        Renders all metrics in the Prometheus text format.
+
+        Stage latencies are exported as a summary with p50/p95/p99 quantiles,
+        counters as `<prefix>_<name>_total`.
+
+        Args:
+            prefix (str): Prefix of every metric name.
+
+        Returns:
+            str: The exposition text served by `GET /metrics`.
+        """
+        with self._lock:
+            lines: List[str] = [
+                f"# HELP {prefix}_stage_latency_seconds Latency of each query pipeline stage.",
+                f"# TYPE {prefix}_stage_latency_seconds summary",
+            ]
+            # pipeline order first, then any other stage alphabetically
+            order = {stage: position for position, stage in enumerate(STAGES)}
+            for stage in sorted(self._histograms, key=lambda name: (order.get(name, len(STAGES)), name)):
+                histogram = self._histograms[stage]
+                for q in QUANTILES:
+                    lines.append(
+                        f'{prefix}_stage_latency_seconds{{stage="{stage}",quantile="{q}"}} {histogram.quantile(q):.6f}'
+                    )
+                lines.append(f'{prefix}_stage_latency_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'{prefix}_stage_latency_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+            for counter, value in sorted(self._counters.items()):
+                name = f"{prefix}_{counter}_total"
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Global registry shared by all modules of the process
+metrics = Metrics()
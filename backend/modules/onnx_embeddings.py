@@ -0,0 +1,167 @@
+# onnx_embeddings.py
+"""
+ONNX Runtime embedding backend.
+
+Export (and int8-quantize) the configured model once, from backend/:
+    python -m modules.onnx_embeddings
+
+then set EMBEDDING_BACKEND = "onnx" in config.py. Serving only needs
+onnxruntime and tokenizers; torch is only needed for the export.
+"""
+
+import argparse
+import os
+from typing import List
+
+import numpy as np
+
+from log_helper import logger
+from config import (EMBEDDING_MODEL_NAME,
+                    EMBEDDING_THREADS,
+                    EMBEDDING_MAX_SEQ_LENGTH,
+                    ONNX_MODEL_DIR,
+                    ONNX_QUANTIZED)
+
+
+ONNX_MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model-int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+# texts per ONNX Runtime call in `embed_documents`
+ONNX_BATCH_SIZE = 32
+
+
+class OnnxEmbeddings:
+    """
+    Sentence embeddings from an ONNX export of a sentence-transformers model.
+
+    Applies the model's attention-masked mean pooling and L2 normalization,
+    so vectors match `HuggingFaceEmbeddings` up to quantization error and the
+    existing index can be searched without re-embedding it.
+
+    Exposes the same `embed_documents` / `embed_query` interface as `HuggingFaceEmbeddings`.
+    """
+
+    def __init__(
+        self,
+        model_dir: str = ONNX_MODEL_DIR,
+        quantized: bool = ONNX_QUANTIZED,
+        threads: int = EMBEDDING_THREADS,
+        max_length: int = EMBEDDING_MAX_SEQ_LENGTH
+    ):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("The onnx embedding backend needs the `onnxruntime` and `tokenizers` packages.") from e
+
+        model_path = os.path.join(model_dir, QUANTIZED_MODEL_FILE if quantized else ONNX_MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"No ONNX model at {model_path}. Export it with `python -m modules.onnx_embeddings`.")
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self._session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {model_input.name for model_input in self._session.get_inputs()}
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self._tokenizer.enable_truncation(max_length)
+        # pad each batch to its longest text only
+        self._tokenizer.enable_padding()
+        logger.info(f"ONNX embedding model loaded from {model_path}.")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embeds a list of texts."""
+        if not texts:
+            return []
+        return np.concatenate([
+            self._embed(texts[start:start + ONNX_BATCH_SIZE]) for start in range(0, len(texts), ONNX_BATCH_SIZE)
+        ]).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embeds a single query."""
+        return self._embed([text])[0].tolist()
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Runs one batch through the model and pools it into normalized sentence vectors."""
+        encodings = self._tokenizer.encode_batch(texts)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": attention_mask,
+        }
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+
+        token_embeddings = self._session.run(None, inputs)[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+
+def export_onnx_model(model_name: str = EMBEDDING_MODEL_NAME, output_dir: str = ONNX_MODEL_DIR, quantize: bool = True) -> None:
+    """
+    Exports a Hugging Face encoder and its tokenizer to ONNX, optionally with
+    an int8 dynamically quantized copy of the model.
+
+    Args:
+        model_name (str): Hugging Face model id.
+        output_dir (str): Directory receiving the ONNX model(s) and `tokenizer.json`.
+        quantize (bool): Also write the int8 model.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    tokenizer.save_pretrained(output_dir)
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["token_embeddings"]}
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+    logger.info(f"ONNX model exported to {model_path}.")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_path = os.path.join(output_dir, QUANTIZED_MODEL_FILE)
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        logger.info(f"int8 model written to {quantized_path}.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Exports the embedding model to ONNX.")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--output", default=ONNX_MODEL_DIR)
+    parser.add_argument("--no-quantize", action="store_true", help="Only write the float32 model.")
+    args = parser.parse_args()
+
+    export_onnx_model(args.model, args.output, quantize=not args.no_quantize)
+
+    # compare the exported model with the PyTorch one on a few texts
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    texts = ["What does a data entry clerk do?", "Skills: Logical Reasoning, Numerical Aptitude", "Employers: Flipkart, Amazon"]
+    reference = np.array(HuggingFaceEmbeddings(model_name=args.model).embed_documents(texts), dtype=np.float32)
+    reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+    exported = np.array(OnnxEmbeddings(args.output, quantized=not args.no_quantize).embed_documents(texts), dtype=np.float32)
+    print(f"Lowest cosine similarity to the PyTorch model: {float(np.sum(reference * exported, axis=1).min()):.4f}")
+
+
+if __name__ == "__main__":
+    main()
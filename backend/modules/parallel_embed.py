@@ -0,0 +1,102 @@
+# parallel_embed.py
+
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from log_helper import logger
+from config import EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, EMBEDDING_BUILD_THREADS_PER_WORKER
+
+
+# embedding model of a worker process, loaded once by `_init_worker`
+_worker_model = None
+
+
+def _init_worker(model_name: str, backend: str, threads: int) -> None:
+    """Loads the worker's embedding model with the same backend as the serving model, limited to `threads` threads."""
+    global _worker_model
+    if backend == "onnx":
+        from modules.onnx_embeddings import OnnxEmbeddings
+        _worker_model = OnnxEmbeddings(threads=threads)
+        return
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    _worker_model = HuggingFaceEmbeddings(model_name=model_name)
+
+
+def _embed_shard(texts: List[str]) -> np.ndarray:
+    """Embeds one shard of texts in a worker process."""
+    return np.array(_worker_model.embed_documents(texts), dtype=np.float32)
+
+
+class ParallelEmbedder:
+    """
+    Pool of worker processes, each holding its own copy of the embedding model,
+    loaded with `backend` so that its vectors match the in-process model's.
+
+    Shards of texts are embedded concurrently and returned in submission order,
+    so callers can merge them as if they had been embedded sequentially. At most
+    two shards per worker are in flight to keep memory bounded.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        model_name: str = EMBEDDING_MODEL_NAME,
+        backend: str = EMBEDDING_BACKEND,
+        threads_per_worker: int = EMBEDDING_BUILD_THREADS_PER_WORKER
+    ):
+        self._workers = workers
+        self._model_name = model_name
+        self._backend = backend
+        self._threads = threads_per_worker
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "ParallelEmbedder":
+        logger.info(f"Starting {self._workers} {self._backend} embedding workers with {self._threads} thread(s) each.")
+        # spawn rather than fork: the parent already runs torch and FAISS threads
+        self._pool = ProcessPoolExecutor(
+            max_workers=self._workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self._model_name, self._backend, self._threads)
+        )
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._pool = None
+
+    def imap(self, shards: Iterable[List[str]]) -> Iterator[np.ndarray]:
+        """
+        Embeds shards of texts across the workers.
+
+        Args:
+            shards (Iterable[List[str]]): Texts to embed, grouped into shards.
+
+        Yields:
+            np.ndarray: The raw (unnormalized) float32 embeddings of each shard, in order.
+        """
+        pending: Deque[Future] = deque()
+        for texts in shards:
+            pending.append(self._pool.submit(_embed_shard, texts))
+            if len(pending) >= 2 * self._workers:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def resolve_workers(configured: int) -> int:
+    """Returns the number of embedding worker processes for a configured value (0 = one per CPU core)."""
+    return configured if configured > 0 else os.cpu_count() or 1
@@ -1,83 +1,526 @@
-import os
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
 import numpy as np
 import faiss
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
 import log_helper 
 
 from log_helper import logger
 
-from modules.loader import get_text_job_profiles
+from modules.doc_store import DocumentStore
+from modules.context_builder import build_context
+from modules.lexical_index import reciprocal_rank_fusion
+from modules.metadata_store import MetadataFilter
+from modules.scoring import similarities, adaptive_cut, mmr, reconstruct, query_similarities
+from modules.embedding_store import EmbeddingStore
+from modules.embedding_cache import CachedEmbeddings
+from modules.ingest import IngestCheckpoint
+from modules.parallel_embed import ParallelEmbedder, resolve_workers
+from modules.metrics import metrics
+from modules.ann_index import (resolve_index_spec,
+                               create_faiss_index,
+                               train_faiss_index,
+                               configure_search,
+                               filtered_search_parameters,
+                               supports_removal)
 from config import (EMBEDDING_MODEL_NAME, 
+                    EMBEDDING_BACKEND,
+                    EMBEDDING_THREADS,
+                    EMBEDDING_CACHE_ENABLED,
+                    EMBEDDING_PARITY_SAMPLE,
+                    EMBEDDING_PARITY_MIN_COSINE,
+                    INGEST_BATCH_SIZE,
+                    EMBEDDING_BUILD_WORKERS,
                     TOP_K, 
-                    INDEX_FILE_PATH,
-                    SIMILARITY_TRESHOLD)
+                    CHUNK_SEARCH_FACTOR,
+                    HYBRID_SEARCH_ENABLED,
+                    RRF_K,
+                    SIMILARITY_TRESHOLD,
+                    MMR_ENABLED)
 
 
 # Global caching for performance
 embedding_model = None
-faiss_index = None
+# backend `embedding_model` was loaded with
+embedding_backend = EMBEDDING_BACKEND
+
+EMBEDDING_BACKENDS = ("torch", "onnx")
+
+
+def loaded_embedding_backend() -> str:
+    """Returns the backend of the shared embedding model, which is torch after a fallback from EMBEDDING_BACKEND."""
+    return embedding_backend
 
 
-def load_embedding_model():
+def load_embedding_model(backend: str = EMBEDDING_BACKEND):
     """
     Loads the embedding model once and reuses it for all queries.
+    When enabled, the model is wrapped with the persistent embedding cache.
+    Asking for another backend than the loaded one replaces the shared model.
+
+    Args:
+        backend (str): "torch" for `HuggingFaceEmbeddings`, "onnx" for `OnnxEmbeddings`.
     
     Returns:
-        HuggingFaceEmbeddings: Preloaded embedding model.
+        HuggingFaceEmbeddings | OnnxEmbeddings | CachedEmbeddings: Preloaded embedding model.
     """
-    global embedding_model
-    if embedding_model is None:
-        embedding_model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
-        logger.info("Embedding model loaded into memory.")
+    global embedding_model, embedding_backend
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'. Expected one of {EMBEDDING_BACKENDS}.")
+
+    if embedding_model is None or backend != embedding_backend:
+        if backend == "onnx":
+            from modules.onnx_embeddings import OnnxEmbeddings
+
+            model = OnnxEmbeddings()
+            # quantized vectors differ slightly, so they are cached apart from the PyTorch ones
+            cache_name = f"{EMBEDDING_MODEL_NAME}@onnx"
+        else:
+            # imported here: it pulls in torch and transformers, which take seconds to import
+            import torch
+            from langchain_huggingface import HuggingFaceEmbeddings
+
+            if EMBEDDING_THREADS > 0:
+                torch.set_num_threads(EMBEDDING_THREADS)
+            model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+            cache_name = EMBEDDING_MODEL_NAME
+
+        if EMBEDDING_CACHE_ENABLED:
+            model = CachedEmbeddings(model, cache_name)
+        embedding_model, embedding_backend = model, backend
+        logger.info(f"Embedding model loaded into memory ({backend} backend).")
     return embedding_model
 
 
-def load_index():
-    """Loads FAISS index and creates one if missing."""
-    global faiss_index
-    global embedding_model
-    if faiss_index is None:
-        if not os.path.exists(INDEX_FILE_PATH):
-            logger.warning(f"FAISS index missing at {INDEX_FILE_PATH}. Generating new index...")
-            create_index(embedding_model)
-        
-        faiss_index = faiss.read_index(INDEX_FILE_PATH)
-        logger.info("FAISS index loaded into memory.")
-    
-    return faiss_index
+def check_embedding_parity(
+    embedding_model,
+    doc_store: DocumentStore,
+    embeddings: EmbeddingStore,
+    sample_size: int = EMBEDDING_PARITY_SAMPLE,
+    min_cosine: float = EMBEDDING_PARITY_MIN_COSINE
+) -> float:
+    """
+    Re-embeds a sample of indexed chunks and compares them with the vectors stored
+    for the index, to confirm a model can query an index built by another backend.
 
+    Args:
+        embedding_model (HuggingFaceEmbeddings | OnnxEmbeddings): The model to check.
+        doc_store (DocumentStore): Chunks of the index.
+        embeddings (EmbeddingStore): Stored vectors of the index.
+        sample_size (int): Number of chunks to re-embed.
+        min_cosine (float): Lowest acceptable cosine similarity of a re-embedded chunk to its stored vector.
 
+    Returns:
+        float: The lowest cosine similarity in the sample.
 
-def create_index(embedding_model):
+    Raises:
+        ValueError: If any chunk in the sample is below `min_cosine`.
     """
-    Creates and saves a FAISS index for job profile embeddings.
+    ids = np.asarray(doc_store.chunk_ids(), dtype=np.int64)
+    rows = np.random.default_rng(0).choice(len(ids), min(sample_size, len(ids)), replace=False)
+    positions = embeddings.positions(ids[rows])
+    rows, positions = rows[positions >= 0], positions[positions >= 0]
+    if not len(rows):
+        raise ValueError("No stored vectors to compare with.")
+
+    texts = doc_store.chunk_texts()
+    vectors = normalize(embed_texts(embedding_model, [texts[row] for row in rows]))
+    worst = float(np.sum(vectors * embeddings.vectors[positions], axis=1).min())
+    if worst < min_cosine:
+        raise ValueError(f"Embeddings differ from the index: lowest cosine similarity {worst:.4f} < {min_cosine}.")
+
+    logger.info(f"Embedding parity confirmed on {len(rows)} chunks (lowest cosine similarity {worst:.4f}).")
+    return worst
+
+
+def embed_texts(embedding_model, texts: List[str]) -> np.ndarray:
     """
-    logger.info("Creating FAISS index...")
-    text_job_profiles = get_text_job_profiles()
-    
-    if not text_job_profiles:
-        logger.error("No job profiles found. Index creation aborted.")
-        return
+    Embeds texts and L2-normalizes the vectors so inner product equals cosine similarity.
+
+    Args:
+        embedding_model (HuggingFaceEmbeddings): Model used to embed the texts.
+        texts (List[str]): Texts to embed.
 
-    # Generate and normalize embeddings
-    job_profiles_embeddings = embedding_model.embed_documents(text_job_profiles)
+    Returns:
+        np.ndarray: float32 matrix with one normalized row per text.
+    """
     # converted embeddings to numpy array
-    emb_array = np.array(job_profiles_embeddings, dtype=np.float32)
-    # normalized the embeddings
-    emb_array /= np.linalg.norm(emb_array, axis=1, keepdims=True)
+    emb_array = np.array(embedding_model.embed_documents(texts), dtype=np.float32)
+    return normalize(emb_array)
 
-    # Create and save FAISS index
-    index = faiss.IndexFlatIP(emb_array.shape[1])
-    index.add(emb_array)
-    faiss.write_index(index, INDEX_FILE_PATH)
 
-    logger.info(f"FAISS index created successfully and saved at {INDEX_FILE_PATH}")
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalizes the rows of a float32 matrix in place and returns it."""
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
 
 
+def embed_shards(embedding_model, shards: Iterator[List[str]], num_shards: int) -> Iterator[np.ndarray]:
+    """
+    Embeds shards of texts in order, across `EMBEDDING_BUILD_WORKERS` processes when
+    configured, each loading the model once with the backend of the shared model,
+    or with `embedding_model` in-process.
+
+    Args:
+        embedding_model (HuggingFaceEmbeddings): Model used when embedding in-process.
+        shards (Iterator[List[str]]): Texts to embed, grouped into shards.
+        num_shards (int): Number of shards, used to skip the pool for small builds.
+
+    Yields:
+        np.ndarray: Normalized float32 embeddings of each shard, in order.
+    """
+    workers = min(resolve_workers(EMBEDDING_BUILD_WORKERS), num_shards)
+    if workers <= 1:
+        for texts in shards:
+            yield embed_texts(embedding_model, texts)
+        return
+
+    with ParallelEmbedder(workers, backend=embedding_backend) as embedder:
+        for vectors in embedder.imap(shards):
+            yield normalize(vectors)
+
+
+def build_index(
+    embedding_model,
+    doc_store: DocumentStore,
+    base_index: Optional[faiss.Index] = None,
+    embeddings: Optional[EmbeddingStore] = None,
+    base_spec: Optional[Dict[str, Any]] = None,
+    checkpoint: Optional[IngestCheckpoint] = None,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> Tuple[faiss.Index, EmbeddingStore, Dict[str, Any]]:
+    """
+    Builds the FAISS index for a document store, embedding only chunks that are new
+    or whose text changed since `embeddings` was computed. Chunks are embedded in
+    batches of `INGEST_BATCH_SIZE` and each batch is written into the new embedding
+    store and added to the index as soon as it is embedded (IVF indexes, which must
+    be trained first, are filled at the end). With a checkpoint, the new store is
+    memory-mapped from a temporary file in its directory, so a build holds no copy
+    of the corpus embeddings in memory besides the previous version's store.
+    Nothing is written to disk besides the checkpoint; persisting and serving is done
+    by `IndexManager`.
+
+    Args:
+        embedding_model (HuggingFaceEmbeddings): Model used to embed the job profiles.
+        doc_store (DocumentStore): Job profiles to index; one vector is built per chunk.
+        base_index (faiss.Index, optional): Index built from `embeddings`. When its spec matches
+            the configured one, a copy is updated with add/remove instead of building from scratch.
+        embeddings (EmbeddingStore, optional): Embeddings of the previous index version.
+        base_spec (Dict[str, Any], optional): Spec `base_index` was built with.
+        checkpoint (IngestCheckpoint, optional): Where embedded batches are saved, and reused
+            from if a previous build was interrupted.
+        progress (Callable[[int, int], None], optional): Called with (embedded, total) after each batch.
+
+    Returns:
+        Tuple[faiss.Index, EmbeddingStore, Dict[str, Any]]: The new index, the embeddings of
+        every chunk in `doc_store` and the spec of the index type used.
+    """
+    logger.info("Creating FAISS index...")
+    if embeddings is None:
+        embeddings = EmbeddingStore.empty()
+
+    ids = np.array(doc_store.chunk_ids(), dtype=np.int64)
+    hashes = np.array(doc_store.chunk_hashes(), dtype="S40")
+    changed, removed = embeddings.diff(ids, hashes)
+    changed_rows = np.flatnonzero(changed)
+    changed_ids = ids[changed_rows]
+    logger.info(f"{len(changed_ids)} new or changed chunks to embed, {len(removed)} removed.")
+
+    directory = checkpoint.directory if checkpoint is not None else None
+    index = spec = new_embeddings = None
+    streaming = False
+    batches = _embed_in_batches(embedding_model, doc_store.chunk_texts(), changed_rows, ids, hashes, checkpoint, progress)
+    for offset, batch_vectors in batches:
+        if index is None:
+            new_embeddings = embeddings.updated(ids, hashes, changed, batch_vectors.shape[1], directory)
+            index, spec, streaming = _start_index(
+                len(ids), batch_vectors.shape[1], base_index, base_spec, embeddings, new_embeddings, changed, removed
+            )
+        new_embeddings.vectors[changed_rows[offset:offset + len(batch_vectors)]] = batch_vectors
+        if streaming:
+            index.add_with_ids(batch_vectors, changed_ids[offset:offset + len(batch_vectors)])
+
+    if index is None:
+        # nothing to embed: every chunk keeps its stored vector
+        new_embeddings = embeddings.updated(ids, hashes, changed, embeddings.dimension, directory)
+        index, spec, streaming = _start_index(
+            len(ids), embeddings.dimension, base_index, base_spec, embeddings, new_embeddings, changed, removed
+        )
+
+    if not streaming:
+        train_faiss_index(index, new_embeddings.vectors)
+        for offset in range(0, len(new_embeddings), INGEST_BATCH_SIZE):
+            index.add_with_ids(
+                new_embeddings.vectors[offset:offset + INGEST_BATCH_SIZE],
+                new_embeddings.ids[offset:offset + INGEST_BATCH_SIZE]
+            )
+    configure_search(index, spec)
+
+    logger.info(f"FAISS {spec['index_type']} index created successfully with {index.ntotal} vectors.")
+    return index, new_embeddings, spec
+
+
+def _start_index(
+    num_vectors: int,
+    dimension: int,
+    base_index: Optional[faiss.Index],
+    base_spec: Optional[Dict[str, Any]],
+    embeddings: EmbeddingStore,
+    new_embeddings: EmbeddingStore,
+    changed: np.ndarray,
+    removed: np.ndarray
+) -> Tuple[faiss.Index, Dict[str, Any], bool]:
+    """
+    Creates the index that embedded batches are added to: a copy of `base_index` without
+    its stale vectors when it can be updated in place, otherwise a new index holding the
+    unchanged vectors, taken from `new_embeddings`.
+
+    Returns:
+        Tuple[faiss.Index, Dict[str, Any], bool]: The index, its spec, and whether batches can
+        be added as they are embedded (False for an untrained IVF index).
+    """
+    spec = resolve_index_spec(num_vectors, dimension)
+    incremental = (
+        base_index is not None
+        and base_spec == spec
+        and supports_removal(spec)
+        and base_index.d == dimension
+    )
+
+    ids = new_embeddings.ids
+    if incremental:
+        # update a copy so queries running on the live index are unaffected; unlike a clone, a
+        # deserialized copy owns its data instead of sharing the read-only mapping of the index file
+        index = faiss.deserialize_index(faiss.serialize_index(base_index))
+        changed_ids = ids[changed]
+        stale_ids = np.concatenate([removed, changed_ids[embeddings.positions(changed_ids) >= 0]])
+        if len(stale_ids):
+            index.remove_ids(stale_ids)
+        return index, spec, True
+
+    index = create_faiss_index(dimension, spec)
+    if not index.is_trained:
+        return index, spec, False
+
+    unchanged_rows = np.flatnonzero(~changed)
+    for offset in range(0, len(unchanged_rows), INGEST_BATCH_SIZE):
+        rows = unchanged_rows[offset:offset + INGEST_BATCH_SIZE]
+        index.add_with_ids(new_embeddings.vectors[rows], ids[rows])
+    return index, spec, True
+
+
+def _embed_in_batches(
+    embedding_model,
+    texts: List[str],
+    rows: np.ndarray,
+    ids: np.ndarray,
+    hashes: np.ndarray,
+    checkpoint: Optional[IngestCheckpoint],
+    progress: Optional[Callable[[int, int], None]]
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Embeds the texts at `rows` in batches, reusing vectors saved in the checkpoint by an
+    interrupted build and saving every newly embedded batch to it.
+
+    Yields:
+        Tuple[int, np.ndarray]: Offset of the batch within `rows` and its normalized vectors.
+    """
+    resumed = checkpoint.load() if checkpoint is not None else EmbeddingStore.empty()
+    resumed_rows = resumed.positions(ids[rows])
+    reusable = resumed_rows >= 0
+    if len(resumed):
+        reusable &= resumed.hashes[np.maximum(resumed_rows, 0)] == hashes[rows]
+        logger.info(f"{int(reusable.sum())} chunks reuse embeddings from the checkpoint.")
+
+    offsets = range(0, len(rows), INGEST_BATCH_SIZE)
+    fresh_batches = [
+        rows[offset:offset + INGEST_BATCH_SIZE][~reusable[offset:offset + INGEST_BATCH_SIZE]] for offset in offsets
+    ]
+    shards = ([texts[row] for row in fresh_rows] for fresh_rows in fresh_batches if len(fresh_rows))
+    embedded = embed_shards(embedding_model, shards, sum(1 for fresh_rows in fresh_batches if len(fresh_rows)))
+
+    try:
+        for offset, fresh_rows in zip(offsets, fresh_batches):
+            batch_rows = rows[offset:offset + INGEST_BATCH_SIZE]
+            batch_reusable = reusable[offset:offset + INGEST_BATCH_SIZE]
+
+            fresh_vectors = None
+            if len(fresh_rows):
+                fresh_vectors = next(embedded)
+                if checkpoint is not None:
+                    checkpoint.append(ids[fresh_rows], hashes[fresh_rows], fresh_vectors)
+
+            dimension = fresh_vectors.shape[1] if fresh_vectors is not None else resumed.dimension
+            vectors = np.empty((len(batch_rows), dimension), dtype=np.float32)
+            if fresh_vectors is not None:
+                vectors[~batch_reusable] = fresh_vectors
+            if batch_reusable.any():
+                vectors[batch_reusable] = resumed.vectors[resumed_rows[offset:offset + INGEST_BATCH_SIZE][batch_reusable]]
+
+            done = offset + len(batch_rows)
+            logger.info(f"Embedded {done}/{len(rows)} chunks.")
+            if progress is not None:
+                progress(done, len(rows))
+            yield offset, vectors
+    finally:
+        # stops the embedding workers if the build is abandoned
+        embedded.close()
+
+
+class RetrievalResult(NamedTuple):
+    """Outcome of a vector search: the context sent to the LLM and what it was built from."""
+    context: str
+    doc_ids: Tuple[int, ...]
+    query_embedding: np.ndarray
+    # chunks the context was assembled from (the profile ids when profiles are indexed whole)
+    chunk_ids: Tuple[int, ...] = ()
+    # estimated LLM tokens of the context
+    context_tokens: int = 0
+    # cosine similarity of the query to each chunk in `chunk_ids` (NaN if its vector is unavailable)
+    scores: Tuple[float, ...] = ()
+
+
+NO_RELEVANT_INFO = "No relevant info found above the similarity threshold."
+NO_MATCHING_PROFILES = "No job profiles match the given filters."
+
+
+def embed_queries(embedding_model, user_queries: List[str]) -> np.ndarray:
+    """
+    Embeds one or more queries in a single forward pass and L2-normalizes them.
+
+    Args:
+        embedding_model (HuggingFaceEmbeddings): Preloaded embedding model.
+        user_queries (List[str]): Queries to embed.
+
+    Returns:
+        np.ndarray: float32 matrix with one normalized row per query.
+    """
+    with metrics.timer("query_embedding"):
+        if len(user_queries) == 1:
+            query_embeddings = np.array(embedding_model.embed_query(user_queries[0]), dtype=np.float32).reshape(1, -1)
+        else:
+            query_embeddings = np.array(embedding_model.embed_documents(user_queries), dtype=np.float32)
+        query_embeddings /= np.linalg.norm(query_embeddings, axis=1, keepdims=True)
+    return query_embeddings
+
+
+def search(
+    user_queries: List[str],
+    query_embeddings: np.ndarray,
+    faiss_index,
+    doc_store: DocumentStore,
+    filters: Optional[MetadataFilter] = None
+) -> List[RetrievalResult]:
+    """
+    Runs one FAISS search for a matrix of query embeddings and builds the context of each query.
+
+    When the document store has a lexical index and HYBRID_SEARCH_ENABLED is set,
+    each query is also run through BM25 and the two rankings are merged with
+    reciprocal-rank fusion, so exact skill, certification or employer names are
+    found even when their embeddings are not close to the query's. A query whose
+    vector hits are all cut stays without context, as BM25 matches common terms.
+
+    Metadata filters are applied inside both searches (a FAISS `IDSelector`
+    and a chunk mask), so the top-k is taken among matching profiles only.
+
+    The number of hits adapts to each query: FAISS is asked for
+    `TOP_K * CHUNK_SEARCH_FACTOR` hits, whose scores are converted to cosine
+    similarities for the index metric and cut at the similarity threshold or
+    at the first large score gap for all queries at once. With MMR_ENABLED the
+    kept hits are re-ranked by maximal marginal relevance, so near-duplicate
+    profiles do not crowd out different ones.
+
+    Args:
+        user_queries (List[str]): The queries, used for lexical search and logging.
+        query_embeddings (np.ndarray): Normalized query embeddings, one row per query.
+        faiss_index (faiss.Index): Preloaded FAISS index.
+        doc_store (DocumentStore): Job profiles keyed by FAISS id, built together with `faiss_index`.
+        filters (MetadataFilter, optional): Structured filters applied to all queries.
+
+    Returns:
+        List[RetrievalResult]: One result per query, in order.
+    """
+    lexical_index = doc_store.lexical_index if HYBRID_SEARCH_ENABLED else None
+
+    # over-fetch, so that hits on several sections of one profile and the adaptive cut still leave TOP_K profiles
+    k = TOP_K * CHUNK_SEARCH_FACTOR
+
+    selection = None
+    if filters is not None and not filters.is_empty() and doc_store.metadata is not None:
+        selection = doc_store.metadata.selection(filters)
+        if not selection.selectivity:
+            logger.warning(f"No job profiles match the filters {filters._asdict()}.")
+            return [RetrievalResult(NO_MATCHING_PROFILES, (), query_embedding) for query_embedding in query_embeddings]
+
+    # Perform search
+    with metrics.timer("faiss_search"):
+        if selection is None:
+            distances, indices = faiss_index.search(query_embeddings, k)
+        else:
+            params = filtered_search_parameters(faiss_index, selection.selector, selection.selectivity)
+            distances, indices = faiss_index.search(query_embeddings, k, params=params)
+    
+    # Convert the scores to cosine similarities and keep the hits above the threshold, up to the first score gap
+    similarity_scores = similarities(distances, faiss_index.metric_type)
+    kept = adaptive_cut(similarity_scores, indices)
+
+    results = []
+    for user_query, query_embedding, row_indices, row_scores, row_kept in zip(
+        user_queries, query_embeddings, indices, similarity_scores, kept
+    ):
+        hit_ids, hit_scores = row_indices[row_kept], row_scores[row_kept]
+        if MMR_ENABLED and len(hit_ids) > 1:
+            with metrics.timer("rerank"):
+                vectors = reconstruct(faiss_index, hit_ids)
+                if vectors is not None:
+                    order = mmr(vectors, hit_scores)
+                    hit_ids, hit_scores = hit_ids[order], hit_scores[order]
+        hits = list(zip(hit_ids.tolist(), hit_scores.tolist()))
+
+        # BM25 scores have no absolute scale, so only a query the vector side found relevant is fused;
+        # its term matches then count even when their vectors fall below the similarity threshold
+        if lexical_index is not None and hits:
+            with metrics.timer("lexical_search"):
+                lexical_hits = lexical_index.search(user_query, k, selection.chunk_mask if selection else None)
+            if lexical_hits:
+                hits = reciprocal_rank_fusion([hits, lexical_hits], RRF_K)
+        
+        if not hits:
+            logger.warning(f"No relevant info found above the threshold ({SIMILARITY_TRESHOLD}) for query: {user_query}")
+            metrics.increment("threshold_rejections")
+            results.append(RetrievalResult(NO_RELEVANT_INFO, (), query_embedding))
+            continue
+
+        # aggregate chunk hits per profile and keep the best matching sections within the token budget
+        with metrics.timer("document_lookup"):
+            context = build_context(doc_store, hits, TOP_K)
+        metrics.increment("context_tokens", context.tokens)
+        metrics.increment("context_sections_dropped", context.sections_dropped)
+        
+        logger.info(
+            f"Retrieved {len(context.doc_ids)} job profiles ({context.tokens} context tokens, "
+            f"{context.sections_dropped} sections trimmed) for query: {user_query}"
+        )
+        known_scores = {int(idx): float(score) for idx, score in zip(row_indices, row_scores) if idx >= 0}
+        results.append(RetrievalResult(
+            context.text,
+            context.doc_ids,
+            query_embedding,
+            context.chunk_ids,
+            context.tokens,
+            tuple(query_similarities(query_embedding, context.chunk_ids, known_scores, faiss_index).tolist())
+        ))
+    
+    return results
+
 
 @log_helper.log_execution_time
-def retrieve_context(user_query: str, embedding_model, faiss_index) -> str:
+def retrieve(
+    user_query: str,
+    embedding_model,
+    faiss_index,
+    doc_store: DocumentStore,
+    filters: Optional[MetadataFilter] = None
+) -> RetrievalResult:
     """
     Searches the FAISS index for job profiles similar to the user's query and filters results based on a similarity threshold.
     
@@ -85,36 +528,48 @@ def retrieve_context(user_query: str, embedding_model, faiss_index) -> str:
         user_query (str): User's search query.
         model (HuggingFaceEmbeddings): Preloaded embedding model.
         index (faiss.Index): Preloaded FAISS index.
+        doc_store (DocumentStore): Job profiles keyed by FAISS id, built together with `faiss_index`.
+        filters (MetadataFilter, optional): Structured filters on region, salary and education.
 
     Returns:
-        str: Retrieved job profiles formatted as text.
+        RetrievalResult: Retrieved job profiles formatted as text, their ids and the normalized query embedding.
     """
     logger.info(f"Searching for jobs related to: {user_query}")
 
     # Generate and normalize query embedding
-    query_embedding = np.array(embedding_model.embed_query(user_query), dtype=np.float32).reshape(1, -1)
-    query_embedding /= np.linalg.norm(query_embedding, axis=1, keepdims=True)
+    query_embeddings = embed_queries(embedding_model, [user_query])
 
-    # Perform search
-    distances, indices = faiss_index.search(query_embedding, TOP_K)
-    
-    # Convert distances to similarity scores (cosine similarity, similarity = 1 - distance)
-    similarity_scores = 1 - distances[0]
-    
-    # Filter results based on threshold
-    valid_indices = [idx for idx, score in zip(indices[0], similarity_scores) if score >= SIMILARITY_TRESHOLD]
-    
-    if not valid_indices:
-        logger.warning(f"No relevant info found above the threshold ({SIMILARITY_TRESHOLD}) for query: {user_query}")
-        return "No relevant info found above the similarity threshold."
+    return search([user_query], query_embeddings, faiss_index, doc_store, filters)[0]
 
-    text_job_profiles = get_text_job_profiles()
-    retrieved_context = "\n\n".join([text_job_profiles[idx] for idx in valid_indices])
-    
-    logger.info(f"Retrieved {len(valid_indices)} job profiles for query: {user_query}")
-    
-    return retrieved_context
 
+@log_helper.log_execution_time
+def retrieve_batch(user_queries: List[str], embedding_model, faiss_index, doc_store: DocumentStore) -> List[RetrievalResult]:
+    """
+    Batched version of `retrieve`: embeds all queries in one forward pass and
+    searches the index with a single matrix call.
+
+    Args:
+        user_queries (List[str]): User search queries.
+        embedding_model (HuggingFaceEmbeddings): Preloaded embedding model.
+        faiss_index (faiss.Index): Preloaded FAISS index.
+        doc_store (DocumentStore): Job profiles keyed by FAISS id, built together with `faiss_index`.
 
+    Returns:
+        List[RetrievalResult]: One result per query, in order.
+    """
+    logger.info(f"Searching for jobs related to {len(user_queries)} queries.")
 
+    query_embeddings = embed_queries(embedding_model, user_queries)
 
+    return search(user_queries, query_embeddings, faiss_index, doc_store)
+
+
+def retrieve_context(user_query: str, embedding_model, faiss_index, doc_store: DocumentStore) -> str:
+    """
+    Searches the FAISS index for job profiles similar to the user's query.
+    See `retrieve` for details.
+
+    Returns:
+        str: Retrieved job profiles formatted as text.
+    """
+    return retrieve(user_query, embedding_model, faiss_index, doc_store).context
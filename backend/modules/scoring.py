@@ -0,0 +1,146 @@
+# scoring.py
+
+from typing import Dict, Optional, Sequence
+
+import faiss
+import numpy as np
+
+from config import SIMILARITY_TRESHOLD, SCORE_GAP, MMR_LAMBDA
+
+
+def similarities(distances: np.ndarray, metric_type: int) -> np.ndarray:
+    """
+    Converts the score matrix of a FAISS search into cosine similarities.
+
+    All indexes hold L2-normalized vectors, so an inner-product index already
+    returns cosine similarities, and the squared L2 distance `d` of an L2 index
+    corresponds to a cosine similarity of `1 - d / 2`.
+
+    Args:
+        distances (np.ndarray): (queries, k) scores returned by `faiss.Index.search`.
+        metric_type (int): `metric_type` of the searched index.
+
+    Returns:
+        np.ndarray: float32 (queries, k) cosine similarities, best first in each row.
+
+    Raises:
+        ValueError: If the metric has no cosine interpretation.
+    """
+    if metric_type == faiss.METRIC_INNER_PRODUCT:
+        return np.asarray(distances, dtype=np.float32)
+    if metric_type == faiss.METRIC_L2:
+        return 1 - np.asarray(distances, dtype=np.float32) / 2
+    raise ValueError(f"Unsupported FAISS metric {metric_type}; expected inner product or L2.")
+
+
+def adaptive_cut(
+    scores: np.ndarray,
+    indices: np.ndarray,
+    threshold: float = SIMILARITY_TRESHOLD,
+    max_gap: float = SCORE_GAP,
+    min_hits: int = 1
+) -> np.ndarray:
+    """
+    Selects the hits worth keeping from over-fetched search results.
+
+    A hit is kept if it is a real result (FAISS pads missing ones with id -1),
+    scores at least `threshold`, and no drop of more than `max_gap` between
+    consecutive scores comes before it. The first `min_hits` hits above the
+    threshold are never cut by a gap, so a clear winner still keeps its
+    runners-up. The whole matrix is handled at once.
+
+    Args:
+        scores (np.ndarray): (queries, k) cosine similarities, sorted descending per row.
+        indices (np.ndarray): (queries, k) ids returned by the search.
+        threshold (float): Lowest similarity kept.
+        max_gap (float): Largest drop in similarity allowed between consecutive hits.
+        min_hits (int): Hits kept regardless of gaps.
+
+    Returns:
+        np.ndarray: Boolean (queries, k) mask of the kept hits; kept hits form a prefix of each row.
+    """
+    valid = (indices >= 0) & (scores >= threshold)
+    gaps = (scores[:, :-1] - scores[:, 1:]) > max_gap
+    gaps[:, :max(min_hits - 1, 0)] = False
+    after_gap = np.zeros_like(valid)
+    after_gap[:, 1:] = np.cumsum(gaps, axis=1) > 0
+    return np.logical_and.accumulate(valid & ~after_gap, axis=1)
+
+
+def mmr(vectors: np.ndarray, scores: np.ndarray, lambda_: float = MMR_LAMBDA) -> np.ndarray:
+    """
+    Orders candidates by maximal marginal relevance: each pick maximizes
+    `lambda_ * similarity to the query - (1 - lambda_) * highest similarity to a previous pick`,
+    so near-duplicates of what is already picked move down the ranking.
+
+    The candidate similarity matrix is computed once; each pick then updates
+    the redundancy of all remaining candidates with one vector operation.
+
+    Args:
+        vectors (np.ndarray): (n, d) normalized candidate vectors.
+        scores (np.ndarray): Similarity of each candidate to the query.
+        lambda_ (float): 1.0 orders by relevance only; lower values favour diversity.
+
+    Returns:
+        np.ndarray: Candidate positions in MMR order.
+    """
+    num_candidates = len(scores)
+    if num_candidates < 2 or lambda_ >= 1:
+        return np.argsort(-scores, kind="stable")
+
+    pairwise = vectors @ vectors.T
+    # highest similarity of each candidate to the picks so far; nothing is redundant before the first pick
+    redundancy = np.zeros(num_candidates, dtype=np.float32)
+    picked = np.zeros(num_candidates, dtype=bool)
+    order = np.empty(num_candidates, dtype=np.int64)
+    for step in range(num_candidates):
+        marginal = lambda_ * scores - (1 - lambda_) * redundancy
+        marginal[picked] = -np.inf
+        best = int(np.argmax(marginal))
+        order[step] = best
+        picked[best] = True
+        np.maximum(redundancy, pairwise[best], out=redundancy)
+    return order
+
+
+def reconstruct(faiss_index: faiss.Index, ids: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Reads the stored vectors of ids back from an index.
+
+    Returns:
+        np.ndarray, optional: (n, d) vectors (approximate for PQ indexes), or None if
+        the index cannot look vectors up by id (indexes built before ids were mapped).
+    """
+    try:
+        return faiss_index.reconstruct_batch(np.ascontiguousarray(ids, dtype=np.int64))
+    except RuntimeError:
+        return None
+
+
+def query_similarities(
+    query_embedding: np.ndarray,
+    ids: Sequence[int],
+    known: Dict[int, float],
+    faiss_index: faiss.Index
+) -> np.ndarray:
+    """
+    Returns the cosine similarity of the query to each id, taking it from `known`
+    where the search already scored it and computing it from the stored vector
+    otherwise (e.g. for chunks only found by lexical search).
+
+    Args:
+        query_embedding (np.ndarray): Normalized query vector.
+        ids (Sequence[int]): Chunk ids to score.
+        known (Dict[int, float]): Similarities already computed by the search.
+        faiss_index (faiss.Index): Index holding the chunk vectors.
+
+    Returns:
+        np.ndarray: float32 similarities aligned with `ids`; NaN where no vector is available.
+    """
+    result = np.array([known.get(item_id, np.nan) for item_id in ids], dtype=np.float32)
+    missing = np.flatnonzero(np.isnan(result))
+    if len(missing):
+        vectors = reconstruct(faiss_index, np.asarray(ids, dtype=np.int64)[missing])
+        if vectors is not None:
+            result[missing] = vectors @ query_embedding
+    return result
@@ -0,0 +1,251 @@
+# serve.py
+"""
+Pre-fork server: runs the FastAPI app in several worker processes that share
+one copy of the embedding model weights, FAISS index and document store.
+
+With `uvicorn main:app --workers N` every worker imports the app and loads
+its own model, index and document store. Here the parent process loads them
+once, moves them out of the garbage collector's reach with `gc.freeze()` and
+forks the workers, which then share those memory pages copy-on-write; the
+FAISS index is memory-mapped (see `INDEX_MMAP`) and is shared through the
+page cache.
+
+The parent listens on the socket, restarts workers that die and checks every
+`INDEX_REFRESH_SECONDS` for an index version rebuilt by a worker. It loads a
+new version itself and replaces the workers one at a time, each once its
+replacement has warmed up, so the new document store is shared as well
+instead of every worker loading its own copy.
+
+Usage (from backend/):
+    python serve.py --workers 4 --host 0.0.0.0 --port 8000
+"""
+
+import argparse
+import gc
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Set, Tuple
+
+from log_helper import logger
+from config import EMBEDDING_BACKEND, EMBEDDING_THREADS, INDEX_REFRESH_SECONDS
+
+
+# a worker dying sooner than this after its start is restarted only after this delay
+RESTART_DELAY_SECONDS = 1.0
+# how often the parent checks on its workers
+SUPERVISE_INTERVAL_SECONDS = 0.5
+# a replacement worker not ready after this long is stopped and the worker it was to replace kept
+WORKER_READY_TIMEOUT_SECONDS = 120
+
+
+def prepare_index() -> None:
+    """
+    Loads the index, building it first if it is missing or outdated. Runs in a
+    spawned process, so the parent never runs the embedding model before forking.
+    """
+    from modules.retrieval import load_embedding_model
+    from modules.index_manager import IndexManager
+
+    IndexManager(load_embedding_model()).load()
+
+
+def preload_app():
+    """
+    Imports the app and preloads its model and index in the parent process.
+
+    Returns:
+        module: The imported `main` module.
+    """
+    import main
+
+    try:
+        main.preload()
+    except RuntimeError as e:
+        logger.warning(f"{str(e)} Building it in a separate process...")
+        process = multiprocessing.get_context("spawn").Process(target=prepare_index, name="index-build")
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            raise RuntimeError("Building the FAISS index failed.") from e
+        main.preload()
+    return main
+
+
+def reload_index(app_module) -> bool:
+    """
+    Loads an index version rebuilt by a worker into the parent process, for the
+    workers that replace the current ones to share.
+
+    Returns:
+        bool: Whether a newer version was loaded.
+    """
+    try:
+        if not app_module.preloaded_index_manager.refresh():
+            return False
+    except Exception as e:
+        logger.error(f"Could not load the rebuilt FAISS index: {str(e)}")
+        return False
+    gc.collect()
+    gc.freeze()
+    return True
+
+
+def run_worker(app_module, sock: socket.socket, threads: int, ready_fd: int) -> None:
+    """
+    Serves the app on the inherited socket until uvicorn shuts down; never returns.
+    Writes to `ready_fd` once the worker has warmed up.
+    """
+    import uvicorn
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    if EMBEDDING_BACKEND == "torch" and EMBEDDING_THREADS == 0:
+        import torch
+
+        # the workers split the cores instead of each using all of them
+        torch.set_num_threads(threads)
+
+    def signal_ready():
+        try:
+            os.write(ready_fd, b"1")
+            os.close(ready_fd)
+        except OSError:
+            # the parent is not waiting for this worker
+            pass
+
+    app_module.prefork_worker = True
+    app_module.on_ready = signal_ready
+
+    exit_code = 0
+    try:
+        server = uvicorn.Server(uvicorn.Config(app_module.app, log_level="info"))
+        server.run(sockets=[sock])
+    except BaseException as e:
+        logger.error(f"Worker {os.getpid()} failed: {str(e)}")
+        exit_code = 1
+    finally:
+        os._exit(exit_code)
+
+
+def wait_ready(ready_fd: int, timeout: float) -> bool:
+    """Returns whether the worker writing to `ready_fd` warmed up within `timeout` seconds."""
+    try:
+        readable, _, _ = select.select([ready_fd], [], [], timeout)
+        # a worker that exits closes its end, which reads as b""
+        return bool(readable) and os.read(ready_fd, 1) == b"1"
+    finally:
+        os.close(ready_fd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the API in pre-forked workers sharing one model and index.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--backlog", type=int, default=2048)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    app_module = preload_app()
+
+    sock = socket.socket(socket.AF_INET6 if ":" in args.host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(args.backlog)
+    sock.set_inheritable(True)
+
+    # objects loaded so far are never collected, so collections in the workers do not touch their pages
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Model and index preloaded in {time.perf_counter() - start_time:.1f}s. Starting {args.workers} workers.")
+
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    workers: Dict[int, float] = {}
+    # workers stopped on purpose, which are not restarted
+    retiring: Set[int] = set()
+    stopping = False
+
+    def spawn_worker() -> Tuple[int, int]:
+        """Forks a worker; returns its pid and the pipe it reports readiness on."""
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            run_worker(app_module, sock, threads, ready_write)
+        os.close(ready_write)
+        workers[pid] = time.monotonic()
+        return pid, ready_read
+
+    def retire(pid: int) -> None:
+        retiring.add(pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def replace_workers() -> None:
+        """Replaces the workers one at a time, retiring each once its replacement is ready."""
+        for old_pid in [pid for pid in workers if pid not in retiring]:
+            if stopping:
+                return
+            new_pid, ready_fd = spawn_worker()
+            if not wait_ready(ready_fd, WORKER_READY_TIMEOUT_SECONDS):
+                logger.error(f"Replacement worker {new_pid} did not become ready. Keeping worker {old_pid}.")
+                retire(new_pid)
+                continue
+            retire(old_pid)
+        logger.info("Workers replaced to share the rebuilt index.")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(args.workers):
+        os.close(spawn_worker()[1])
+
+    next_refresh = time.monotonic() + INDEX_REFRESH_SECONDS
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            started_at = workers.pop(pid, None)
+            if pid in retiring:
+                retiring.discard(pid)
+                continue
+            if started_at is None or stopping:
+                continue
+            logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}. Restarting it.")
+            if time.monotonic() - started_at < RESTART_DELAY_SECONDS:
+                time.sleep(RESTART_DELAY_SECONDS)
+            if not stopping:
+                os.close(spawn_worker()[1])
+            continue
+
+        if not stopping and INDEX_REFRESH_SECONDS > 0 and time.monotonic() >= next_refresh:
+            if reload_index(app_module):
+                replace_workers()
+            next_refresh = time.monotonic() + INDEX_REFRESH_SECONDS
+        time.sleep(SUPERVISE_INTERVAL_SECONDS)
+
+    sock.close()
+    logger.info("All workers stopped.")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
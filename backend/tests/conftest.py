@@ -0,0 +1,11 @@
+# conftest.py
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the tests run as the app does from backend/: modules import each other from there and
+# paths such as `logs/` and `data/` are relative to it, whatever directory pytest is run from
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
@@ -0,0 +1,72 @@
+# test_llm_gateway.py
+
+import asyncio
+import time
+
+from modules.llm_gateway import BreakerPermit, CircuitBreaker, LLMGateway, MockProvider
+
+
+def half_open_gateway(provider: MockProvider) -> LLMGateway:
+    """Returns a gateway over `provider` whose circuit breaker is half-open."""
+    gateway = LLMGateway([provider], deadline=5, attempt_timeout=5, fallback_reserve=0, max_retries=0, hedging=False)
+    breaker = CircuitBreaker(provider.name, failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure(breaker.allow())
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    gateway._breakers[provider.name] = breaker
+    return gateway
+
+
+def test_cancelled_trial_call_releases_breaker():
+    gateway = half_open_gateway(MockProvider(latency_seconds=1.0))
+
+    async def cancelled_call():
+        try:
+            await asyncio.wait_for(gateway.agenerate("system", "Question: test"), timeout=0.05)
+        except asyncio.TimeoutError:
+            pass
+
+    asyncio.run(cancelled_call())
+    breaker = gateway._breakers["mock"]
+    assert breaker.state == "half_open"
+    assert breaker.allow() == BreakerPermit(trial=True)
+
+
+def test_closed_trial_stream_releases_breaker():
+    gateway = half_open_gateway(MockProvider(latency_seconds=0.0))
+
+    async def disconnected_stream():
+        stream = gateway.astream("system", "Question: test")
+        await stream.__anext__()
+        # the client disconnects after the first chunk
+        await stream.aclose()
+
+    asyncio.run(disconnected_stream())
+    assert gateway._breakers["mock"].allow() == BreakerPermit(trial=True)
+
+
+def test_trial_success_closes_breaker():
+    gateway = half_open_gateway(MockProvider(latency_seconds=0.0))
+
+    assert asyncio.run(gateway.agenerate("system", "Question: test")) == "Mock answer to: test"
+    assert gateway._breakers["mock"].state == "closed"
+
+
+def test_only_the_trial_permit_resolves_the_trial():
+    breaker = CircuitBreaker("mock", failure_threshold=1, reset_seconds=0.05)
+    # admitted while the circuit was still closed
+    earlier = breaker.allow()
+    breaker.record_failure(breaker.allow())
+    time.sleep(0.06)
+    trial = breaker.allow()
+    assert trial == BreakerPermit(trial=True)
+
+    # the earlier call ending does not free the trial slot or reopen the circuit
+    breaker.release(earlier)
+    assert breaker.allow() is None
+    breaker.record_failure(earlier)
+    assert breaker.state == "half_open"
+    assert breaker.allow() is None
+
+    breaker.record_success(trial)
+    assert breaker.state == "closed"
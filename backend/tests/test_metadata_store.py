@@ -0,0 +1,14 @@
+# test_metadata_store.py
+
+from modules.metadata_store import EDUCATION_LEVELS, education_level
+
+
+def test_education_level_is_lowest_over_all_requirements():
+    requirements = ("Graduate degree in any stream", "12th pass with mathematics")
+
+    assert education_level(requirements) == EDUCATION_LEVELS.index("12th")
+
+
+def test_education_level_without_recognized_requirement():
+    assert education_level(("Relevant experience",)) == -1
+    assert education_level(()) == -1
@@ -0,0 +1,55 @@
+# test_retrieval.py
+
+import faiss
+import numpy as np
+
+from modules import retrieval
+from modules.doc_store import DocumentStore, JobDocument
+from modules.lexical_index import LexicalIndex
+from modules.retrieval import NO_RELEVANT_INFO, search
+
+
+ROLES = ["Software Engineer", "Data Analyst", "Nurse"]
+PROFILES = [
+    "Role: Software Engineer\nDescription: Builds and maintains software systems.",
+    "Role: Data Analyst\nDescription: Analyses data and builds software reports.",
+    "Role: Nurse\nDescription: Cares for patients in hospitals.",
+]
+
+
+def hybrid_store() -> DocumentStore:
+    """Returns a store of `PROFILES` with a lexical index over them."""
+    doc_store = DocumentStore(
+        JobDocument(doc_id, role, text, str(doc_id), (), (), (), ())
+        for doc_id, (role, text) in enumerate(zip(ROLES, PROFILES), start=1)
+    )
+    doc_store.lexical_index = LexicalIndex.build(range(1, len(PROFILES) + 1), PROFILES)
+    return doc_store
+
+
+def profile_index() -> faiss.Index:
+    """Returns an inner-product index with one orthogonal unit vector per profile."""
+    index = faiss.IndexIDMap(faiss.IndexFlatIP(8))
+    index.add_with_ids(np.eye(8, dtype=np.float32)[:len(PROFILES)], np.arange(1, len(PROFILES) + 1))
+    return index
+
+
+def test_hybrid_search_keeps_no_relevant_info_without_vector_hits(monkeypatch):
+    monkeypatch.setattr(retrieval, "HYBRID_SEARCH_ENABLED", True)
+    # shares terms with two profiles, but its embedding is close to none of them
+    query_embedding = np.eye(8, dtype=np.float32)[[7]]
+
+    result, = search(["software"], query_embedding, profile_index(), hybrid_store())
+
+    assert result.context == NO_RELEVANT_INFO
+    assert result.doc_ids == ()
+
+
+def test_hybrid_search_fuses_lexical_hits_with_vector_hits(monkeypatch):
+    monkeypatch.setattr(retrieval, "HYBRID_SEARCH_ENABLED", True)
+    query_embedding = np.eye(8, dtype=np.float32)[[0]]
+
+    result, = search(["software reports"], query_embedding, profile_index(), hybrid_store())
+
+    # the data analyst profile is found by its terms only
+    assert set(result.doc_ids) == {1, 2}
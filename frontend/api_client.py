@@ -0,0 +1,131 @@
+# api_client.py
+
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import (API_BASE_URL,
+                    API_CONNECT_TIMEOUT_SECONDS,
+                    API_READ_TIMEOUT_SECONDS,
+                    API_POOL_SIZE,
+                    API_MAX_RETRIES,
+                    ANSWER_CACHE_MAX_ENTRIES,
+                    ANSWER_CACHE_TTL_SECONDS,
+                    INDEX_STATUS_CACHE_SECONDS)
+
+
+TIMEOUT = (API_CONNECT_TIMEOUT_SECONDS, API_READ_TIMEOUT_SECONDS)
+
+
+@st.cache_resource(show_spinner=False)
+def get_session() -> requests.Session:
+    """
+    Returns the HTTP session shared by all sessions of this Streamlit process, so
+    requests reuse pooled keep-alive connections to the backend instead of each
+    opening a new one.
+    """
+    retry = Retry(
+        total=API_MAX_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=API_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def stream_answer(query: str, result: Dict[str, Any]) -> Iterator[str]:
+    """
+    Yields answer tokens from the backend's server-sent event stream as they arrive.
+    The retrieved context (sent before the answer) is stored in `result`, and
+    `result["error"]` is set if the backend reported an error instead of an answer.
+
+    Raises:
+        requests.RequestException: If the backend cannot be reached or answers with an error status.
+    """
+    with get_session().get(f"{API_BASE_URL}/query/stream", params={"query": query}, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[len("data:"):])
+                if event == "context":
+                    result["retrieved_context"] = data["retrieved_context"]
+                elif event == "token":
+                    yield data["text"]
+                elif event == "error":
+                    result["error"] = True
+                    yield data["message"]
+
+
+def _answer_key(query: str) -> str:
+    """Normalizes whitespace and case, so trivially different spellings share a cached answer."""
+    return " ".join(query.split()).lower()
+
+
+def cached_answer(query: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the answer to a query already asked in this browser session, or None.
+
+    Answers are streamed, which `st.cache_data` cannot cache, so they are kept
+    in the session state instead.
+    """
+    answers = st.session_state.get("answers")
+    if answers is None:
+        return None
+    entry = answers.get(_answer_key(query))
+    if entry is None or time.time() - entry["time"] > ANSWER_CACHE_TTL_SECONDS:
+        return None
+    answers.move_to_end(_answer_key(query))
+    return entry
+
+
+def remember_answer(query: str, answer: str, retrieved_context: Any) -> None:
+    """Keeps an answer for `cached_answer`, evicting the least recently used beyond `ANSWER_CACHE_MAX_ENTRIES`."""
+    answers = st.session_state.setdefault("answers", OrderedDict())
+    answers[_answer_key(query)] = {"answer": answer, "retrieved_context": retrieved_context, "time": time.time()}
+    answers.move_to_end(_answer_key(query))
+    while len(answers) > ANSWER_CACHE_MAX_ENTRIES:
+        answers.popitem(last=False)
+
+
+def start_index_update() -> Dict[str, Any]:
+    """
+    Asks the backend to rebuild the index. Returns at once: the rebuild runs in
+    the background and is followed with `get_index_status`.
+
+    Raises:
+        requests.RequestException: If the backend cannot be reached or answers with an error status.
+    """
+    response = get_session().post(f"{API_BASE_URL}/update_index/", timeout=TIMEOUT)
+    response.raise_for_status()
+    get_index_status.clear()
+    return response.json()
+
+
+@st.cache_data(ttl=INDEX_STATUS_CACHE_SECONDS, show_spinner=False)
+def get_index_status() -> Dict[str, Any]:
+    """
+    Returns the state and progress of the last index update. Cached briefly, so
+    that every session polling the status shares one backend request.
+
+    Raises:
+        requests.RequestException: If the backend cannot be reached or answers with an error status.
+    """
+    response = get_session().get(f"{API_BASE_URL}/update_index/status", timeout=TIMEOUT)
+    response.raise_for_status()
+    return response.json()
@@ -1,8 +1,7 @@
-import streamlit as st
 import requests
-import os
+import streamlit as st
 
-from config import API_BASE_URL
+from api_client import stream_answer, cached_answer, remember_answer
 
 
 st.set_page_config(page_title="JobMentorAI", page_icon="🎓")
@@ -22,12 +21,21 @@ query = st.text_input("Find the best job! (Enter skills, degree, or career goal)
 # a button to trigger the job search
 if st.button("🔍 Click Me!"):
     if query.strip():  # ensure the input is not empty
-        response = requests.get(f"{API_BASE_URL}/query/?query={query}").json()
-        
         st.write("### 🤖 AI Resppnse")
-        st.write(response["response"])
+        result = cached_answer(query)
+        if result is not None:
+            st.write(result["answer"])
+        else:
+            result = {"retrieved_context": None, "error": False}
+            try:
+                answer = st.write_stream(stream_answer(query, result))
+            except requests.RequestException:
+                st.error("Could not reach the server. Please try again in a moment.")
+                st.stop()
+            if not result["error"]:
+                remember_answer(query, answer, result["retrieved_context"])
 
         with st.expander("Please click here for context"):
-            st.write(response["retrieved_context"])
+            st.write(result["retrieved_context"])
     else:
         st.warning("Please enter your skills, degree, or job interest before searching.")
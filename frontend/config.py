@@ -3,3 +3,18 @@
 
 API_BASE_URL="http://127.0.0.1:8000"
 
+# seconds to connect to the backend, and to wait for each chunk of a response
+API_CONNECT_TIMEOUT_SECONDS = 3.05
+API_READ_TIMEOUT_SECONDS = 60
+# pooled keep-alive connections to the backend, shared by all sessions of this Streamlit process
+API_POOL_SIZE = 32
+# retries of idempotent requests that failed to connect or got a 502/503/504
+API_MAX_RETRIES = 2
+
+# answers kept per browser session, so asking the same question again does not call the backend
+ANSWER_CACHE_MAX_ENTRIES = 50
+ANSWER_CACHE_TTL_SECONDS = 600
+
+# index update status: how often the page polls it, and how long one response is shared by all sessions
+INDEX_STATUS_POLL_SECONDS = 2
+INDEX_STATUS_CACHE_SECONDS = 1
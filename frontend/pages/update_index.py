@@ -1,6 +1,8 @@
-import streamlit as st
 import requests
-from config import API_BASE_URL
+import streamlit as st
+
+from api_client import start_index_update, get_index_status
+from config import INDEX_STATUS_POLL_SECONDS
 
 st.set_page_config(page_title="Update Index", page_icon="🔄")
 
@@ -8,9 +10,48 @@ st.title("🔄 Update Index")
 st.write("Click the button below to refresh the index after updating job profiles.")
 
 if st.button("🔄 Update Index"):
-    response = requests.post("{API_BASE_URL}/update_index/")
-    
-    if response.status_code == 200:
-        st.success(response.json()["message"])
-    else:
+    try:
+        previous = get_index_status()
+        response = start_index_update()
+        st.success(response["message"])
+        # the rebuild runs in the background; its progress is polled below until it finishes
+        st.session_state["index_update_running"] = True
+        st.session_state["index_update_previous_finish"] = previous.get("finished_at")
+    except requests.RequestException:
         st.error("Failed to update index. Please check the server.")
+
+
+def show_index_status():
+    """Shows the progress of the running index update, or the result of the last one."""
+    try:
+        status = get_index_status()
+    except requests.RequestException:
+        st.warning("Could not fetch the index update status.")
+        return
+
+    if status["state"] == "running":
+        progress = status.get("progress") or {}
+        done, total = progress.get("done"), progress.get("total")
+        if total:
+            st.progress(min(done / total, 1.0), text=f"Embedding profiles: {done}/{total}")
+        else:
+            st.info(f"Updating index: {progress.get('stage', 'starting')} ({done or 0} profiles)...")
+        return
+
+    if status["state"] == "failed":
+        st.error(f"The last index update failed: {status.get('error')}")
+    else:
+        st.info(f"Index version {status['version']} is live with {status['num_documents']} job profiles.")
+
+    finished = status.get("finished_at") != st.session_state.get("index_update_previous_finish")
+    if st.session_state.get("index_update_running") and finished:
+        # rerun the whole page once to stop polling
+        st.session_state["index_update_running"] = False
+        st.rerun()
+
+
+# only the status fragment reruns while polling, so the page stays responsive during a long rebuild
+st.fragment(
+    show_index_status,
+    run_every=INDEX_STATUS_POLL_SECONDS if st.session_state.get("index_update_running") else None
+)()